@@ -0,0 +1,238 @@
+"""
+APROXIMACIÓN
+
+Estima los totales de la ciudad simulando solo algunos edificios:
+
+1. Cada edificio se describe por su perfil de consumo (el % promedio de
+   cada hora del día) y su flota (vehículos, capacidad, gasto diario y
+   batería inicial), y se agrupan los parecidos con k-medias
+2. De cada grupo se simulan APROXIMACION_POR_GRUPO edificios al azar
+3. Los resultados se escalan al tamaño de cada grupo (muestreo
+   estratificado), con el error estándar de cada total:
+
+    Var = Σ_g N_g² (1 - n_g/N_g) s_g² / n_g
+
+APROXIMACION_FRACCION es la fracción de los edificios que se simulan
+(hay FRACCION * edificios / POR_GRUPO grupos): menos es más rápido,
+pero con grupos más grandes y más error.
+
+Los vehículos se crean para todos los edificios, igual que en la
+simulación completa, y solo se simulan los elegidos. Sin RED_FILE los
+edificios no se afectan entre sí, así que cada elegido da lo mismo que en
+la simulación completa.
+"""
+
+import logging
+import math
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import helpers.constants as c
+from classes.en_memoria import PotenciasEnMemoria, SalidaEnMemoria
+from classes.timer import Timer
+from helpers.utils import kmedias
+
+logger = logging.getLogger(__name__)
+
+HEADERS_APROXIMACION = [
+    "Politica",
+    "Metrica",
+    "Estimado",
+    "Error Estandar",
+    "Edificios Simulados",
+    "Edificios",
+]
+
+HEADERS_CARGA_APROXIMADA = ["Tiempo", "Politica", "Carga (KW)", "Error Estandar"]
+
+HEADERS_GRUPOS = ["Edificio", "Grupo", "Simulado"]
+
+# métrica (con los nombres del Resumen) y el campo de SalidaEnMemoria que suma en los ciclos
+METRICAS = {
+    "Energia Entregada": "potencia_usada_por_autos",
+    "Ciclos en Espera": "autos_en_espera",
+    "Vehiculos Sin Bateria": "vehículos_agotados",
+    "Salidas Sin Carga": "salidas_sin_carga",
+    "Demanda No Cubierta": "demanda_no_cubierta",
+}
+
+
+def estimar_total(
+    valores: np.ndarray,
+    grupo: np.ndarray,
+    tamanos: Dict[int, int],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Total de la ciudad y su error estándar, a partir de los `valores` de los
+    edificios simulados (la primera dimensión) y el `grupo` de cada uno
+    """
+    total = np.zeros(valores.shape[1:])
+    varianza = np.zeros(valores.shape[1:])
+    for g, tamano in tamanos.items():
+        muestra = valores[grupo == g]
+        n = len(muestra)
+        total += tamano * muestra.mean(axis=0)
+        if n < tamano:
+            varianza += tamano**2 * (1 - n / tamano) * muestra.var(axis=0, ddof=1) / n
+    return total, np.sqrt(varianza)
+
+
+class Aproximacion:
+    def __init__(
+        self,
+        potencias: PotenciasEnMemoria,
+        fraccion: float | None = None,
+        por_grupo: int | None = None,
+        viajes=None,
+    ):
+        """
+        Agrupa los edificios de `potencias` y elige los que se simulan
+        """
+        from classes.simulacion import crear_flota, politicas_simuladas
+
+        fraccion = c.APROXIMACION_FRACCION if fraccion is None else fraccion
+        por_grupo = c.APROXIMACION_POR_GRUPO if por_grupo is None else por_grupo
+        if not 0 < fraccion <= 1:
+            raise ValueError(f"La fracción de edificios debe estar en (0, 1] [{fraccion=}]")
+        if por_grupo < 2:
+            raise ValueError(f"Se necesitan al menos 2 edificios por grupo para estimar el error [{por_grupo=}]")
+        if c.FRAGMENTO or c.RED_FILE:
+            raise ValueError("La aproximación no se usa con FRAGMENTO ni RED_FILE")
+        if not politicas_simuladas():
+            raise ValueError("No hay políticas que simular (todas las SIMULAR_* están en 0)")
+
+        self.potencias = potencias
+        self.viajes = viajes
+
+        # la misma flota de la simulación completa
+        c.sembrar()
+        self.flota = crear_flota(potencias.edificios, Timer(), viajes)
+
+        cantidad = len(potencias.edificios)
+        k = max(1, min(cantidad, round(fraccion * cantidad / por_grupo)))
+        rng = np.random.default_rng(c.SEED)
+        self.grupos = kmedias(self.caracteristicas(), k, rng)
+
+        # los elegidos de cada grupo, en el orden del input
+        elegidos = np.zeros(cantidad, dtype=bool)
+        for g in np.unique(self.grupos):
+            miembros = np.flatnonzero(self.grupos == g)
+            elegidos[rng.choice(miembros, size=min(por_grupo, len(miembros)), replace=False)] = True
+        self.elegidos = elegidos
+        self.tamanos = {int(g): int(n) for g, n in zip(*np.unique(self.grupos, return_counts=True))}
+
+        logger.warning(
+            f"Aproximacion - {len(self.tamanos)} grupos, simulando {elegidos.sum()} de {cantidad} edificios"
+        )
+
+    def caracteristicas(self) -> np.ndarray:
+        """
+        Perfil de consumo por hora y datos de la flota de cada edificio,
+        normalizados (cada parte pesa lo mismo en la distancia)
+        """
+        from classes.edificio_vectorial import arreglos_de_vehículos
+
+        horas = np.array([int(str(t).split(":")[0]) % 24 for t in self.potencias.tiempos])
+        perfil = np.zeros((len(self.potencias.edificios), 24))
+        for h in np.unique(horas):
+            perfil[:, h] = self.potencias.consumos[horas == h].mean(axis=0)
+
+        flota = np.zeros((len(self.flota), 4))
+        for i, e in enumerate(self.flota):
+            arreglos = arreglos_de_vehículos(e.vehículos)
+            flota[i] = [
+                len(e.vehículos),
+                arreglos["max_bateria"].sum(),
+                (arreglos["gasto_dia"] * arreglos["max_bateria"]).sum(),
+                arreglos["bateria"].sum(),
+            ]
+
+        partes = []
+        for parte in (perfil, flota):
+            desviacion = parte.std(axis=0)
+            normalizada = (parte - parte.mean(axis=0)) / np.where(desviacion > 0, desviacion, 1)
+            partes.append(normalizada / math.sqrt(parte.shape[1]))
+        return np.hstack(partes)
+
+    def simular(self, nombre: str) -> Dict:
+        """
+        Simula solo los edificios elegidos, con sus potencias y su flota
+        """
+        from classes.simulacion import Simulacion
+
+        indices = np.flatnonzero(self.elegidos)
+        potencias = PotenciasEnMemoria(
+            self.potencias.consumos[:, indices],
+            [self.potencias.edificios[i] for i in indices],
+            self.potencias.tiempos,
+        )
+        s = Simulacion(nombre, potencias=potencias, flota=[self.flota[i] for i in indices], viajes=self.viajes)
+        return s.empezar(salida=SalidaEnMemoria()).resultado
+
+    def estimar(self, resultado: Dict) -> Tuple[List[Dict], List[List]]:
+        """
+        Totales de cada política y métrica, y la carga de la ciudad en cada ciclo
+        """
+        grupo_de = dict(zip(self.potencias.edificios, self.grupos.tolist()))
+        simulados = int(self.elegidos.sum())
+
+        filas, carga = [], []
+        politicas = list(dict.fromkeys(resultado["politicas"]))
+        for politica in politicas:
+            columnas = [i for i, p in enumerate(resultado["politicas"]) if p == politica]
+            grupo = np.array([grupo_de[resultado["edificios"][i]] for i in columnas])
+
+            for metrica, campo in METRICAS.items():
+                valores = resultado[campo][:, columnas].sum(axis=0)
+                total, error = estimar_total(valores, grupo, self.tamanos)
+                filas.append(
+                    {
+                        "Politica": politica,
+                        "Metrica": metrica,
+                        "Estimado": float(total),
+                        "Error Estandar": float(error),
+                        "Edificios Simulados": simulados,
+                        "Edificios": len(self.grupos),
+                    }
+                )
+
+            # la carga de cada ciclo (la energía del ciclo como potencia promedio), y su máximo
+            energia = resultado["potencia_usada_por_autos"][:, columnas].T
+            total, error = estimar_total(energia * 60 / c.MINS_POR_CICLO, grupo, self.tamanos)
+            maximo = int(total.argmax())
+            filas.append(
+                {
+                    "Politica": politica,
+                    "Metrica": "Peak Cargadores",
+                    "Estimado": float(total[maximo]),
+                    "Error Estandar": float(error[maximo]),
+                    "Edificios Simulados": simulados,
+                    "Edificios": len(self.grupos),
+                }
+            )
+            carga += [
+                [tiempo, politica, float(t), float(e)]
+                for tiempo, t, e in zip(resultado["tiempos"], total, error)
+            ]
+        return filas, carga
+
+    def guardar(self, filas: List[Dict], carga: List[List], db):
+        os.makedirs(c.OUTPUT_FOLDER, exist_ok=True)
+
+        nombre = f"{c.OUTPUT_FOLDER}/Aproximacion.{c.OUTPUT_FORMAT}"
+        db.crear_archivo(nombre, HEADERS_APROXIMACION)
+        for fila in filas:
+            db.agregar_fila_en_memoria(nombre, [fila[h] for h in HEADERS_APROXIMACION])
+
+        nombre = f"{c.OUTPUT_FOLDER}/Carga Aproximada.{c.OUTPUT_FORMAT}"
+        db.crear_archivo(nombre, HEADERS_CARGA_APROXIMADA)
+        for fila in carga:
+            db.agregar_fila_en_memoria(nombre, fila)
+
+        nombre = f"{c.OUTPUT_FOLDER}/Grupos.{c.OUTPUT_FORMAT}"
+        db.crear_archivo(nombre, HEADERS_GRUPOS)
+        for edificio, grupo, elegido in zip(self.potencias.edificios, self.grupos.tolist(), self.elegidos.tolist()):
+            db.agregar_fila_en_memoria(nombre, [edificio, grupo, int(elegido)])
+        db.exportar_archivos()
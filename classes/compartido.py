@@ -0,0 +1,234 @@
+"""
+MEMORIA COMPARTIDA
+
+Publica arreglos de numpy en un segmento de memoria compartida, para que
+varios procesos los lean sin copiarlos ni serializarlos: el proceso que
+los crea entrega un Descriptor (el nombre del segmento y dónde está cada
+arreglo), y cada trabajador lo adjunta como vistas sobre la misma memoria.
+
+Se usa para los datos que no cambian durante la simulación: el input ya
+leído (PotenciasEnMemoria) y los datos fijos de la flota (FlotaVectorial).
+Cada trabajador solo copia lo que modifica (la batería de los vehículos),
+así la memoria no crece con la cantidad de trabajadores.
+
+EJ: un barrido en 4 procesos con el mismo input y la misma flota
+```
+with compartir_potencias(potencias) as entrada, compartir_flota(flota) as vehículos:
+    barrido_en_paralelo("Super City", configs, 4, entrada.descriptor, vehículos.descriptor)
+```
+"""
+
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+import helpers.constants as c
+
+logger = logging.getLogger(__name__)
+
+# cada arreglo empieza en un múltiplo de esto (una línea de cache)
+ALINEACION = 64
+
+
+class Descriptor(NamedTuple):
+    nombre: str
+    # campo: (posición en bytes, forma, dtype)
+    campos: Dict[str, Tuple[int, Tuple[int, ...], str]]
+    # valores chicos que sí se copian (EJ: los nombres de los edificios)
+    extra: Dict
+
+
+# segmentos creados o adjuntados en este proceso, con sus vistas
+# (un hijo por fork hereda los del padre y no los vuelve a abrir)
+_SEGMENTOS: Dict[str, Tuple[SharedMemory, Dict[str, np.ndarray]]] = {}
+
+
+def _vistas(memoria: SharedMemory, campos: Dict) -> Dict[str, np.ndarray]:
+    return {
+        campo: np.ndarray(forma, dtype=np.dtype(dtype), buffer=memoria.buf, offset=posicion)
+        for campo, (posicion, forma, dtype) in campos.items()
+    }
+
+
+class Compartido:
+    """
+    Segmento de memoria compartida con una copia de `arreglos`.
+    Lo libera cerrar() (o el fin del bloque `with`)
+    """
+
+    def __init__(self, arreglos: Dict[str, np.ndarray], extra: Dict | None = None):
+        arreglos = {campo: np.ascontiguousarray(a) for campo, a in arreglos.items()}
+
+        campos, posicion = {}, 0
+        for campo, arreglo in arreglos.items():
+            if arreglo.dtype.hasobject:
+                raise ValueError(f"No se puede compartir un arreglo de objetos [{campo=}]")
+            posicion = -(-posicion // ALINEACION) * ALINEACION
+            campos[campo] = (posicion, arreglo.shape, arreglo.dtype.str)
+            posicion += arreglo.nbytes
+
+        self.memoria = SharedMemory(create=True, size=max(posicion, 1))
+        vistas = _vistas(self.memoria, campos)
+        for campo, arreglo in arreglos.items():
+            vistas[campo][...] = arreglo
+
+        self.descriptor = Descriptor(self.memoria.name, campos, dict(extra or {}))
+        _SEGMENTOS[self.memoria.name] = (self.memoria, vistas)
+        logger.info(f"Compartido - {self.memoria.name}: {posicion / 2**20:.1f}MB en {list(campos)}")
+
+    @property
+    def tamano(self) -> int:
+        return self.memoria.size
+
+    def cerrar(self):
+        """
+        Borra el segmento: los procesos que ya lo adjuntaron lo
+        siguen leyendo, y la memoria se libera cuando todos terminan
+        """
+        if _SEGMENTOS.pop(self.memoria.name, None) is None:
+            return
+        try:
+            self.memoria.close()
+        except BufferError:
+            # quedan vistas en uso en este proceso, se liberan con ellas
+            pass
+        self.memoria.unlink()
+
+    def __enter__(self) -> "Compartido":
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+
+def adjuntar(descriptor: Descriptor) -> Dict[str, np.ndarray]:
+    """
+    Vistas de los arreglos del segmento, sin copiarlos
+    """
+    if descriptor.nombre not in _SEGMENTOS:
+        memoria = SharedMemory(name=descriptor.nombre)
+        _SEGMENTOS[descriptor.nombre] = (memoria, _vistas(memoria, descriptor.campos))
+    return _SEGMENTOS[descriptor.nombre][1]
+
+
+############################################################
+# Input y flota
+############################################################
+def compartir_potencias(potencias) -> Compartido:
+    return Compartido(
+        {"consumos": potencias.consumos, "tiempos": np.array(potencias.tiempos, dtype=str)},
+        {"edificios": potencias.edificios},
+    )
+
+
+def potencias_compartidas(descriptor: Descriptor):
+    from classes.en_memoria import PotenciasEnMemoria
+
+    vistas = adjuntar(descriptor)
+    return PotenciasEnMemoria(vistas["consumos"], descriptor.extra["edificios"], vistas["tiempos"].tolist())
+
+
+def compartir_flota(flota) -> Compartido:
+    return Compartido(flota.arreglos, {"edificios": flota.edificios})
+
+
+def flota_compartida(descriptor: Descriptor):
+    from classes.edificio_vectorial import FlotaVectorial
+
+    return FlotaVectorial(descriptor.extra["edificios"], adjuntar(descriptor))
+
+
+@contextmanager
+def compartir_entrada(variables: List[str]) -> Iterator[Tuple[Descriptor | None, Descriptor | None]]:
+    """
+    Publica el input y la flota de la configuración actual, si
+    no cambian con los valores `variables`. Entrega sus descriptores
+    (None si cada trabajador debe leer o crear el suyo)
+    """
+    from classes.edificio_vectorial import FlotaVectorial
+    from classes.en_memoria import PotenciasEnMemoria
+    from classes.servicio import CLAVES_FLOTA, CLAVES_FLOTA_AL_AZAR
+    from classes.simulacion import crear_flota
+    from classes.timer import Timer
+
+    claves_flota = set(CLAVES_FLOTA + CLAVES_FLOTA_AL_AZAR + FlotaVectorial.CLAVES + ["MOTOR", "VIAJES_FILE"])
+    segmentos: List[Compartido] = []
+    potencias = flota = None
+    try:
+        if c.MEMORIA_COMPARTIDA and c.INPUT_FILE and "INPUT_FILE" not in variables:
+            entrada = PotenciasEnMemoria.leer_archivo(c.INPUT_FILE)
+            segmentos.append(compartir_potencias(entrada))
+            potencias = segmentos[-1].descriptor
+
+            if c.MOTOR != "objetos" and not c.VIAJES_FILE and not claves_flota & set(variables):
+                c.sembrar()
+                vehículos = FlotaVectorial.desde_flota(crear_flota(entrada.edificios, Timer()))
+                segmentos.append(compartir_flota(vehículos))
+                flota = segmentos[-1].descriptor
+
+        logger.warning(
+            f"Compartido - input {'compartido' if potencias else 'por trabajador'}, "
+            f"flota {'compartida' if flota else 'por trabajador'} "
+            f"[{sum(s.tamano for s in segmentos) / 2**20:.1f}MB]"
+        )
+        yield potencias, flota
+    finally:
+        for segmento in segmentos:
+            segmento.cerrar()
+
+
+############################################################
+# Trabajadores
+############################################################
+def _iniciar_trabajador(overrides: Dict[str, str]):
+    """
+    Cada proceso nuevo (spawn) parte con la configuración del padre
+    """
+    c.configurar(**overrides)
+    logging.basicConfig(encoding="utf-8", level=c.LOG_LEVEL, format="[%(levelname)s]\t%(message)s")
+
+
+def _simular(nombre: str, config: Dict, potencias: Descriptor | None, flota: Descriptor | None) -> str:
+    from classes.simulacion import Simulacion
+
+    with c.configuracion(**config):
+        s = Simulacion(
+            nombre,
+            archivo_potencias=c.INPUT_FILE,
+            potencias=potencias and potencias_compartidas(potencias),
+            flota=flota and flota_compartida(flota),
+        )
+        s.empezar()
+        return c.OUTPUT_FOLDER
+
+
+def barrido_en_paralelo(
+    nombre: str,
+    configs: List[Dict],
+    trabajadores: int,
+    potencias: Descriptor | None = None,
+    flota: Descriptor | None = None,
+) -> List[str]:
+    """
+    Corre una simulación por cada configuración en `trabajadores` procesos.
+    Sin descriptor, cada trabajador lee el input o crea la flota.
+    Retorna la carpeta de salida de cada una
+    """
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(trabajadores, len(configs)) or 1,
+        mp_context=contexto,
+        initializer=_iniciar_trabajador,
+        initargs=(dict(c.OVERRIDES),),
+    ) as pool:
+        futuros = [pool.submit(_simular, nombre, config, potencias, flota) for config in configs]
+        carpetas = []
+        for config, futuro in zip(configs, futuros):
+            carpetas.append(futuro.result())
+            logger.warning(f"Barrido - terminado {config}")
+        return carpetas
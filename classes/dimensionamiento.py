@@ -0,0 +1,163 @@
+"""
+DIMENSIONAMIENTO
+
+Busca, para cada edificio y politica, el menor valor de un parametro
+(POTENCIA_DECLARADA o TOPE_DE_CARGADORES) con el que ningún vehículo
+se queda sin batería ni sale sin la carga para su día.
+
+Cada candidato se evalúa sobre una copia del edificio, y la simulación
+se corta apenas falla, así la búsqueda cuesta unas pocas simulaciones
+parciales en vez de una grilla completa.
+
+Las fallas de los primeros días (dias_de_calentamiento) no cuentan,
+porque dependen de la batería inicial y no del parámetro.
+"""
+
+import copy
+import logging
+import os
+from typing import Dict, List
+
+import helpers.constants as c
+from classes.timer import Timer
+
+logger = logging.getLogger(__name__)
+
+# atributo del edificio que corresponde a cada parametro
+PARAMETROS = {
+    "POTENCIA_DECLARADA": "potencia_base",
+    "TOPE_DE_CARGADORES": "tope_de_cargadores",
+}
+
+HEADERS_DIMENSIONAMIENTO = [
+    "Edificio",
+    "Politica",
+    "Parametro",
+    "Valor Minimo",
+    "Evaluaciones",
+    "Ciclos Simulados",
+]
+
+
+class Dimensionamiento:
+    def __init__(self, simulacion, dias_de_calentamiento: int = 1):
+        """
+        Usa los edificios (y el input) de una simulación ya creada,
+        sin empezarla
+        """
+        self.simulacion = simulacion
+        self.dias_de_calentamiento = dias_de_calentamiento
+        # las filas se leen una vez y se reusan en cada evaluacion
+        self.filas: List[dict] = list(simulacion.input.leer(simulacion.archivo_potencias))
+
+        # total de ciclos simulados, para comparar con una grilla completa
+        self.ciclos_simulados = 0
+
+    def evaluar(self, edificio, atributo: str, valor: float) -> bool:
+        """
+        Simula una copia del edificio con el valor indicado, y retorna
+        False apenas un vehículo se queda sin batería o sale sin carga
+        """
+        timer = Timer()
+        memo = {id(edificio.timer): timer}
+        # con viajes, cada evaluación avanza su propio registro (los viajes se comparten)
+        registro = getattr(edificio, "registro", None)
+        if registro is not None:
+            memo[id(registro)] = copy.copy(registro)
+            memo[id(registro)].reiniciar()
+        # copiar el edificio partiendo desde cero con su propio timer
+        e = copy.deepcopy(edificio, memo=memo)
+        setattr(e, atributo, valor)
+
+        dia_inicial = None
+        for i, fila in enumerate(self.filas):
+            t = timer.set_hh_mm(fila["Tiempo"])
+            if registro is not None:
+                e.registro.avanzar(t)
+            e.simular_ciclo(t, fila[e.nombre])
+
+            dia_inicial = dia_inicial or t.date()
+            if (t.date() - dia_inicial).days < self.dias_de_calentamiento:
+                continue
+
+            if e.vehículos_agotados or e.salidas_sin_carga:
+                logger.info(
+                    f"Dimensionamiento - {e}: falla con {atributo}={valor} en {timer.actual_str}"
+                )
+                self.ciclos_simulados += i + 1
+                return False
+
+        self.ciclos_simulados += len(self.filas)
+        return True
+
+    def buscar(
+        self,
+        edificio,
+        parametro: str,
+        minimo: float,
+        maximo: float,
+        paso: float,
+    ) -> Dict:
+        """
+        Bisección sobre minimo, minimo + paso, ..., maximo, suponiendo
+        que si un valor funciona, cualquier valor mayor también
+        """
+        atributo = PARAMETROS[parametro]
+        ciclos_iniciales = self.ciclos_simulados
+        evaluaciones = 0
+
+        def valor(k: int) -> float:
+            v = minimo + k * paso
+            return int(v) if float(v).is_integer() else v
+
+        # k_ok siempre funciona, k_falla siempre falla
+        k_ok = int((maximo - minimo) // paso)
+        evaluaciones += 1
+        if not self.evaluar(edificio, atributo, valor(k_ok)):
+            logger.warning(f"Dimensionamiento - {edificio}: falla incluso con {parametro}={maximo}")
+            resultado = None
+        else:
+            k_falla = -1
+            while k_ok - k_falla > 1:
+                k = (k_ok + k_falla) // 2
+                evaluaciones += 1
+                if self.evaluar(edificio, atributo, valor(k)):
+                    k_ok = k
+                else:
+                    k_falla = k
+            resultado = valor(k_ok)
+
+        logger.warning(f"Dimensionamiento - {edificio}: {parametro}={resultado} [{evaluaciones=}]")
+        return {
+            "Edificio": edificio.nombre,
+            "Politica": edificio.tipo_edificio,
+            "Parametro": parametro,
+            "Valor Minimo": resultado,
+            "Evaluaciones": evaluaciones,
+            "Ciclos Simulados": self.ciclos_simulados - ciclos_iniciales,
+        }
+
+    def buscar_todos(
+        self,
+        parametro: str,
+        minimo: float,
+        maximo: float,
+        paso: float = 1,
+    ) -> List[Dict]:
+        if parametro not in PARAMETROS:
+            raise ValueError(f"Parametro no soportado: {parametro} [{list(PARAMETROS)}]")
+        if parametro == "TOPE_DE_CARGADORES" and not c.LIMITAR_CARGADORES:
+            raise ValueError("TOPE_DE_CARGADORES no tiene efecto con LIMITAR_CARGADORES=0")
+
+        return [
+            self.buscar(e, parametro, minimo, maximo, paso)
+            for e in self.simulacion.edificios
+        ]
+
+    def guardar(self, resultados: List[Dict], db):
+        os.makedirs(c.OUTPUT_FOLDER, exist_ok=True)
+        nombre = f"{c.OUTPUT_FOLDER}/Dimensionamiento.{c.OUTPUT_FORMAT}"
+        db.crear_archivo(nombre, HEADERS_DIMENSIONAMIENTO)
+        for r in resultados:
+            db.agregar_fila_en_memoria(nombre, [r[h] for h in HEADERS_DIMENSIONAMIENTO])
+        db.exportar_archivos()
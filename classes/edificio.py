@@ -1,14 +1,20 @@
 import copy
 import datetime
 import logging
+import math
+import time
 from random import randrange
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 
 import helpers.constants as c
+from classes.escenarios import Escenario, escenario_de_configuracion
+from classes.eventos import FinCicloEdificio, VehiculoEnCarga
 from classes.timer import Timer
 from classes.vehiculo import Vehiculo
+from helpers.kernels import planificar, repartir, siguientes_en_turno
+from helpers.utils import minutos_del_dia
 
 logger = logging.getLogger(__name__)
 
@@ -32,26 +38,47 @@ class Edificio:
     TIPO_FIFO = "FIFO"
     TIPO_RR = "RR"
     TIPO_INT = "INT"
+    TIPO_REP = "REP"
+    TIPO_ANT = "ANT"
 
     def __init__(
         self,
         nombre: str,
         timer: Timer,
+        cant_vehículos: int | None = None,
     ):
         self.nombre = nombre
-        self.tipo_edificio = ""  # FIFO/RoundRobin/Inteligente
+        self.tipo_edificio = ""  # FIFO/RoundRobin/Inteligente/Reparto/Anticipado
         self.timer = timer
 
-        # Potencia total disponible del edificio
+        # Potencia total disponible del edificio, y su valor fuera de fallas
         self.potencia_declarada = c.POTENCIA_DECLARADA
+        self.potencia_base = c.POTENCIA_DECLARADA
+
+        # máximo de vehículos cargando a la vez (si LIMITAR_CARGADORES)
+        self.tope_de_cargadores = c.TOPE_DE_CARGADORES
+        # máximo de vehículos cargando que permite el alimentador (ver Red)
+        self.tope_de_red: float = math.inf
 
         # potencia de los cargadores de vehículos
         self.potencia_cargadores: float = c.POTENCIA_CARGADORES
 
+        # fallas y alta demanda (la Simulacion asigna el de ESCENARIOS_FILE)
+        self.escenario: Escenario = escenario_de_configuracion()
+
         # potencia disponible, calculada durante la simulacion
         self.potencia_disponible: float | None = None
         self.potencia_usada_por_autos: float | None = None
 
+        # contadores del ciclo actual, usados en el resumen de la simulacion
+        self.autos_en_espera: int = 0  # querían cargar y no pudieron
+        self.vehículos_agotados: int = 0  # quedaron sin batería manejando
+        self.salidas_sin_carga: int = 0  # salieron sin el gasto total del día
+        self.demanda_no_cubierta: float = 0  # KWh que les faltaban al salir
+
+        # lista de eventos del ciclo, solo existe si hay observadores
+        self.eventos: List | None = None
+
         # colas de vehículos
         self.cola_de_espera: List[Vehiculo] = []
         self.cola_de_carga: List[Vehiculo] = []
@@ -60,7 +87,9 @@ class Edificio:
         self.vehículos: List[Vehiculo] = []
 
         # si no se especifican, toma una cant al azar
-        cant_v = c.VEHÍCULOS_POR_EDIFICIO or randrange(1, self.tope_vehículos + 1)
+        cant_v = cant_vehículos
+        if cant_v is None:
+            cant_v = c.VEHÍCULOS_POR_EDIFICIO or randrange(1, self.tope_vehículos + 1)
         for i in range(cant_v):
             # crear un nuevo vehiculo
             v = Vehiculo(f"VE{i + 1}")
@@ -71,6 +100,17 @@ class Edificio:
             # y agregarlo a la lista de vehículos
             self.vehículos.append(v)
 
+    def reconfigurar(self):
+        """
+        Vuelve a leer los valores de la configuración actual que no
+        cambian los vehículos, para reusar un edificio ya creado
+        """
+        self.potencia_declarada = c.POTENCIA_DECLARADA
+        self.potencia_base = c.POTENCIA_DECLARADA
+        self.tope_de_cargadores = c.TOPE_DE_CARGADORES
+        self.potencia_cargadores = c.POTENCIA_CARGADORES
+        self.escenario = escenario_de_configuracion()
+
     @property
     def tope_vehículos(self):
         """
@@ -83,35 +123,34 @@ class Edificio:
     def actualizar_potencia_disponible(
         self,
         t: datetime.datetime,
-        porcentaje_consumo: str,
+        porcentaje_consumo: str | float,
     ) -> None:
         """
         Se asigna al edificio actual en cada ciclo de tiempo
         """
         # si el porcentaje de consumo tiene una coma, reemplazarla por un punto
-        if "," in porcentaje_consumo:
+        if isinstance(porcentaje_consumo, str) and "," in porcentaje_consumo:
             porcentaje_consumo = porcentaje_consumo.replace(",", ".")
 
         porcentaje_disponible = 1 - (float(porcentaje_consumo) / 100 * c.FACTOR_DE_ESCALA / 100)
 
         # si es un periodo de falla, reducir la potencia total
-        if c.HAY_FALLA and Timer().time_in_range(
-            t, c.INICIO_HORARIO_FALLA, c.FINAL_HORARIO_FALLA
-        ):
+        nivel = self.escenario.nivel_de_falla(t, self.nombre)
+        if not math.isnan(nivel):
             logger.warning(
                 f"%s: Reducción por falla [t=%s, potencia_declarada=%.2f * %d%% -> %.2f, cargadores=%.1fKWh]",
                 self,
                 t.strftime("%H:%M"),
                 self.potencia_declarada,
-                c.REDUCCION_EN_FALLA,
-                self.potencia_declarada * c.REDUCCION_EN_FALLA / 100,
+                nivel,
+                self.potencia_declarada * nivel / 100,
                 c.POTENCIA_MIN_CARGADORES,
             )
-            self.potencia_declarada = c.POTENCIA_DECLARADA * c.REDUCCION_EN_FALLA / 100
+            self.potencia_declarada = self.potencia_base * nivel / 100
             self.potencia_cargadores = c.POTENCIA_MIN_CARGADORES
 
-        elif self.potencia_declarada != c.POTENCIA_DECLARADA:
-            self.potencia_declarada = c.POTENCIA_DECLARADA
+        elif self.potencia_declarada != self.potencia_base:
+            self.potencia_declarada = self.potencia_base
             self.potencia_cargadores = c.POTENCIA_CARGADORES
 
         self.potencia_disponible = self.potencia_declarada * porcentaje_disponible
@@ -125,27 +164,41 @@ class Edificio:
     ############################################################
     # Transformaciones
     # Estos metodos retornan una copia del edificio transformado
-    # a un FIFO/RoundRobin/Inteligente
+    # a un FIFO/RoundRobin/Inteligente/Reparto/Anticipado (que comparte el timer)
     ############################################################
     def copia_FIFO(self):
-        e = copy.deepcopy(self)
+        e = copy.deepcopy(self, memo={id(self.timer): self.timer})
         e.__class__ = EdificioFIFO
         e.tipo_edificio = self.TIPO_FIFO
         return e
 
     def copia_RoundRobin(self):
-        e = copy.deepcopy(self)
+        e = copy.deepcopy(self, memo={id(self.timer): self.timer})
         e.__class__ = EdificioRoundRobin
         e.tipo_edificio = self.TIPO_RR
         e.ultimo_v_cargado = 0
         return e
 
     def copia_Inteligente(self):
-        e = copy.deepcopy(self)
+        e = copy.deepcopy(self, memo={id(self.timer): self.timer})
         e.__class__ = EdificioInteligente
         e.tipo_edificio = self.TIPO_INT
         return e
 
+    def copia_Reparto(self):
+        e = copy.deepcopy(self, memo={id(self.timer): self.timer})
+        e.__class__ = EdificioReparto
+        e.tipo_edificio = self.TIPO_REP
+        e.potencias_de_carga = np.zeros(0)
+        return e
+
+    def copia_Anticipado(self):
+        e = copy.deepcopy(self, memo={id(self.timer): self.timer})
+        e.__class__ = EdificioAnticipado
+        e.tipo_edificio = self.TIPO_ANT
+        e.iniciar_planificacion()
+        return e
+
     ############################################################
     # Cola de espera
     ############################################################
@@ -160,26 +213,21 @@ class Edificio:
     ):
         # ordenar los autos a cargar, poniendo primero los que necesitan carga
         autos_a_cargar.sort(key=lambda v: v.necesita_carga, reverse=True)
+        alta_demanda = self.escenario.alta_demanda(t, self.nombre)
 
         for v in autos_a_cargar:
             bateria_actual = v.bateria / v.max_bateria
             message = ""
 
             # si estamos en horario de alta demanda y el auto tiene suficiente para el resto del dia, no agregar
-            if (
-                c.HAY_ALTA_DEMANDA
-                and self.timer.time_in_range(
-                    t, c.INICIO_HORARIO_ALTA_DEMANDA, c.FINAL_HORARIO_ALTA_DEMANDA
-                )
-            ):
+            if alta_demanda:
                 if bateria_actual >= v.gasto_total_del_dia:
                     logger.info(
-                        f"%s: %s - Saltando por horario de alta demanda [t=(%s<%s<%s), bateria=%.2f%%, necesita=%.2f%%, necesita_carga=%s]",
+                        f"%s: %s - Saltando por horario de alta demanda [t=%s, escenario=%s, bateria=%.2f%%, necesita=%.2f%%, necesita_carga=%s]",
                         self,
                         v,
-                        c.INICIO_HORARIO_ALTA_DEMANDA,
                         t.strftime("%H:%M"),
-                        c.FINAL_HORARIO_ALTA_DEMANDA,
+                        self.escenario.nombre,
                         bateria_actual,
                         v.gasto_total_del_dia,
                         v.necesita_carga,
@@ -216,8 +264,25 @@ class Edificio:
     ############################################################
     def agregar_a_cola_de_carga(self, v: Vehiculo):
         if v not in self.cola_de_carga and not self.cola_de_carga_llena:
-            logger.debug(f"{v}: agregando a cola de carga")
-            self.cola_de_carga.append(v)
+            self._entrar_a_cola_de_carga(v)
+
+    def _entrar_a_cola_de_carga(self, v: Vehiculo):
+        """
+        Agrega el vehículo sin revisar la capacidad ni si ya está
+        """
+        logger.debug("%s: agregando a cola de carga", v)
+        self.cola_de_carga.append(v)
+
+        if self.eventos is not None:
+            self.eventos.append(
+                VehiculoEnCarga(
+                    self.timer.tiempo_actual,
+                    self.nombre,
+                    self.tipo_edificio,
+                    v.nombre,
+                    v.bateria,
+                )
+            )
 
     def actualizar_cola_de_carga(self):
         while self.cola_de_espera and not self.cola_de_carga_llena:
@@ -233,14 +298,27 @@ class Edificio:
         raise NotImplementedError
 
     @property
-    def cola_de_carga_llena(self):
+    def capacidad_de_carga(self) -> int:
+        """
+        Cantidad de vehículos que se pueden cargar a la vez
+        """
         max_capacidad = int(self.potencia_disponible / self.potencia_cargadores)
 
-        if c.LIMITAR_CARGADORES and c.TOPE_DE_CARGADORES < max_capacidad:
-            max_capacidad = c.TOPE_DE_CARGADORES
+        if c.LIMITAR_CARGADORES and self.tope_de_cargadores < max_capacidad:
+            max_capacidad = self.tope_de_cargadores
+
+        # tope asignado por el alimentador del edificio (ver Red)
+        if self.tope_de_red < max_capacidad:
+            max_capacidad = self.tope_de_red
+
+        return max_capacidad
+
+    @property
+    def cola_de_carga_llena(self):
+        max_capacidad = self.capacidad_de_carga
 
         logger.debug(
-            f"cola_de_carga_llena? en_carga={len(self.cola_de_carga)} >= {max_capacidad=}"
+            "cola_de_carga_llena? en_carga=%s >= max_capacidad=%s", len(self.cola_de_carga), max_capacidad
         )
         return len(self.cola_de_carga) >= max_capacidad
 
@@ -271,6 +349,34 @@ class Edificio:
     def prioridad_de_vehículos(self):
         return [float(np.round(v.prioridad, 2)) for v in self.vehículos]
 
+    @property
+    def fraccion_de_bateria(self) -> np.ndarray:
+        """
+        Igual que bateria_de_vehículos, pero sin redondear
+        """
+        return np.array([v.bateria / v.max_bateria for v in self.vehículos])
+
+    @property
+    def prioridades(self) -> np.ndarray:
+        return np.array([v.prioridad for v in self.vehículos])
+
+    def huella(self) -> Tuple[tuple, np.ndarray]:
+        """
+        Estado del edificio que determina los días siguientes:
+        colas, viajes y potencias (exactos) y baterías (con tolerancia)
+        """
+        indice = {id(v): i for i, v in enumerate(self.vehículos)}
+        discreto = (
+            tuple(indice[id(v)] for v in self.cola_de_espera),
+            tuple(indice[id(v)] for v in self.cola_de_carga),
+            int(getattr(self, "ultimo_v_cargado", 0)),
+            tuple(v.siguiente_salida for v in self.vehículos),
+            tuple(v.en_el_edificio for v in self.vehículos),
+            self.potencia_declarada,
+            self.potencia_cargadores,
+        )
+        return discreto, np.array([v.bateria for v in self.vehículos])
+
     ############################################################
     # Simular paso del tiempo
     ############################################################
@@ -283,6 +389,9 @@ class Edificio:
 
         self.actualizar_potencia_disponible(t, porcentaje_consumo)
         self.potencia_usada_por_autos = 0
+        self.vehículos_agotados = 0
+        self.salidas_sin_carga = 0
+        self.demanda_no_cubierta = 0
 
         # los esto es para separar aquellos que necesitan carga para
         # su siguiente viaje y aquellos que solo no están a 100%
@@ -318,12 +427,27 @@ class Edificio:
 
         # cargar vehículos en cola de carga
         self.cargar_vehículos()
+        self.autos_en_espera = len(
+            [v for v in autos_a_cargar if v not in self.cola_de_carga]
+        )
 
         # sacar los que quedaron ok
         self.limpiar_cola_de_carga()
 
         logger.debug(f"{self}: finalmente {self.cola_de_carga=}")
 
+        if self.eventos is not None:
+            self.eventos.append(
+                FinCicloEdificio(
+                    t,
+                    self.nombre,
+                    self.tipo_edificio,
+                    self.potencia_disponible,
+                    self.potencia_usada_por_autos,
+                    self.autos_en_espera,
+                )
+            )
+
     ############################################################
     # Helper tools
     ############################################################
@@ -356,12 +480,7 @@ class EdificioFIFO(Edificio):
         
         # revisar limite segun potencia
         if self.cola_de_carga_llena:
-            max_capacidad = int(self.potencia_disponible / self.potencia_cargadores)
-
-            if c.LIMITAR_CARGADORES and c.TOPE_DE_CARGADORES < max_capacidad:
-                max_capacidad = c.TOPE_DE_CARGADORES
-
-            self.cola_de_carga = self.cola_de_carga[:max_capacidad]
+            self.cola_de_carga = self.cola_de_carga[: self.capacidad_de_carga]
 
 
 class EdificioRoundRobin(Edificio):
@@ -378,26 +497,28 @@ class EdificioRoundRobin(Edificio):
 
     def actualizar_cola_de_carga(self):
         """
-        En vez de la cola de espera, RoundRobin recorre la lista
-        de vehículos desde el último que cargó hasta que llena la
-        cola de carga o los recorre todos
+        En vez de la cola de espera, RoundRobin toma los vehículos
+        que pueden cargar desde el último que cargó hasta que llena la
+        cola de carga o los recorre todos (ver kernels.turno_rotativo).
+        Si la llena, el último que agregó pasa a ser el último que cargó
         """
-        v_inicial = int(self.ultimo_v_cargado)
-        total_vehículos = len(self.vehículos)
-
-        for i in range(1, total_vehículos + 1):
-            # si la cola está llena terminar el ciclo
-            if self.cola_de_carga_llena:
-                break
-
-            # obtener sgte vehículos en la lista
-            num_vehiculo = (i + v_inicial) % total_vehículos
-            v = self.vehículos[num_vehiculo]
-
-            if v.en_el_edificio and not v.cargado_full:
-                self.agregar_a_cola_de_carga(v)
+        faltan = int(self.capacidad_de_carga) - len(self.cola_de_carga)
+        if faltan <= 0:
+            return
+
+        en_cola = {id(v) for v in self.cola_de_carga}
+        puede_cargar = np.fromiter(
+            (v.en_el_edificio and not v.cargado_full and id(v) not in en_cola for v in self.vehículos),
+            bool,
+            count=len(self.vehículos),
+        )
+        elegidos, self.ultimo_v_cargado = siguientes_en_turno(
+            puede_cargar, int(self.ultimo_v_cargado), faltan
+        )
 
-            self.ultimo_v_cargado = num_vehiculo
+        # la capacidad y los que ya estaban en cola ya se revisaron
+        for i in elegidos.tolist():
+            self._entrar_a_cola_de_carga(self.vehículos[i])
 
         logger.debug(f"%s: actualizada {self.cola_de_carga=}", self)
 
@@ -438,3 +559,213 @@ class EdificioInteligente(Edificio):
         se repriorizan en cada iteracion
         """
         self.cola_de_carga = []
+
+
+class EdificioReparto(Edificio):
+    """
+    En vez de cargar a potencia completa a algunos vehículos, reparte
+    la potencia disponible entre todos los que esperan, cada uno entre
+    POTENCIA_MIN_CARGADORES y la potencia de los cargadores, según
+    cuánto les falta para el gasto del día (ver kernels.repartir)
+    """
+
+    def _agregar_a_cola_de_espera(self, v: Vehiculo):
+        # la cola se vacía en cada ciclo, no hay repetidos
+        self.cola_de_espera.append(v)
+
+    @property
+    def tope_de_autos(self) -> float:
+        """
+        Cargadores que se pueden usar a la vez, sin contar la potencia
+        """
+        tope = self.tope_de_red
+        if c.LIMITAR_CARGADORES and self.tope_de_cargadores < tope:
+            tope = self.tope_de_cargadores
+        return tope
+
+    def actualizar_cola_de_carga(self):
+        espera = self.cola_de_espera
+        bateria = np.array([v.bateria for v in espera])
+        max_bateria = np.array([v.max_bateria for v in espera])
+        prioridad = np.array([v.prioridad for v in espera])
+
+        horas = c.MINS_POR_CICLO / 60
+        # no pasar de lo que le falta para llenarse
+        maximo = np.minimum(self.potencia_cargadores, (max_bateria - bateria) / horas)
+        minimo = np.minimum(c.POTENCIA_MIN_CARGADORES, maximo)
+        peso = np.maximum(prioridad, 0) + c.REPARTO_PESO_MINIMO
+
+        potencias = repartir(self.potencia_disponible, peso, minimo, maximo, self.tope_de_autos)
+        en_carga = np.flatnonzero(potencias)
+        self.cola_de_carga = [espera[i] for i in en_carga.tolist()]
+        self.potencias_de_carga = potencias[en_carga]
+
+        if self.eventos is not None:
+            self.eventos.extend(
+                VehiculoEnCarga(
+                    self.timer.tiempo_actual,
+                    self.nombre,
+                    self.tipo_edificio,
+                    v.nombre,
+                    v.bateria,
+                )
+                for v in self.cola_de_carga
+            )
+
+    def cargar_vehículos(self):
+        horas = c.MINS_POR_CICLO / 60
+        for vehiculo, potencia in zip(self.cola_de_carga, self.potencias_de_carga.tolist()):
+            vehiculo.cargar(potencia * horas)
+
+    def limpiar_cola_de_carga(self):
+        """
+        Se reparte de nuevo en cada ciclo
+        """
+        self.cola_de_espera = []
+        self.cola_de_carga = []
+
+
+class EdificioAnticipado(Edificio):
+    """
+    Planifica la carga de los próximos ANTICIPACION_CICLOS ciclos, con el
+    consumo futuro del edificio (pronostico, lo entrega Simulacion) y la
+    siguiente salida de cada vehículo.
+
+    Cada auto reserva los ciclos más convenientes antes de salir (fuera de
+    fallas y de alta demanda, y lo más tarde posible) para cubrir su gasto
+    del día, y en el ciclo actual cargan los que reservaron este ciclo,
+    completando los cargadores libres según prioridad
+    """
+
+    def iniciar_planificacion(self):
+        self.ciclos_de_anticipacion = c.ANTICIPACION_CICLOS
+        # % de consumo de los ciclos siguientes al actual
+        self.pronostico: List = []
+
+        self.ciclos_planificados = 0
+        self.ms_planificando = 0.0
+        self.max_ms_planificando = 0.0
+
+    def _agregar_a_cola_de_espera(self, v: Vehiculo):
+        # la cola se vacía en cada ciclo, no hay repetidos
+        self.cola_de_espera.append(v)
+
+    def actualizar_cola_de_carga(self):
+        inicio = time.perf_counter()
+
+        espera = self.cola_de_espera
+        en_carga = self.plan_de_carga(
+            bateria=np.array([v.bateria for v in espera]),
+            max_bateria=np.array([v.max_bateria for v in espera]),
+            gasto_dia=np.array([v.gasto_total_del_dia for v in espera]),
+            salida=np.array([minutos_del_dia(v.salidas[v.siguiente_salida][0]) for v in espera]),
+            capacidad=self.capacidad_de_carga,
+        )
+        self.cola_de_carga = [espera[i] for i in en_carga]
+
+        if self.eventos is not None:
+            self.eventos.extend(
+                VehiculoEnCarga(
+                    self.timer.tiempo_actual,
+                    self.nombre,
+                    self.tipo_edificio,
+                    v.nombre,
+                    v.bateria,
+                )
+                for v in self.cola_de_carga
+            )
+
+        self.registrar_planificacion(inicio)
+
+    def limpiar_cola_de_carga(self):
+        """
+        Se planifica de nuevo en cada ciclo
+        """
+        self.cola_de_espera = []
+        self.cola_de_carga = []
+
+    ############################################################
+    # Planificación (compartida con EdificioVectorial)
+    ############################################################
+    def horizonte_de_carga(self, t: datetime.datetime, capacidad: int):
+        """
+        KWh de un cargador, cargadores disponibles y orden de conveniencia
+        de cada ciclo del horizonte (el 0 es el actual)
+        """
+        ciclos = self.ciclos_de_anticipacion
+        consumo = np.array([float(str(p).replace(",", ".")) for p in self.pronostico[: ciclos - 1]])
+        porcentaje_disponible = 1 - (consumo / 100 * c.FACTOR_DE_ESCALA / 100)
+        # después del pronóstico (o sin él, EJ: en linea) se asume que se mantiene
+        if len(porcentaje_disponible) < ciclos - 1:
+            if len(porcentaje_disponible):
+                ultimo = porcentaje_disponible[-1]
+            else:
+                ultimo = self.potencia_disponible / self.potencia_declarada
+            porcentaje_disponible = np.concatenate(
+                [porcentaje_disponible, np.full(ciclos - 1 - len(porcentaje_disponible), ultimo)]
+            )
+
+        nivel, alta_demanda = self.escenario.horizonte(t, ciclos, self.nombre)
+        nivel = nivel[1:]
+        falla = ~np.isnan(nivel)
+
+        # igual que actualizar_potencia_disponible y capacidad_de_carga
+        declarada = np.where(falla, self.potencia_base * nivel / 100, self.potencia_base)
+        cargadores = np.where(falla, c.POTENCIA_MIN_CARGADORES, c.POTENCIA_CARGADORES)
+        disponible = declarada * porcentaje_disponible
+        futura = np.floor(disponible / cargadores)
+        if c.LIMITAR_CARGADORES:
+            futura = np.minimum(futura, self.tope_de_cargadores)
+        futura = np.minimum(futura, self.tope_de_red)
+
+        capacidades = np.concatenate([[capacidad], futura]).clip(0).astype(np.int64)
+        energia = np.concatenate([[self.potencia_cargadores], cargadores]) * c.MINS_POR_CICLO / 60
+
+        # más energía primero, luego fuera de alta demanda, luego lo más tarde posible
+        preferencia = np.lexsort((-np.arange(ciclos), alta_demanda, -energia))
+        return energia, capacidades, preferencia
+
+    def plan_de_carga(
+        self,
+        bateria: np.ndarray,
+        max_bateria: np.ndarray,
+        gasto_dia: np.ndarray,
+        salida: np.ndarray,
+        capacidad: int,
+    ) -> List[int]:
+        """
+        Indices (de la cola de espera) de los vehículos que cargan en el ciclo
+        """
+        if capacidad <= 0 or not len(bateria):
+            return []
+
+        t = self.timer.tiempo_actual
+        energia, capacidades, preferencia = self.horizonte_de_carga(t, capacidad)
+
+        minutos = (salida - minutos_del_dia(t)) % (24 * 60)
+        plazo = np.ceil(minutos / c.MINS_POR_CICLO)
+        necesidad = np.maximum(gasto_dia * max_bateria - bateria, 0)
+        ahora = planificar(necesidad, plazo, energia, capacidades, preferencia)
+
+        # primero los que reservaron este ciclo, y el resto según prioridad
+        prioridad = gasto_dia - bateria / max_bateria
+        orden = np.lexsort((-prioridad, ~ahora))
+        return orden[:capacidad].tolist()
+
+    def registrar_planificacion(self, inicio: float):
+        ms = (time.perf_counter() - inicio) * 1000
+        self.ciclos_planificados += 1
+        self.ms_planificando += ms
+        self.max_ms_planificando = max(self.max_ms_planificando, ms)
+
+        if (
+            c.ANTICIPACION_PRESUPUESTO_MS
+            and ms > c.ANTICIPACION_PRESUPUESTO_MS
+            and self.ciclos_de_anticipacion > 1
+        ):
+            self.ciclos_de_anticipacion //= 2
+            logger.warning(
+                f"{self}: planificar tomó {ms:.2f}ms (presupuesto "
+                f"{c.ANTICIPACION_PRESUPUESTO_MS:g}ms), horizonte reducido a "
+                f"{self.ciclos_de_anticipacion} ciclos"
+            )
@@ -0,0 +1,600 @@
+import datetime
+import logging
+import math
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import helpers.constants as c
+from classes.edificio import Edificio, EdificioAnticipado, EdificioReparto
+from classes.escenarios import Escenario, escenario_de_configuracion
+from classes.eventos import (
+    BateriaAgotada,
+    FinCicloEdificio,
+    LlegadaVehiculo,
+    SalidaVehiculo,
+    VehiculoEnCarga,
+)
+from classes.timer import Timer
+from helpers.kernels import kernels_para
+from helpers.utils import minutos_del_dia
+
+logger = logging.getLogger(__name__)
+
+
+def arreglos_de_vehículos(vehículos: List) -> Dict[str, np.ndarray]:
+    """
+    Los datos de cada vehículo como arreglos de EdificioVectorial
+    (bateria, max_bateria, rendimiento, gasto_dia, salidas, cant_salidas y duracion)
+    """
+    max_viajes = max((len(v.salidas) for v in vehículos), default=1)
+
+    salidas = np.zeros((len(vehículos), max_viajes, 4))
+    duracion = np.zeros((len(vehículos), max_viajes))
+    pausa = datetime.timedelta(minutes=c.TOPE_TIEMPO_DE_MANEJO / 2)
+    for i, v in enumerate(vehículos):
+        for j, (salida, llegada) in enumerate(v.salidas):
+            salidas[i, j] = [
+                minutos_del_dia(salida),
+                minutos_del_dia(llegada),
+                minutos_del_dia(salida + pausa),
+                minutos_del_dia(llegada - pausa),
+            ]
+            duracion[i, j] = Timer.distancia_en_minutos(salida, llegada)
+
+    return {
+        "bateria": np.array([v.bateria for v in vehículos], dtype=np.float64),
+        "max_bateria": np.array([v.max_bateria for v in vehículos], dtype=np.float64),
+        "rendimiento": np.array([v.rendimiento for v in vehículos], dtype=np.float64),
+        "gasto_dia": np.array([v.gasto_total_del_dia for v in vehículos], dtype=np.float64),
+        "salidas": salidas,
+        "cant_salidas": np.array([len(v.salidas) for v in vehículos], dtype=np.int64),
+        "duracion": duracion,
+    }
+
+
+class EdificioVectorial:
+    """
+    Motor rápido de un edificio: el mismo ciclo de Edificio
+    (FIFO, RoundRobin, Inteligente, Reparto o Anticipado), pero con el estado de todos
+    sus vehículos en arreglos de numpy.
+
+    Se crea a partir de un edificio ya transformado, así ambos
+    motores parten de la misma flota:
+
+    ```
+    e = EdificioVectorial.desde_edificio(edificio.copia_FIFO(), motor="numba")
+    ```
+    """
+
+    # se reusan los cálculos por edificio, que no dependen de los vehículos
+    actualizar_potencia_disponible = Edificio.actualizar_potencia_disponible
+    tope_de_autos = EdificioReparto.tope_de_autos
+    iniciar_planificacion = EdificioAnticipado.iniciar_planificacion
+    horizonte_de_carga = EdificioAnticipado.horizonte_de_carga
+    plan_de_carga = EdificioAnticipado.plan_de_carga
+    registrar_planificacion = EdificioAnticipado.registrar_planificacion
+    __repr__ = Edificio.__repr__
+
+    def __init__(
+        self,
+        nombre: str,
+        tipo_edificio: str,
+        timer: Timer,
+        vehículos: List,
+        bateria: np.ndarray,
+        max_bateria: np.ndarray,
+        rendimiento: np.ndarray,
+        gasto_dia: np.ndarray,
+        salidas: np.ndarray,
+        cant_salidas: np.ndarray,
+        duracion: np.ndarray,
+        velocidad: float,
+        motor: str = "numpy",
+    ):
+        """
+        - salidas: minutos del día de (salida, llegada, inicio pausa, fin pausa)
+          de cada viaje, con forma (vehículos, viajes, 4)
+        - duracion: minutos de cada viaje, con forma (vehículos, viajes)
+        """
+        self.nombre = nombre
+        self.tipo_edificio = tipo_edificio
+        self.timer = timer
+        self.motor = motor
+
+        # solo se usan sus nombres para los archivos de salida
+        self.vehículos = vehículos
+
+        self.potencia_declarada = c.POTENCIA_DECLARADA
+        self.potencia_base = c.POTENCIA_DECLARADA
+        self.tope_de_cargadores = c.TOPE_DE_CARGADORES
+        self.tope_de_red: float = math.inf
+        self.potencia_cargadores: float = c.POTENCIA_CARGADORES
+        self.escenario: Escenario = escenario_de_configuracion()
+        self.potencia_disponible: float | None = None
+        self.potencia_usada_por_autos: float | None = None
+
+        self.autos_en_espera: int = 0
+        self.vehículos_agotados: int = 0
+        self.salidas_sin_carga: int = 0
+        self.demanda_no_cubierta: float = 0
+        self.eventos: List | None = None
+
+        # estado de los vehículos
+        self.bateria = bateria
+        self.max_bateria = max_bateria
+        self.rendimiento = rendimiento
+        self.gasto_dia = gasto_dia
+        self.velocidad = velocidad
+
+        self.salidas = salidas
+        self.cant_salidas = cant_salidas
+        # pausa de los viajes de más de TOPE_TIEMPO_DE_MANEJO
+        self.con_pausa = duracion >= c.TOPE_TIEMPO_DE_MANEJO
+        self.siguiente_salida = np.zeros(len(bateria), dtype=np.int64)
+        self.en_el_edificio = np.ones(len(bateria), dtype=bool)
+        self.indices = np.arange(len(bateria))
+
+        # colas con los indices de los vehículos
+        self.cola_de_espera: List[int] = []
+        self.cola_de_carga: List[int] = []
+        self.ultimo_v_cargado = 0
+        # potencia de cada vehículo en carga (solo Reparto)
+        self.potencias_de_carga = np.zeros(0)
+        # horizonte y costo de la planificación (solo Anticipado)
+        self.iniciar_planificacion()
+
+    @classmethod
+    def desde_edificio(cls, e: Edificio, motor: str = "numpy") -> "EdificioVectorial":
+        vehículos = e.vehículos
+        vectorial = cls(
+            nombre=e.nombre,
+            tipo_edificio=e.tipo_edificio,
+            timer=e.timer,
+            vehículos=vehículos,
+            velocidad=c.VELOCIDAD_PROMEDIO,
+            motor=motor,
+            **arreglos_de_vehículos(vehículos),
+        )
+        # copiar el estado actual, por si el edificio ya fue simulado
+        indice = {id(v): i for i, v in enumerate(vehículos)}
+        vectorial.siguiente_salida[:] = [v.siguiente_salida for v in vehículos]
+        vectorial.en_el_edificio[:] = [v.en_el_edificio for v in vehículos]
+        vectorial.cola_de_espera = [indice[id(v)] for v in e.cola_de_espera]
+        vectorial.cola_de_carga = [indice[id(v)] for v in e.cola_de_carga]
+        vectorial.ultimo_v_cargado = getattr(e, "ultimo_v_cargado", 0)
+        vectorial.potencia_declarada = e.potencia_declarada
+        vectorial.potencia_base = e.potencia_base
+        vectorial.tope_de_cargadores = e.tope_de_cargadores
+        vectorial.tope_de_red = e.tope_de_red
+        vectorial.potencia_cargadores = e.potencia_cargadores
+        vectorial.escenario = e.escenario
+        vectorial.ciclos_de_anticipacion = getattr(e, "ciclos_de_anticipacion", c.ANTICIPACION_CICLOS)
+        return vectorial
+
+    ############################################################
+    # Colas
+    ############################################################
+    @property
+    def kernels(self):
+        return kernels_para(self.motor)
+
+    @property
+    def capacidad(self) -> int:
+        capacidad = self.kernels.capacidad(
+            self.potencia_disponible,
+            self.potencia_cargadores,
+            c.LIMITAR_CARGADORES,
+            self.tope_de_cargadores,
+        )
+        if self.tope_de_red < capacidad:
+            capacidad = self.tope_de_red
+        return capacidad
+
+    def agregar_a_cola_de_espera(self, t: datetime.datetime, autos_a_cargar: np.ndarray):
+        # primero los que necesitan carga, manteniendo el orden de los vehículos
+        necesita_carga = self.necesita_carga[autos_a_cargar]
+        autos_a_cargar = np.concatenate(
+            [autos_a_cargar[necesita_carga], autos_a_cargar[~necesita_carga]]
+        )
+
+        # en alta demanda no se agregan los que tienen suficiente para el día
+        if self.escenario.alta_demanda(t, self.nombre):
+            bateria_actual = self.bateria[autos_a_cargar] / self.max_bateria[autos_a_cargar]
+            autos_a_cargar = autos_a_cargar[bateria_actual < self.gasto_dia[autos_a_cargar]]
+
+        if self.tipo_edificio == Edificio.TIPO_RR:
+            return
+
+        # Reparto y Anticipado vacían la cola en cada ciclo
+        if self.tipo_edificio in (Edificio.TIPO_REP, Edificio.TIPO_ANT):
+            self.cola_de_espera = autos_a_cargar.tolist()
+            return
+
+        nuevos = False
+        for v in autos_a_cargar.tolist():
+            if v not in self.cola_de_carga and v not in self.cola_de_espera:
+                self.cola_de_espera.append(v)
+                nuevos = True
+
+        # ordenar una sola vez equivale a ordenar en cada inserción (sort es estable)
+        if nuevos and self.tipo_edificio == Edificio.TIPO_INT:
+            prioridad = self.prioridad
+            self.cola_de_espera.sort(key=lambda v: prioridad[v], reverse=True)
+
+    def actualizar_cola_de_carga(self):
+        if self.tipo_edificio == Edificio.TIPO_REP:
+            self.repartir_potencia()
+            return
+
+        if self.tipo_edificio == Edificio.TIPO_ANT:
+            self.planificar_carga()
+            return
+
+        capacidad = self.capacidad
+
+        if self.tipo_edificio == Edificio.TIPO_RR:
+            elegidos, self.ultimo_v_cargado = self.kernels.turno_rotativo(
+                self.en_el_edificio,
+                self.bateria,
+                self.max_bateria,
+                self.cola_de_carga,
+                int(self.ultimo_v_cargado),
+                int(capacidad) - len(self.cola_de_carga),
+            )
+            self.cola_de_carga.extend(elegidos.tolist())
+            return
+
+        while self.cola_de_espera and len(self.cola_de_carga) < capacidad:
+            v = self.cola_de_espera.pop(0)
+            if v not in self.cola_de_carga:
+                self.cola_de_carga.append(v)
+
+    def repartir_potencia(self):
+        """
+        Igual que EdificioReparto.actualizar_cola_de_carga
+        """
+        espera = np.array(self.cola_de_espera, dtype=np.int64)
+        horas = c.MINS_POR_CICLO / 60
+        maximo = np.minimum(
+            self.potencia_cargadores, (self.max_bateria[espera] - self.bateria[espera]) / horas
+        )
+        minimo = np.minimum(c.POTENCIA_MIN_CARGADORES, maximo)
+        peso = np.maximum(self.prioridad[espera], 0) + c.REPARTO_PESO_MINIMO
+
+        potencias = self.kernels.repartir(
+            self.potencia_disponible, peso, minimo, maximo, self.tope_de_autos
+        )
+        en_carga = np.flatnonzero(potencias)
+        self.cola_de_carga = espera[en_carga].tolist()
+        self.potencias_de_carga = potencias[en_carga]
+
+    def planificar_carga(self):
+        """
+        Igual que EdificioAnticipado.actualizar_cola_de_carga
+        """
+        inicio = time.perf_counter()
+
+        espera = np.array(self.cola_de_espera, dtype=np.int64)
+        en_carga = self.plan_de_carga(
+            bateria=self.bateria[espera],
+            max_bateria=self.max_bateria[espera],
+            gasto_dia=self.gasto_dia[espera],
+            salida=self.salidas[espera, self.siguiente_salida[espera], 0],
+            capacidad=self.capacidad,
+        )
+        self.cola_de_carga = espera[en_carga].tolist()
+
+        self.registrar_planificacion(inicio)
+
+    def cargar_repartido(self) -> float:
+        """
+        Carga a cada vehículo su potencia del reparto.
+        Retorna la energía total usada por los cargadores
+        """
+        en_carga = np.array(self.cola_de_carga, dtype=np.int64)
+        energia = self.potencias_de_carga * (c.MINS_POR_CICLO / 60)
+        self.bateria[en_carga] = np.minimum(
+            self.bateria[en_carga] + energia, self.max_bateria[en_carga]
+        )
+
+        # sumar uno a uno, igual que Vehiculo.cargar
+        total = 0
+        for e in energia.tolist():
+            total += e
+        return total
+
+    def limpiar_cola_de_carga(self):
+        if self.tipo_edificio in (Edificio.TIPO_REP, Edificio.TIPO_ANT):
+            self.cola_de_espera = []
+        if self.tipo_edificio != Edificio.TIPO_FIFO:
+            self.cola_de_carga = []
+            return
+
+        # mismo recorrido que EdificioFIFO (que se salta el siguiente al sacar uno)
+        for v in self.cola_de_carga:
+            if self.bateria[v] == self.max_bateria[v]:
+                self.cola_de_carga.remove(v)
+
+        capacidad = self.capacidad
+        if len(self.cola_de_carga) >= capacidad:
+            self.cola_de_carga = self.cola_de_carga[:capacidad]
+
+    ############################################################
+    # Estado de los vehículos
+    ############################################################
+    @property
+    def prioridad(self) -> np.ndarray:
+        return self.kernels.prioridad(self.gasto_dia, self.bateria, self.max_bateria)
+
+    @property
+    def bateria_de_vehículos(self):
+        return np.round(self.bateria / self.max_bateria, 2).tolist()
+
+    @property
+    def prioridad_de_vehículos(self):
+        return np.round(self.prioridad, 2).tolist()
+
+    @property
+    def fraccion_de_bateria(self) -> np.ndarray:
+        return self.bateria / self.max_bateria
+
+    @property
+    def prioridades(self) -> np.ndarray:
+        return self.prioridad
+
+    def huella(self) -> Tuple[tuple, np.ndarray]:
+        """
+        Igual que Edificio.huella
+        """
+        discreto = (
+            tuple(self.cola_de_espera),
+            tuple(self.cola_de_carga),
+            int(self.ultimo_v_cargado),
+            tuple(self.siguiente_salida.tolist()),
+            tuple(self.en_el_edificio.tolist()),
+            self.potencia_declarada,
+            self.potencia_cargadores,
+        )
+        return discreto, self.bateria.copy()
+
+    def actualizar_status(self, t: datetime.datetime) -> np.ndarray:
+        """
+        Equivalente a Vehiculo.actualizar_status de todos los vehículos.
+        Retorna los vehículos que están manejando
+        """
+        minuto = minutos_del_dia(t)
+        self.necesita_carga = self.bateria < self.gasto_dia
+
+        viaje = self.salidas[self.indices, self.siguiente_salida]
+        fuera = (viaje[:, 0] <= minuto) & (minuto <= viaje[:, 1])
+
+        # primera salida del día: registrar la energía que les falta
+        salen = np.flatnonzero(fuera & self.en_el_edificio & (self.siguiente_salida == 0))
+        for v in salen.tolist():
+            faltante = self.gasto_dia[v] - self.bateria[v] / self.max_bateria[v]
+            if faltante > 0:
+                self.salidas_sin_carga += 1
+                self.demanda_no_cubierta += faltante * self.max_bateria[v]
+
+        llegan = fuera & (minuto == viaje[:, 1])
+        self.siguiente_salida[llegan] = (self.siguiente_salida[llegan] + 1) % self.cant_salidas[llegan]
+        self.en_el_edificio = ~fuera
+
+        # esta_manejando usa el viaje siguiente si recién llegó
+        viaje = self.salidas[self.indices, self.siguiente_salida]
+        en_pausa = (
+            self.con_pausa[self.indices, self.siguiente_salida]
+            & (viaje[:, 2] <= minuto)
+            & (minuto <= viaje[:, 3])
+        )
+        return fuera & ~en_pausa
+
+    def drenar(self, manejando: np.ndarray) -> int:
+        distancia = self.velocidad * c.MINS_POR_CICLO / 60
+        return self.kernels.drenar(self.bateria, self.rendimiento, manejando, distancia)
+
+    ############################################################
+    # Eventos (solo si hay observadores)
+    ############################################################
+    def registrar_movimientos(self, t: datetime.datetime, estaba: np.ndarray, antes: np.ndarray):
+        """
+        Salidas, llegadas y baterías agotadas del ciclo, a partir del estado
+        antes y después de actualizar_status y drenar (en el mismo orden que Vehiculo)
+        """
+        salen = estaba & ~self.en_el_edificio
+        llegan = ~estaba & self.en_el_edificio
+        agotados = (antes > 0) & (self.bateria == 0)
+        for v in np.flatnonzero(salen | llegan | agotados).tolist():
+            vehiculo = str(self.vehículos[v])
+            if salen[v]:
+                self.eventos.append(SalidaVehiculo(t, self.nombre, self.tipo_edificio, vehiculo, float(antes[v])))
+            elif llegan[v]:
+                self.eventos.append(LlegadaVehiculo(t, self.nombre, self.tipo_edificio, vehiculo, float(antes[v])))
+            if agotados[v]:
+                self.eventos.append(BateriaAgotada(t, self.nombre, self.tipo_edificio, vehiculo))
+
+    def registrar_cargas(self, en_carga: int):
+        """
+        Los vehículos que entraron a la cola de carga (en Reparto y
+        Anticipado, todos los de la cola), igual que Edificio
+        """
+        nuevos = self.cola_de_carga
+        if self.tipo_edificio not in (Edificio.TIPO_REP, Edificio.TIPO_ANT):
+            nuevos = nuevos[en_carga:]
+        self.eventos.extend(
+            VehiculoEnCarga(
+                self.timer.tiempo_actual,
+                self.nombre,
+                self.tipo_edificio,
+                str(self.vehículos[v]),
+                float(self.bateria[v]),
+            )
+            for v in nuevos
+        )
+
+    ############################################################
+    # Simular paso del tiempo
+    ############################################################
+    def simular_ciclo(
+        self,
+        t: datetime.datetime,
+        porcentaje_consumo: str,
+    ):
+        self.actualizar_potencia_disponible(t, porcentaje_consumo)
+        self.potencia_usada_por_autos = 0
+        self.vehículos_agotados = 0
+        self.salidas_sin_carga = 0
+        self.demanda_no_cubierta = 0
+
+        if self.eventos is not None:
+            estaba, antes = self.en_el_edificio.copy(), self.bateria.copy()
+        manejando = self.actualizar_status(t)
+
+        # sacar de las colas a los que están fuera
+        if self.cola_de_espera or self.cola_de_carga:
+            self.cola_de_espera = [v for v in self.cola_de_espera if self.en_el_edificio[v]]
+            self.cola_de_carga = [v for v in self.cola_de_carga if self.en_el_edificio[v]]
+
+        self.vehículos_agotados = self.drenar(manejando)
+        if self.eventos is not None:
+            self.registrar_movimientos(t, estaba, antes)
+
+        autos_a_cargar = np.flatnonzero(self.en_el_edificio & (self.bateria != self.max_bateria))
+        self.agregar_a_cola_de_espera(t, autos_a_cargar)
+        en_carga = len(self.cola_de_carga)
+        self.actualizar_cola_de_carga()
+        if self.eventos is not None:
+            self.registrar_cargas(en_carga)
+
+        if self.tipo_edificio == Edificio.TIPO_REP:
+            self.potencia_usada_por_autos = self.cargar_repartido()
+        else:
+            energia = self.potencia_cargadores * c.MINS_POR_CICLO / 60
+            self.potencia_usada_por_autos = self.kernels.cargar(
+                self.bateria, self.max_bateria, np.array(self.cola_de_carga, dtype=np.int64), energia
+            )
+        self.autos_en_espera = len(set(autos_a_cargar.tolist()) - set(self.cola_de_carga))
+
+        self.limpiar_cola_de_carga()
+
+        if self.eventos is not None:
+            self.eventos.append(
+                FinCicloEdificio(
+                    t,
+                    self.nombre,
+                    self.tipo_edificio,
+                    self.potencia_disponible,
+                    self.potencia_usada_por_autos,
+                    self.autos_en_espera,
+                )
+            )
+
+
+class EdificioViajes(EdificioVectorial):
+    """
+    Motor rápido con las salidas de un RegistroDeViajes en vez de
+    las salidas al azar de cada vehículo.
+
+    Todas las políticas de un edificio leen el mismo rango de vehículos
+    del registro, que avanza una vez por ciclo (ver Simulacion.empezar)
+    """
+
+    @classmethod
+    def desde_registro(cls, e: Edificio, registro, motor: str = "numpy") -> "EdificioViajes":
+        vectorial = cls.desde_edificio(e, motor=motor)
+        vectorial.registro = registro
+        vectorial.rango = registro.rango(e.nombre)
+        vectorial.dia = None
+        vectorial.km_del_ciclo = np.zeros(len(vectorial.bateria))
+        return vectorial
+
+    def actualizar_status(self, t: datetime.datetime) -> np.ndarray:
+        """
+        Igual que EdificioVectorial.actualizar_status, pero con
+        los viajes del registro
+        """
+        registro = self.registro
+
+        # el gasto del día depende de los viajes de cada día
+        if self.dia != registro.dia:
+            self.dia = registro.dia
+            self.gasto_dia = (
+                registro.km_del_dia[self.rango] / self.rendimiento / self.max_bateria
+                + c.HOLGURA_ALTA_DEMANDA / 100
+            )
+
+        self.necesita_carga = self.bateria < self.gasto_dia
+
+        # primera salida del día: registrar la energía que les falta
+        for v in registro.en_rango(registro.primeras_salidas, self.rango).tolist():
+            faltante = self.gasto_dia[v] - self.bateria[v] / self.max_bateria[v]
+            if faltante > 0:
+                self.salidas_sin_carga += 1
+                self.demanda_no_cubierta += faltante * self.max_bateria[v]
+
+        self.en_el_edificio = ~registro.fuera[self.rango]
+        self.km_del_ciclo = registro.km_del_ciclo[self.rango]
+        return self.km_del_ciclo > 0
+
+    def drenar(self, manejando: np.ndarray) -> int:
+        return self.kernels.drenar_distancias(self.bateria, self.rendimiento, self.km_del_ciclo)
+
+
+class FlotaVectorial:
+    """
+    Los datos de los vehículos de todos los edificios en arreglos, con los
+    vehículos de cada edificio seguidos (como en RegistroDeViajes).
+
+    Cada política crea su EdificioVectorial con vistas de su rango: solo
+    copia la batería, que es lo único que modifica, así la misma flota
+    sirve a varios procesos sin copiarla (ver Compartido)
+    """
+
+    # valores que cambian los arreglos, además de los que crean los vehículos
+    # (el gasto del día y las pausas de los viajes largos)
+    CLAVES = ["TOPE_TIEMPO_DE_MANEJO", "HAY_ALTA_DEMANDA", "HOLGURA_ALTA_DEMANDA"]
+
+    def __init__(self, edificios: List[str], arreglos: Dict[str, np.ndarray]):
+        """
+        - arreglos: los de arreglos_de_vehículos, más "nombres" (de cada
+          vehículo) e "inicio" (primer vehículo de cada edificio, y el total)
+        """
+        self.edificios = list(edificios)
+        self.arreglos = arreglos
+        self.indice = {nombre: i for i, nombre in enumerate(self.edificios)}
+
+    @classmethod
+    def desde_flota(cls, flota: List[Edificio]) -> "FlotaVectorial":
+        vehículos = [v for e in flota for v in e.vehículos]
+        arreglos = arreglos_de_vehículos(vehículos)
+        arreglos["nombres"] = np.array([f"{v}" for v in vehículos], dtype=str)
+        arreglos["inicio"] = np.cumsum([0] + [len(e.vehículos) for e in flota], dtype=np.int64)
+        return cls([e.nombre for e in flota], arreglos)
+
+    def edificio(self, nombre: str, tipo_edificio: str, timer: Timer, motor: str = "numpy") -> EdificioVectorial:
+        """
+        Igual a EdificioVectorial.desde_edificio de la copia de
+        `tipo_edificio` del edificio original, sin haber sido simulado
+        """
+        a = self.arreglos
+        i = self.indice[nombre]
+        rango = slice(int(a["inicio"][i]), int(a["inicio"][i + 1]))
+
+        return EdificioVectorial(
+            nombre=nombre,
+            tipo_edificio=tipo_edificio,
+            timer=timer,
+            vehículos=a["nombres"][rango].tolist(),
+            bateria=a["bateria"][rango].copy(),
+            max_bateria=a["max_bateria"][rango],
+            rendimiento=a["rendimiento"][rango],
+            gasto_dia=a["gasto_dia"][rango],
+            # con los viajes de relleno de la flota, que nunca se leen
+            salidas=a["salidas"][rango],
+            cant_salidas=a["cant_salidas"][rango],
+            duracion=a["duracion"][rango],
+            velocidad=c.VELOCIDAD_PROMEDIO,
+            motor=motor,
+        )
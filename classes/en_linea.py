@@ -0,0 +1,379 @@
+"""
+EN LINEA
+
+Corre las políticas de carga en vivo: las filas de potencias (Tiempo y
+el % de consumo de cada edificio) llegan de a una desde un archivo que
+se va escribiendo (como `tail -f`) o desde un socket local, y cada fila
+avanza todos los edificios apenas llega.
+
+Las decisiones de cada ciclo (potencia entregada a los autos de cada
+edificio y política) se publican en un .jsonl y a los clientes del
+socket. Se mide la latencia desde que llega cada fila hasta que se
+publican sus decisiones, contra un presupuesto por ciclo
+(EN_LINEA_PRESUPUESTO_MS), y al terminar se reportan sus percentiles.
+
+El formato es el mismo de un .csv (o .tsv) de potencias: la primera
+línea son los headers, y una línea con FIN termina la simulación.
+
+EJ: simular en vivo lo que envía el alimentador de prueba
+```
+python main.py online --puerto 8765 --decisiones decisiones.jsonl
+python main.py feed potencias.csv --puerto 8765 --cada 0.5
+```
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+import helpers.constants as c
+
+logger = logging.getLogger(__name__)
+
+FIN = "FIN"
+
+PERCENTILES = [50, 90, 99]
+
+
+class FilaEnLinea(NamedTuple):
+    valores: Dict[str, str]
+    # time.perf_counter() al recibirla
+    llegada: float
+
+
+class Decision(NamedTuple):
+    tiempo: str
+    edificio: str
+    politica: str
+    potencia_disponible: float
+    # KW entregados a los autos en el ciclo
+    potencia_autos: float
+    autos_en_espera: int
+    demanda_no_cubierta: float
+
+
+############################################################
+# Fuentes
+############################################################
+class FuenteEnLinea:
+    """
+    Junta en una cola las filas a medida que llegan. Tiene los mismos
+    metodos de DB que usa Simulacion (leer_headers y contar_filas)
+    """
+
+    def __init__(self, delimitador: str = ","):
+        self.delimitador = delimitador
+        self.headers: List[str] | None = None
+        self.cola: asyncio.Queue = asyncio.Queue()
+        self.headers_recibidos = asyncio.Event()
+
+    def recibir_linea(self, linea: str):
+        linea = linea.strip()
+        if not linea:
+            return
+
+        valores = next(csv.reader([linea], delimiter=self.delimitador))
+        if self.headers is None:
+            self.headers = valores
+            self.headers_recibidos.set()
+            return
+
+        if valores[0] == FIN:
+            self.cola.put_nowait(None)
+            return
+
+        # un alimentador que se reconecta vuelve a enviar los headers
+        if valores == self.headers:
+            return
+
+        if len(valores) != len(self.headers):
+            logger.warning(f"EnLinea - fila con {len(valores)} columnas en vez de {len(self.headers)}: {linea}")
+            return
+
+        self.cola.put_nowait(FilaEnLinea(dict(zip(self.headers, valores)), time.perf_counter()))
+
+    async def siguiente(self, inactividad: float = 0) -> FilaEnLinea | None:
+        """
+        La siguiente fila, o None si llegó FIN o pasaron `inactividad`
+        segundos sin filas
+        """
+        try:
+            return await asyncio.wait_for(self.cola.get(), inactividad or None)
+        except asyncio.TimeoutError:
+            logger.warning(f"EnLinea - {inactividad}s sin filas, terminando")
+            return None
+
+    def leer_headers(self, nombre: str | None = None) -> List[str]:
+        return self.headers
+
+    def contar_filas(self, nombre: str | None = None) -> int | None:
+        # no se sabe cuántas filas van a llegar
+        return None
+
+    async def iniciar(self):
+        raise NotImplementedError
+
+    async def publicar(self, datos: bytes):
+        pass
+
+    async def cerrar(self):
+        pass
+
+
+class ArchivoEnVivo(FuenteEnLinea):
+    """
+    Lee las líneas que se van agregando al final de un archivo
+    """
+
+    def __init__(self, nombre: str, intervalo: float = 0.05):
+        super().__init__("\t" if nombre.endswith(".tsv") else ",")
+        self.nombre = nombre
+        # segundos entre cada revisión del archivo
+        self.intervalo = intervalo
+        self.tarea: asyncio.Task | None = None
+
+    async def iniciar(self):
+        self.tarea = asyncio.create_task(self._seguir())
+        logger.warning(f"EnLinea - siguiendo '{self.nombre}'")
+
+    async def _seguir(self):
+        while not os.path.exists(self.nombre):
+            await asyncio.sleep(self.intervalo)
+
+        with open(self.nombre, newline="") as archivo:
+            pendiente = ""
+            while True:
+                linea = archivo.readline()
+                if not linea:
+                    await asyncio.sleep(self.intervalo)
+                    continue
+
+                # la última línea puede estar a medio escribir
+                pendiente += linea
+                if not pendiente.endswith("\n"):
+                    continue
+                self.recibir_linea(pendiente)
+                pendiente = ""
+
+    async def cerrar(self):
+        if self.tarea:
+            self.tarea.cancel()
+
+
+class SocketEnVivo(FuenteEnLinea):
+    """
+    Servidor TCP local: cada cliente envía los headers y luego las filas,
+    y recibe las decisiones de cada ciclo
+    """
+
+    def __init__(self, puerto: int, host: str = "127.0.0.1"):
+        super().__init__(",")
+        self.host = host
+        self.puerto = puerto
+        self.servidor: asyncio.AbstractServer | None = None
+        self.clientes: List[asyncio.StreamWriter] = []
+
+    async def iniciar(self):
+        self.servidor = await asyncio.start_server(self._atender, self.host, self.puerto)
+        logger.warning(f"EnLinea - escuchando en {self.host}:{self.puerto}")
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clientes.append(writer)
+        try:
+            async for linea in reader:
+                self.recibir_linea(linea.decode())
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # la simulación terminó con el cliente conectado
+            pass
+        finally:
+            self.clientes.remove(writer)
+            writer.close()
+
+    async def publicar(self, datos: bytes):
+        for writer in list(self.clientes):
+            writer.write(datos)
+            # esperar a los clientes lentos en vez de acumular sin límite
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def cerrar(self):
+        for writer in list(self.clientes):
+            writer.close()
+        if self.servidor:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+
+
+############################################################
+# Simulación
+############################################################
+class SimulacionEnLinea:
+    def __init__(
+        self,
+        fuente: FuenteEnLinea,
+        nombre: str,
+        presupuesto_ms: float | None = None,
+        decisiones: str | None = None,
+        inactividad: float | None = None,
+    ):
+        self.fuente = fuente
+        self.nombre = nombre
+        self.presupuesto_ms = c.EN_LINEA_PRESUPUESTO_MS if presupuesto_ms is None else presupuesto_ms
+        self.decisiones = c.EN_LINEA_DECISIONES if decisiones is None else decisiones
+        self.inactividad = c.EN_LINEA_INACTIVIDAD if inactividad is None else inactividad
+
+        self.simulacion = None
+        self.latencias: List[float] = []
+        self.fuera_de_presupuesto = 0
+
+    async def correr(self) -> Dict[str, float]:
+        """
+        Simula las filas a medida que llegan y retorna el reporte de latencias
+        """
+        # importar aquí para no crear un import circular con Simulacion
+        from classes.simulacion import Simulacion
+
+        await self.fuente.iniciar()
+        archivo = self._abrir_decisiones()
+        try:
+            await self.fuente.headers_recibidos.wait()
+            self.simulacion = Simulacion(self.nombre, potencias=self.fuente)
+            self.simulacion.iniciar()
+
+            while (fila := await self.fuente.siguiente(self.inactividad)) is not None:
+                # el ciclo corre en otro hilo, así las filas que llegan
+                # mientras tanto se reciben (y se mide su espera)
+                estados = await asyncio.to_thread(self.simulacion.simular_fila, fila.valores)
+                await self._publicar(estados, archivo)
+                self._registrar_latencia(fila)
+
+                # la salida y los observadores quedan fuera del presupuesto
+                self.simulacion.cerrar_ciclo()
+
+            self.simulacion.terminar()
+        finally:
+            await self.fuente.cerrar()
+            if archivo and archivo is not sys.stdout:
+                archivo.close()
+
+        reporte = self.reporte()
+        logger.warning(f"EnLinea - {reporte}")
+        return reporte
+
+    def _abrir_decisiones(self):
+        if not self.decisiones:
+            return None
+        if self.decisiones == "-":
+            return sys.stdout
+        return open(self.decisiones, "a", encoding="utf-8")
+
+    async def _publicar(self, estados: List, archivo):
+        tiempo = self.simulacion.timer.actual_str
+        horas = c.MINS_POR_CICLO / 60
+        lineas = "".join(
+            json.dumps(
+                Decision(
+                    tiempo,
+                    e.nombre,
+                    e.tipo_edificio,
+                    float(e.potencia_disponible),
+                    float(e.potencia_usada_por_autos) / horas,
+                    int(e.autos_en_espera),
+                    float(e.demanda_no_cubierta),
+                )._asdict(),
+                ensure_ascii=False,
+            )
+            + "\n"
+            for e in estados
+        )
+        if archivo:
+            archivo.write(lineas)
+            archivo.flush()
+        await self.fuente.publicar(lineas.encode())
+
+    def _registrar_latencia(self, fila: FilaEnLinea):
+        latencia = (time.perf_counter() - fila.llegada) * 1000
+        self.latencias.append(latencia)
+        if latencia > self.presupuesto_ms:
+            self.fuera_de_presupuesto += 1
+            logger.warning(
+                f"EnLinea - {fila.valores['Tiempo']}: {latencia:.1f}ms, "
+                f"sobre el presupuesto de {self.presupuesto_ms:g}ms "
+                f"[filas esperando={self.fuente.cola.qsize()}]"
+            )
+
+    def reporte(self) -> Dict[str, float]:
+        reporte = {"ciclos": len(self.latencias), "fuera_de_presupuesto": self.fuera_de_presupuesto}
+        if self.latencias:
+            latencias = np.array(self.latencias)
+            for p, valor in zip(PERCENTILES, np.percentile(latencias, PERCENTILES)):
+                reporte[f"p{p}_ms"] = round(float(valor), 3)
+            reporte["max_ms"] = round(float(latencias.max()), 3)
+        return reporte
+
+
+############################################################
+# Alimentador de prueba
+############################################################
+def alimentar(
+    origen: str,
+    archivo: str | None = None,
+    puerto: int | None = None,
+    cada: float = 1.0,
+    host: str = "127.0.0.1",
+    mostrar: bool = False,
+):
+    """
+    Envía las filas de un archivo de potencias de a una, cada `cada`
+    segundos, agregándolas a `archivo` o a un socket en `puerto`
+    """
+    from classes.database import DB
+
+    db = DB()
+    headers = db.leer_headers(origen)
+    filas = ([fila[h] for h in headers] for fila in db.leer(origen))
+
+    if archivo:
+        delimitador = "\t" if archivo.endswith(".tsv") else ","
+        with open(archivo, "w", newline="") as salida:
+            _enviar(csv.writer(salida, delimiter=delimitador), salida.flush, headers, filas, cada)
+        return
+
+    with socket.create_connection((host, puerto)) as conexion:
+        # leer las decisiones para que no se llene el buffer del servidor
+        lector = threading.Thread(target=_recibir, args=(conexion, mostrar), daemon=True)
+        lector.start()
+        with conexion.makefile("w", newline="") as salida:
+            _enviar(csv.writer(salida), salida.flush, headers, filas, cada)
+        lector.join()
+
+
+def _enviar(writer, flush, headers, filas, cada: float):
+    writer.writerow(headers)
+    flush()
+    for fila in filas:
+        writer.writerow(fila)
+        flush()
+        time.sleep(cada)
+    writer.writerow([FIN])
+    flush()
+
+
+def _recibir(conexion: socket.socket, mostrar: bool):
+    with conexion.makefile("r", encoding="utf-8") as entrada:
+        for linea in entrada:
+            if mostrar:
+                print(linea, end="")
@@ -0,0 +1,183 @@
+"""
+EN MEMORIA
+
+Permite usar la simulación como librería, sin leer ni escribir archivos:
+las potencias se entregan como una matriz y los resultados se reciben
+como arreglos de numpy.
+
+EJ: 96 ciclos de 15 minutos para 2 edificios
+```
+resultado = simular(
+    consumos=np.random.uniform(20, 90, size=(96, 2)),
+    edificios=["Edificio A", "Edificio B"],
+    config={"MOTOR": "numpy", "TOPE_DE_CARGADORES": 3},
+)
+resultado["potencia_usada_por_autos"]  # (ciclos, edificios)
+```
+"""
+
+import datetime
+import logging
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+import helpers.constants as c
+from classes.edificio import Edificio
+
+logger = logging.getLogger(__name__)
+
+
+class PotenciasEnMemoria:
+    """
+    Reemplaza al archivo de potencias: mismos metodos de DB
+    (leer_headers, leer y contar_filas) pero sobre una matriz
+    de (ciclos, edificios) con el % de consumo de cada edificio
+    """
+
+    def __init__(
+        self,
+        consumos: np.ndarray,
+        edificios: Sequence[str],
+        tiempos: Sequence[str] | None = None,
+    ):
+        self.consumos = np.asarray(consumos, dtype=np.float64)
+        self.edificios = list(edificios)
+
+        if self.consumos.ndim != 2 or self.consumos.shape[1] != len(self.edificios):
+            raise ValueError(
+                f"Se esperaba una matriz de (ciclos, {len(self.edificios)}) "
+                f"[shape={self.consumos.shape}]"
+            )
+
+        # por defecto, ciclos de MINS_POR_CICLO desde las 0:00
+        if tiempos is None:
+            tiempos = [
+                f"{m // 60 % 24}:{m % 60:02d}"
+                for m in range(0, len(self.consumos) * c.MINS_POR_CICLO, c.MINS_POR_CICLO)
+            ]
+        self.tiempos = list(tiempos)
+
+    @classmethod
+    def leer_archivo(cls, nombre: str) -> "PotenciasEnMemoria":
+        """
+        Lee un archivo de potencias (csv, tsv, xlsx o sqlite) una vez,
+        para simularlo varias veces sin volver a leerlo
+        """
+        from classes.database import DB
+
+        db = DB()
+        edificios = db.leer_headers(nombre)[1:]
+        tiempos, consumos = [], []
+        for fila in db.leer(nombre):
+            tiempos.append(fila["Tiempo"])
+            consumos.append([float(str(fila[e]).replace(",", ".")) for e in edificios])
+        return cls(np.array(consumos).reshape(-1, len(edificios)), edificios, tiempos)
+
+    def leer_headers(self, nombre: str | None = None) -> List[str]:
+        return ["Tiempo"] + self.edificios
+
+    def leer(self, nombre: str | None = None):
+        for tiempo, fila in zip(self.tiempos, self.consumos.tolist()):
+            row = dict(zip(self.edificios, fila))
+            row["Tiempo"] = tiempo
+            yield row
+
+    def contar_filas(self, nombre: str | None = None) -> int:
+        return len(self.consumos)
+
+
+class SalidaEnMemoria:
+    """
+    Reemplaza a la base de datos de salida: guarda el estado de cada
+    ciclo en arreglos en vez de escribirlo a archivos
+    """
+
+    # valores por edificio en cada ciclo
+    CAMPOS = [
+        "potencia_disponible",
+        "potencia_usada_por_autos",
+        "autos_en_espera",
+        "vehículos_agotados",
+        "salidas_sin_carga",
+        "demanda_no_cubierta",
+    ]
+
+    def __init__(self):
+        self.tiempos: List[str] = []
+        self.ciclos: Dict[str, List[np.ndarray]] = {}
+        self.lotes_pendientes = 0
+
+    def crear_archivo_de_edificios(self, edificios: List):
+        self.edificios = [e.nombre for e in edificios]
+        self.politicas = [e.tipo_edificio for e in edificios]
+        self.columna = {f"{e}": i for i, e in enumerate(edificios)}
+        self.max_vehículos = max(len(e.vehículos) for e in edificios)
+
+        self.ciclos = {campo: [] for campo in self.CAMPOS + ["bateria", "prioridad"]}
+        self._nuevo_ciclo()
+
+    def _nuevo_ciclo(self):
+        cant = len(self.edificios)
+        self.actual = {campo: np.zeros(cant) for campo in self.CAMPOS}
+        # los edificios con menos vehículos quedan con NaN
+        self.actual["bateria"] = np.full((cant, self.max_vehículos), np.nan)
+        self.actual["prioridad"] = np.full((cant, self.max_vehículos), np.nan)
+
+    def guardar_estado_de_edificio(self, tiempo: str, e):
+        i = self.columna[f"{e}"]
+        if not self.tiempos or self.tiempos[-1] != tiempo:
+            self.tiempos.append(tiempo)
+
+        for campo in self.CAMPOS:
+            self.actual[campo][i] = getattr(e, campo)
+
+        bateria = e.fraccion_de_bateria
+        self.actual["bateria"][i, : len(bateria)] = bateria
+        # solo el edificio inteligente usa prioridades
+        if e.tipo_edificio == Edificio.TIPO_INT:
+            self.actual["prioridad"][i, : len(bateria)] = e.prioridades
+
+    def fin_de_ciclo(self):
+        for campo, valores in self.actual.items():
+            self.ciclos[campo].append(valores)
+        self._nuevo_ciclo()
+
+    def exportar_archivos(self):
+        pass
+
+    @property
+    def resultado(self) -> Dict[str, np.ndarray | List[str]]:
+        """
+        - tiempos, edificios, politicas: listas para indexar los arreglos
+        - potencia_disponible, potencia_usada_por_autos, ...: (ciclos, edificios)
+        - bateria, prioridad: (ciclos, edificios, vehículos)
+        """
+        resultado: Dict[str, np.ndarray | List[str]] = {
+            "tiempos": self.tiempos,
+            "edificios": self.edificios,
+            "politicas": self.politicas,
+        }
+        for campo, valores in self.ciclos.items():
+            resultado[campo] = np.stack(valores) if valores else np.empty(0)
+        return resultado
+
+
+def simular(
+    consumos: np.ndarray,
+    edificios: Sequence[str],
+    tiempos: Sequence[str] | None = None,
+    config: Dict | None = None,
+    nombre: str = "En memoria",
+) -> Dict[str, np.ndarray | List[str]]:
+    """
+    Corre una simulación completa sin archivos, con los valores de
+    `config` reemplazando a los de env.txt solo durante esta simulación
+    """
+    # importar aquí para no crear un import circular con Simulacion
+    from classes.simulacion import Simulacion
+
+    with c.configuracion(**(config or {})):
+        potencias = PotenciasEnMemoria(consumos, edificios, tiempos)
+        s = Simulacion(nombre, potencias=potencias)
+        return s.empezar(salida=SalidaEnMemoria()).resultado
@@ -0,0 +1,322 @@
+"""
+ESCENARIOS
+
+Fallas y periodos de alta demanda de cada edificio. Se leen de un
+archivo (csv, tsv, xlsx o sqlite, ESCENARIOS_FILE) con una fila por evento:
+
+    Escenario, Evento, Edificio, Inicio, Final, Nivel
+
+EJ:
+```
+Escenario,Evento,Edificio,Inicio,Final,Nivel
+corte-norte,falla,Edificio 1,18:00,20:00,10
+corte-norte,falla,Edificio 2,1 07:00,1 09:30,0
+corte-norte,alta_demanda,,22:00,00:00,
+ola-de-calor,falla,*,13:00,16:00,60
+```
+
+- Evento: falla (la potencia declarada baja al Nivel % y los cargadores
+  a POTENCIA_MIN_CARGADORES) o alta_demanda (no cargan los vehículos que
+  ya tienen el gasto del día)
+- Edificio: vacío o * para todos los edificios
+- Inicio y Final: HH:MM se repite todos los días (si Final < Inicio pasa
+  la medianoche), D HH:MM es solo desde el día D (0 = el primer día del input)
+- Nivel: % de la potencia declarada que queda en la falla (vacío =
+  REDUCCION_EN_FALLA). Si hay varias fallas a la vez se usa la menor
+
+Se simula el escenario ESCENARIO del archivo (o el único que tenga).
+Sin ESCENARIOS_FILE, HAY_FALLA y HAY_ALTA_DEMANDA forman un escenario
+con una ventana diaria para todos los edificios.
+
+Cada minuto del día (y cada día con eventos fechados) se compila una vez
+en una fila con el nivel de falla y la alta demanda de cada edificio, así
+en cada ciclo los edificios solo leen su columna.
+"""
+
+import datetime
+import functools
+import logging
+import math
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+import helpers.constants as c
+from classes.timer import Timer
+from helpers.utils import minutos_del_dia
+
+logger = logging.getLogger(__name__)
+
+HEADERS_ESCENARIOS = ["Escenario", "Evento", "Edificio", "Inicio", "Final", "Nivel"]
+
+FALLA = "falla"
+ALTA_DEMANDA = "alta_demanda"
+
+MINUTOS_DEL_DIA = 24 * 60
+
+# (día o None si se repite todos los días, minuto del día)
+Hora = Tuple[int | None, float]
+
+
+def leer_hora(valor) -> Hora:
+    """
+    "HH:MM" (todos los días) o "D HH:MM" (solo el día D)
+    """
+    texto = str(valor).strip()
+    dia = None
+    if " " in texto:
+        dia, texto = texto.split(None, 1)
+        dia = int(dia)
+    hora = Timer.str_to_time(texto)
+    return dia, hora.hour * 60 + hora.minute
+
+
+class Evento(NamedTuple):
+    tipo: str
+    # None = todos los edificios
+    edificio: str | None
+    inicio: Hora
+    final: Hora
+    # % de la potencia declarada que queda (solo fallas)
+    nivel: float
+
+    @property
+    def fechado(self) -> bool:
+        return self.inicio[0] is not None
+
+    def dias(self) -> range:
+        return range(self.inicio[0], self.final[0] + 1) if self.fechado else range(0)
+
+    def activo(self, dia: int | None, minuto: float) -> bool:
+        """
+        Igual que Timer.time_in_range para los eventos diarios
+        """
+        if self.fechado:
+            if dia is None:
+                return False
+            ahora = dia * MINUTOS_DEL_DIA + minuto
+            return (
+                self.inicio[0] * MINUTOS_DEL_DIA + self.inicio[1]
+                <= ahora
+                <= self.final[0] * MINUTOS_DEL_DIA + self.final[1]
+            )
+        inicio, final = self.inicio[1], self.final[1]
+        if inicio <= final:
+            return inicio <= minuto <= final
+        return minuto >= inicio or minuto <= final
+
+
+class Escenario:
+    """
+    Eventos de un escenario, consultados por tiempo y edificio.
+    No cambia al simular, así que las copias de los edificios lo comparten
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        eventos: List[Evento],
+        edificios: List[str] | None = None,
+        fecha_inicial: datetime.date | None = None,
+    ):
+        self.nombre = nombre
+        self.eventos = eventos
+        self.fecha_inicial = fecha_inicial or datetime.date.today()
+
+        # una columna por edificio con eventos propios, y la última para el resto
+        con_eventos = {e.edificio for e in eventos if e.edificio is not None}
+        desconocidos = con_eventos - set(edificios or con_eventos)
+        if desconocidos:
+            logger.warning(f"Escenario {nombre} - edificios que no están en el input: {sorted(desconocidos)}")
+        self.columnas: Dict[str, int] = {e: i for i, e in enumerate(sorted(con_eventos))}
+
+        # días con eventos fechados, el resto usa las filas diarias
+        self.dias_fechados = {dia for e in eventos for dia in e.dias()}
+
+        # (día, minuto) -> (nivel de falla, alta demanda) de cada columna
+        self._filas: Dict[Tuple[int | None, float], Tuple[List[float], List[bool]]] = {}
+        # filas ya compiladas según los eventos activos
+        self._por_activos: Dict[Tuple[int, ...], Tuple[List[float], List[bool]]] = {}
+        self._t: datetime.datetime | None = None
+        self._fila_t: Tuple[List[float], List[bool]] | None = None
+        self._horizonte: Tuple | None = None
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self) -> str:
+        return f"Escenario({self.nombre}, {len(self.eventos)} eventos)"
+
+    @property
+    def fechado(self) -> bool:
+        return bool(self.dias_fechados)
+
+    def _compilar(self, activos: Tuple[int, ...]) -> Tuple[List[float], List[bool]]:
+        nivel = np.full(len(self.columnas) + 1, np.nan)
+        demanda = np.zeros(len(self.columnas) + 1, dtype=bool)
+        for i in activos:
+            evento = self.eventos[i]
+            columnas = slice(None) if evento.edificio is None else self.columnas[evento.edificio]
+            if evento.tipo == FALLA:
+                nivel[columnas] = np.fmin(nivel[columnas], evento.nivel)
+            else:
+                demanda[columnas] = True
+        return nivel.tolist(), demanda.tolist()
+
+    def fila(self, t: datetime.datetime) -> Tuple[List[float], List[bool]]:
+        """
+        Nivel de falla (NaN = sin falla) y alta demanda de cada columna en `t`
+        """
+        # todos los edificios de un ciclo consultan el mismo t
+        if t is self._t:
+            return self._fila_t
+
+        minuto = minutos_del_dia(t)
+        dia = (t.date() - self.fecha_inicial).days if self.dias_fechados else None
+        if dia not in self.dias_fechados:
+            dia = None
+
+        fila = self._filas.get((dia, minuto))
+        if fila is None:
+            activos = tuple(i for i, e in enumerate(self.eventos) if e.activo(dia, minuto))
+            fila = self._por_activos.get(activos)
+            if fila is None:
+                fila = self._por_activos[activos] = self._compilar(activos)
+            self._filas[(dia, minuto)] = fila
+
+        self._t, self._fila_t = t, fila
+        return fila
+
+    def nivel_de_falla(self, t: datetime.datetime, edificio: str) -> float:
+        """
+        % de la potencia declarada que queda, NaN si no hay falla
+        """
+        return self.fila(t)[0][self.columnas.get(edificio, -1)]
+
+    def alta_demanda(self, t: datetime.datetime, edificio: str) -> bool:
+        return self.fila(t)[1][self.columnas.get(edificio, -1)]
+
+    def horizonte(self, t: datetime.datetime, ciclos: int, edificio: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nivel de falla y alta demanda del edificio en los `ciclos`
+        ciclos desde t (el 0 es el actual)
+        """
+        if self._horizonte is None or self._horizonte[0] is not t or self._horizonte[1] != ciclos:
+            paso = datetime.timedelta(minutes=c.MINS_POR_CICLO)
+            self._horizonte = (t, ciclos, [self.fila(t + paso * k) for k in range(ciclos)])
+        columna = self.columnas.get(edificio, -1)
+        filas = self._horizonte[2]
+        return (
+            np.array([nivel[columna] for nivel, _ in filas]),
+            np.array([demanda[columna] for _, demanda in filas], dtype=bool),
+        )
+
+
+############################################################
+# Archivo y configuración
+############################################################
+def leer_escenarios(nombre: str) -> Dict[str, List[Evento]]:
+    """
+    Eventos de cada escenario del archivo, en su orden
+    """
+    from classes.database import DB
+
+    escenarios: Dict[str, List[Evento]] = {}
+    for n, fila in enumerate(DB().leer(nombre), start=2):
+        tipo = str(fila["Evento"]).strip().lower()
+        if tipo not in (FALLA, ALTA_DEMANDA):
+            raise ValueError(f"Evento invalido en {nombre}:{n} [{tipo=}], se espera {FALLA} o {ALTA_DEMANDA}")
+
+        edificio = str(fila.get("Edificio") or "").strip()
+        inicio, final = leer_hora(fila["Inicio"]), leer_hora(fila["Final"])
+        if (inicio[0] is None) != (final[0] is None):
+            raise ValueError(f"Inicio y Final deben tener día los dos, o ninguno, en {nombre}:{n}")
+        if inicio[0] is not None and inicio > final:
+            raise ValueError(f"El evento termina antes de empezar en {nombre}:{n} [{inicio=}, {final=}]")
+
+        nivel = str(fila.get("Nivel") or "").strip()
+        evento = Evento(
+            tipo=tipo,
+            edificio=None if edificio in ("", "*") else edificio,
+            inicio=inicio,
+            final=final,
+            nivel=float(nivel.replace(",", ".")) if nivel else c.REDUCCION_EN_FALLA,
+        )
+        escenarios.setdefault(str(fila["Escenario"]).strip(), []).append(evento)
+
+    logger.warning(
+        f"Escenarios - {nombre}: "
+        + ", ".join(f"{e} ({len(eventos)} eventos)" for e, eventos in escenarios.items())
+    )
+    return escenarios
+
+
+@functools.lru_cache(maxsize=8)
+def _escenario_de_configuracion(
+    hay_falla: bool,
+    falla: Tuple[str, str, float],
+    hay_alta_demanda: bool,
+    alta_demanda: Tuple[str, str],
+) -> Escenario:
+    eventos = []
+    if hay_falla:
+        inicio, final, nivel = falla
+        eventos.append(Evento(FALLA, None, leer_hora(inicio), leer_hora(final), nivel))
+    if hay_alta_demanda:
+        inicio, final = alta_demanda
+        eventos.append(Evento(ALTA_DEMANDA, None, leer_hora(inicio), leer_hora(final), math.nan))
+    return Escenario("configuracion", eventos)
+
+
+def escenario_de_configuracion() -> Escenario:
+    """
+    La ventana diaria de HAY_FALLA y HAY_ALTA_DEMANDA, para todos los edificios
+    """
+    return _escenario_de_configuracion(
+        c.HAY_FALLA,
+        (c.INICIO_HORARIO_FALLA, c.FINAL_HORARIO_FALLA, c.REDUCCION_EN_FALLA),
+        c.HAY_ALTA_DEMANDA,
+        (c.INICIO_HORARIO_ALTA_DEMANDA, c.FINAL_HORARIO_ALTA_DEMANDA),
+    )
+
+
+def escenario_actual(edificios: List[str], fecha_inicial: datetime.date) -> Escenario:
+    """
+    El escenario ESCENARIO de ESCENARIOS_FILE, o el de la configuración
+    """
+    if not c.ESCENARIOS_FILE:
+        return escenario_de_configuracion()
+
+    escenarios = leer_escenarios(c.ESCENARIOS_FILE)
+    nombre = c.ESCENARIO
+    if not nombre and len(escenarios) == 1:
+        nombre = next(iter(escenarios))
+    if nombre not in escenarios:
+        raise ValueError(f"Escenario invalido [ESCENARIO={nombre!r}], el archivo tiene {list(escenarios)}")
+    return Escenario(nombre, escenarios[nombre], edificios, fecha_inicial)
+
+
+############################################################
+# Varios escenarios con la misma flota
+############################################################
+def simular_escenarios(nombre: str, configs: List[Dict]):
+    """
+    Corre una simulación por configuración en este proceso, leyendo
+    el input y creando la flota una sola vez (si no es el motor de objetos
+    ni hay viajes, en ese caso cada simulación crea la suya)
+    """
+    from classes.edificio_vectorial import FlotaVectorial
+    from classes.en_memoria import PotenciasEnMemoria
+    from classes.simulacion import Simulacion, crear_flota
+
+    potencias = PotenciasEnMemoria.leer_archivo(c.INPUT_FILE)
+    flota = None
+    if c.MOTOR != "objetos" and not c.VIAJES_FILE:
+        c.sembrar()
+        flota = FlotaVectorial.desde_flota(crear_flota(potencias.edificios, Timer()))
+
+    for config in configs:
+        with c.configuracion(**config):
+            logger.warning(f"Escenarios - {config}")
+            s = Simulacion(nombre, archivo_potencias=c.INPUT_FILE, potencias=potencias, flota=flota)
+            s.empezar()
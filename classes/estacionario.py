@@ -0,0 +1,246 @@
+"""
+REGIMEN ESTACIONARIO
+
+Con potencias que se repiten día a día, y salidas que se repiten cada
+día (siguiente_salida vuelve a 0), los edificios suelen llegar después
+de unos días a un estado periódico, y el resto de la simulación repite
+siempre el mismo día.
+
+Al final de cada día se toma la huella de cada edificio (baterías, colas
+y último vehículo cargado). Si se repite con la del día anterior (dentro
+de ESTACIONARIO_TOLERANCIA), el edificio se congela: deja de simularse
+y cada ciclo entrega lo grabado en su último día.
+
+Mientras está congelado, cada ciclo revisa que la hora y el consumo sean
+los mismos que los grabados. Si alguno cambia, el edificio se reactiva:
+se simulan de nuevo los ciclos del día sobre su estado congelado (que es
+el estado al inicio de cada día repetido) y se sigue normalmente.
+"""
+
+import datetime
+import logging
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from classes.edificio import Edificio
+
+logger = logging.getLogger(__name__)
+
+
+class EstadoGrabado:
+    """
+    Los valores que la salida lee de un edificio en un ciclo
+    """
+
+    __repr__ = Edificio.__repr__
+
+    def __init__(self, e):
+        self.nombre = e.nombre
+        self.tipo_edificio = e.tipo_edificio
+        self.vehículos = e.vehículos
+
+        self.potencia_disponible = e.potencia_disponible
+        self.potencia_usada_por_autos = e.potencia_usada_por_autos
+        self.autos_en_espera = e.autos_en_espera
+        self.vehículos_agotados = e.vehículos_agotados
+        self.salidas_sin_carga = e.salidas_sin_carga
+        self.demanda_no_cubierta = e.demanda_no_cubierta
+
+        self.fraccion_de_bateria = e.fraccion_de_bateria
+        self.bateria_de_vehículos = e.bateria_de_vehículos
+
+        # solo el edificio inteligente usa prioridades
+        self.prioridades = None
+        self.prioridad_de_vehículos = None
+        if e.tipo_edificio == Edificio.TIPO_INT:
+            self.prioridades = e.prioridades
+            self.prioridad_de_vehículos = e.prioridad_de_vehículos
+
+
+class CicloGrabado(NamedTuple):
+    tiempo: str
+    t: datetime.datetime
+    porcentaje_consumo: str | float
+    estado: EstadoGrabado
+    eventos: tuple
+
+
+class Seguimiento:
+    """
+    Estado del regimen de un edificio
+    """
+
+    def __init__(self):
+        self.huella = None
+        # ciclos del día en curso
+        self.dia: List[CicloGrabado] = []
+        # día que se repite mientras está congelado
+        self.plantilla: List[CicloGrabado] | None = None
+        self.indice = 0
+
+    @property
+    def congelado(self) -> bool:
+        return self.plantilla is not None
+
+
+class RegimenEstacionario:
+    """
+    Reemplaza a `e.simular_ciclo` en Simulacion.empezar:
+
+    ```
+    regimen = RegimenEstacionario(tolerancia=0)
+    for rows in filas:
+        t = timer.set_hh_mm(rows["Tiempo"])
+        regimen.inicio_ciclo(t)
+        for e in edificios:
+            estado = regimen.simular_ciclo(e, t, rows["Tiempo"], rows[e.nombre])
+            output.guardar_estado_de_edificio(tiempo, e=estado)
+    regimen.terminar()
+    ```
+    """
+
+    def __init__(self, tolerancia: float = 0):
+        # diferencia máxima de batería (KWh) para considerar dos días iguales
+        self.tolerancia = tolerancia
+        self.seguimientos: Dict[int, Seguimiento] = {}
+        self.edificios: Dict[int, object] = {}
+        self.fecha: datetime.date | None = None
+
+        self.congelados = 0
+        self.reactivaciones = 0
+        self.ciclos_repetidos = 0
+
+    ############################################################
+    # Ciclos
+    ############################################################
+    def inicio_ciclo(self, t: datetime.datetime):
+        """
+        Al pasar al día siguiente se cierra el día de cada edificio
+        """
+        if self.fecha is not None and t.date() != self.fecha:
+            for clave, s in self.seguimientos.items():
+                self._cerrar_dia(self.edificios[clave], s)
+        self.fecha = t.date()
+
+    def simular_ciclo(
+        self,
+        e,
+        t: datetime.datetime,
+        tiempo: str,
+        porcentaje_consumo: str | float,
+    ):
+        """
+        Simula (o repite) el ciclo del edificio y retorna lo que
+        se debe guardar en la salida
+        """
+        clave = id(e)
+        if clave not in self.seguimientos:
+            self.seguimientos[clave] = Seguimiento()
+            self.edificios[clave] = e
+        s = self.seguimientos[clave]
+
+        if s.congelado:
+            ciclo = s.plantilla[s.indice] if s.indice < len(s.plantilla) else None
+            if (
+                ciclo is not None
+                and ciclo.tiempo == tiempo
+                and ciclo.porcentaje_consumo == porcentaje_consumo
+            ):
+                s.indice += 1
+                self.ciclos_repetidos += 1
+                if e.eventos is not None:
+                    e.eventos.extend(
+                        evento._replace(tiempo=self._mismo_dia(t, evento.tiempo))
+                        for evento in ciclo.eventos
+                    )
+                return ciclo.estado
+
+            logger.warning(f"Regimen - {e}: el input cambió a las {tiempo}, reactivando")
+            self._reactivar(e, s, t)
+
+        return self._simular(e, s, t, tiempo, porcentaje_consumo)
+
+    def terminar(self):
+        """
+        Deja los edificios congelados en su estado final real
+        """
+        for clave, s in self.seguimientos.items():
+            if s.congelado:
+                self._reactivar(self.edificios[clave], s, None)
+
+        logger.warning(
+            f"Regimen - {self.congelados} congelados, "
+            f"{self.reactivaciones} reactivados, "
+            f"{self.ciclos_repetidos} ciclos de edificio repetidos"
+        )
+
+    ############################################################
+    # Helpers
+    ############################################################
+    def _simular(self, e, s: Seguimiento, t, tiempo, porcentaje_consumo) -> EstadoGrabado:
+        eventos = len(e.eventos) if e.eventos is not None else 0
+        e.simular_ciclo(t, porcentaje_consumo=porcentaje_consumo)
+
+        estado = EstadoGrabado(e)
+        s.dia.append(
+            CicloGrabado(
+                tiempo,
+                t,
+                porcentaje_consumo,
+                estado,
+                tuple(e.eventos[eventos:]) if e.eventos is not None else (),
+            )
+        )
+        return estado
+
+    def _cerrar_dia(self, e, s: Seguimiento):
+        if s.congelado:
+            if s.indice == len(s.plantilla):
+                s.indice = 0
+                return
+
+            # un día más corto que el grabado no deja el mismo estado
+            logger.warning(f"Regimen - {e}: el día cambió de largo, reactivando")
+            self._reactivar(e, s, None)
+
+        huella = e.huella()
+        if s.huella is not None and self._iguales(s.huella, huella):
+            logger.info(f"Regimen - {e}: estado periódico desde {self.fecha}, congelando")
+            s.plantilla = s.dia
+            s.indice = 0
+            self.congelados += 1
+        s.huella = huella
+        s.dia = []
+
+    def _reactivar(self, e, s: Seguimiento, t: datetime.datetime | None):
+        """
+        El estado congelado es el del inicio del día, así que basta
+        con volver a simular los ciclos ya repetidos de este día
+        """
+        repetidos = s.plantilla[: s.indice]
+        s.plantilla = None
+        s.indice = 0
+        s.huella = None
+        s.dia = []
+        self.reactivaciones += 1
+
+        # los eventos se graban pero no se entregan, porque ya se
+        # entregaron al repetir los ciclos
+        eventos = e.eventos
+        e.eventos = [] if eventos is not None else None
+        for ciclo in repetidos:
+            fecha = self._mismo_dia(t, ciclo.t) if t else ciclo.t
+            self._simular(e, s, fecha, ciclo.tiempo, ciclo.porcentaje_consumo)
+        e.eventos = eventos
+
+    def _iguales(self, a, b) -> bool:
+        discreto_a, bateria_a = a
+        discreto_b, bateria_b = b
+        return discreto_a == discreto_b and np.allclose(
+            bateria_a, bateria_b, rtol=0, atol=self.tolerancia
+        )
+
+    @staticmethod
+    def _mismo_dia(t: datetime.datetime, grabado: datetime.datetime) -> datetime.datetime:
+        return datetime.datetime.combine(t.date(), grabado.time())
@@ -0,0 +1,115 @@
+"""
+EVENTOS
+
+Eventos emitidos durante la simulación y el registro de observadores.
+
+Los eventos se juntan durante cada ciclo y se entregan en un solo lote
+al terminarlo. Si no hay observadores registrados no se crea ninguno.
+
+Todos los motores emiten los mismos eventos en el mismo orden: el motor
+rápido (EdificioVectorial) los arma comparando el estado de sus arreglos
+antes y después de cada paso del ciclo.
+
+EJ: contar cuántos autos salieron sin batería
+```
+s = Simulacion("Super City", archivo_potencias=INPUT_FILE)
+s.registrar_observador(
+    lambda eventos: print(len(eventos)),
+    tipos=(BateriaAgotada,),
+)
+s.empezar()
+```
+"""
+
+import datetime
+import logging
+from typing import Callable, List, NamedTuple, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class InicioCiclo(NamedTuple):
+    tiempo: datetime.datetime
+
+
+class FinCiclo(NamedTuple):
+    tiempo: datetime.datetime
+
+
+class FinCicloEdificio(NamedTuple):
+    tiempo: datetime.datetime
+    edificio: str
+    politica: str
+    potencia_disponible: float
+    potencia_usada_por_autos: float
+    autos_en_espera: int
+
+
+class VehiculoEnCarga(NamedTuple):
+    tiempo: datetime.datetime
+    edificio: str
+    politica: str
+    vehiculo: str
+    bateria: float
+
+
+class SalidaVehiculo(NamedTuple):
+    tiempo: datetime.datetime
+    edificio: str
+    politica: str
+    vehiculo: str
+    bateria: float
+
+
+class LlegadaVehiculo(NamedTuple):
+    tiempo: datetime.datetime
+    edificio: str
+    politica: str
+    vehiculo: str
+    bateria: float
+
+
+class BateriaAgotada(NamedTuple):
+    tiempo: datetime.datetime
+    edificio: str
+    politica: str
+    vehiculo: str
+
+
+Evento = (
+    InicioCiclo
+    | FinCiclo
+    | FinCicloEdificio
+    | VehiculoEnCarga
+    | SalidaVehiculo
+    | LlegadaVehiculo
+    | BateriaAgotada
+)
+Observador = Callable[[List[Evento]], None]
+
+
+class Observadores:
+    """
+    Lista de observadores, cada uno con los tipos de evento que le interesan
+    (o todos si no se especifican)
+    """
+
+    def __init__(self):
+        self.suscripciones: List[Tuple[Observador, Tuple[Type, ...] | None]] = []
+
+    def registrar(self, observador: Observador, tipos: Tuple[Type, ...] | None = None):
+        self.suscripciones.append((observador, tipos))
+
+    @property
+    def activos(self) -> bool:
+        return bool(self.suscripciones)
+
+    def despachar(self, eventos: List[Evento]):
+        for observador, tipos in self.suscripciones:
+            if tipos is None:
+                lote = eventos
+            else:
+                lote = [e for e in eventos if isinstance(e, tipos)]
+
+            if lote:
+                observador(lote)
@@ -0,0 +1,377 @@
+"""
+FRAGMENTOS
+
+Divide una ciudad en fragmentos que se simulan por separado (EJ: en
+varias máquinas) y luego se unen en los mismos resultados de una sola
+simulación.
+
+Un fragmento (FRAGMENTO) se indica con:
+
+    rango:INICIO:FIN   edificios INICIO a FIN - 1 (en el orden de los headers)
+    hash:K/N           edificios cuyo crc32 del nombre, módulo N, es K
+
+Con RED_FILE el hash se calcula con el nombre de la subestación, para
+que cada alimentador y subestación quede completo en un fragmento.
+
+Cada fragmento escribe su salida y un Manifiesto.json; `unir` junta las
+carpetas de todos los fragmentos en la salida de la ciudad completa.
+
+EJ: 4 fragmentos y la ciudad completa
+```
+python main.py run --fragmento hash:0/4 --output-folder out/0
+...
+python main.py run --fragmento hash:3/4 --output-folder out/3
+python main.py merge out/0 out/1 out/2 out/3 --output-folder out/ciudad
+```
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+import zlib
+from typing import Dict, List
+
+import helpers.constants as c
+from classes.database import (
+    DB,
+    HEADERS_EDIFICIOS_LARGO,
+    HEADERS_VEHICULOS_LARGO,
+    MODO_DELTA,
+    MODO_RESUMEN,
+    MODOS_LARGOS,
+)
+from classes.edificio import Edificio
+from classes.red import HEADERS_RED
+from classes.resumen import HEADERS_RESUMEN, Resumen
+
+logger = logging.getLogger(__name__)
+
+MANIFIESTO = "Manifiesto.json"
+
+# valores que pueden cambiar entre los fragmentos de una misma simulación
+CLAVES_POR_FRAGMENTO = {
+    "FRAGMENTO",
+    "OUTPUT_FOLDER",
+    "TELEMETRIA_ARCHIVO",
+    "TELEMETRIA_PUERTO",
+    "OUTPUT_EN_SEGUNDO_PLANO",
+    "OUTPUT_TAMANO_COLA",
+    "OUTPUT_CICLOS_POR_VOLCADO",
+    "LOG_LEVEL",
+}
+
+
+class Fragmento:
+    def __init__(self, spec: str):
+        self.spec = spec
+        tipo, _, valor = spec.partition(":")
+        try:
+            if tipo == "rango":
+                inicio, fin = valor.split(":")
+                self.inicio, self.fin = int(inicio), int(fin)
+                valido = 0 <= self.inicio < self.fin
+            elif tipo == "hash":
+                k, n = valor.split("/")
+                self.k, self.n = int(k), int(n)
+                valido = 0 <= self.k < self.n
+            else:
+                valido = False
+        except ValueError:
+            valido = False
+        if not valido:
+            raise ValueError(f"Fragmento invalido '{spec}', se espera rango:INICIO:FIN o hash:K/N")
+        self.tipo = tipo
+
+    def __repr__(self) -> str:
+        return self.spec
+
+    def seleccionar(self, edificios: List[str], grupos: Dict[str, str] | None = None) -> List[str]:
+        """
+        Los edificios de este fragmento. `grupos` (edificio -> subestación)
+        son los que deben quedar juntos
+        """
+        grupos = grupos or {}
+        if self.tipo == "hash":
+            return [
+                e
+                for e in edificios
+                if zlib.crc32(grupos.get(e, e).encode("utf-8")) % self.n == self.k
+            ]
+
+        seleccion = edificios[self.inicio : self.fin]
+        dentro = {grupos[e] for e in seleccion if e in grupos}
+        fuera = {grupos[e] for e in edificios if e in grupos and e not in seleccion}
+        if dentro & fuera:
+            raise ValueError(
+                f"El fragmento {self} separa las subestaciones {sorted(dentro & fuera)}, usar hash:K/N"
+            )
+        return seleccion
+
+
+def grupos_de_red() -> Dict[str, str] | None:
+    """
+    Subestación de cada edificio, si hay RED_FILE
+    """
+    if not c.RED_FILE:
+        return None
+    from classes.red import Topologia
+
+    topologia = Topologia.leer(c.RED_FILE)
+    return {
+        e: topologia.subestacion_de_alimentador[a]
+        for e, a in topologia.alimentador_de_edificio.items()
+    }
+
+
+############################################################
+# Manifiesto
+############################################################
+def archivos_de_salida(edificios: List[Edificio]) -> List[str]:
+    """
+    Archivos que escribe la simulación (sin la carpeta)
+    """
+    if c.OUTPUT_MODO == MODO_RESUMEN:
+        archivos = [DB.archivo_de_resumen()]
+    elif c.OUTPUT_MODO in MODOS_LARGOS:
+        archivos = [DB.archivo_de_ciclos()] if c.OUTPUT_MODO == MODO_DELTA else []
+        for politica in dict.fromkeys(e.tipo_edificio for e in edificios):
+            archivos += [DB.archivo_largo("Edificios", politica), DB.archivo_largo("Vehiculos", politica)]
+    else:
+        archivos = []
+        for e in edificios:
+            archivos.append(DB.archivo_de_edificio(e))
+            if e.tipo_edificio == Edificio.TIPO_INT:
+                archivos.append(DB.archivo_de_edificio(e, "Prioridades "))
+    if c.RED_FILE:
+        archivos.append(f"{c.OUTPUT_FOLDER}/Red.{c.OUTPUT_FORMAT}")
+    return [os.path.basename(a) for a in archivos]
+
+
+def guardar_manifiesto(simulacion, tiempos: List[str]):
+    """
+    Describe la salida de un fragmento, para unirla con las de los otros
+    """
+    todos = simulacion.input.leer_headers(nombre=simulacion.archivo_potencias)[1:]
+    indice = {e: i for i, e in enumerate(todos)}
+    nombres = list(dict.fromkeys(e.nombre for e in simulacion.edificios))
+
+    manifiesto = {
+        "fragmento": c.FRAGMENTO,
+        "total_edificios": len(todos),
+        "edificios": [[indice[e], e] for e in nombres],
+        "politicas": list(dict.fromkeys(e.tipo_edificio for e in simulacion.edificios)),
+        "modo": c.OUTPUT_MODO,
+        "formato": c.OUTPUT_FORMAT,
+        "config": {k: v for k, v in c.config.items() if k not in CLAVES_POR_FRAGMENTO},
+        "tiempos": tiempos,
+        "archivos": archivos_de_salida(simulacion.edificios),
+    }
+    if simulacion.output.resumen:
+        manifiesto["resumen"] = simulacion.output.resumen.datos()
+
+    with open(os.path.join(c.OUTPUT_FOLDER, MANIFIESTO), "w", encoding="utf-8") as archivo:
+        json.dump(manifiesto, archivo, ensure_ascii=False)
+    logger.warning(f"Fragmento {c.FRAGMENTO} - {len(nombres)} de {len(todos)} edificios")
+
+
+def leer_manifiesto(carpeta: str) -> Dict:
+    with open(os.path.join(carpeta, MANIFIESTO), encoding="utf-8") as archivo:
+        manifiesto = json.load(archivo)
+    manifiesto["carpeta"] = carpeta
+    return manifiesto
+
+
+############################################################
+# Unir
+############################################################
+def unir(carpetas: List[str], destino: str) -> Dict:
+    """
+    Junta las salidas de los fragmentos en `destino`, igual
+    a la de una sola simulación de toda la ciudad
+    """
+    manifiestos = [leer_manifiesto(carpeta) for carpeta in carpetas]
+    # ordenar los fragmentos y sus edificios como en la simulación completa
+    # (los que no tienen edificios quedan al final)
+    manifiestos.sort(key=lambda m: min((i for i, _ in m["edificios"]), default=math.inf))
+    _revisar(manifiestos)
+    primero = manifiestos[0]
+    indice = {e: i for m in manifiestos for i, e in m["edificios"]}
+    # un fragmento sin edificios no escribe los archivos de cada politica
+    archivos = list(dict.fromkeys(a for m in manifiestos for a in m["archivos"]))
+    os.makedirs(destino, exist_ok=True)
+
+    modo, formato = primero["modo"], primero["formato"]
+    if modo == MODO_RESUMEN:
+        resumen = _unir_resumen(manifiestos, destino, formato, indice)
+    elif modo in MODOS_LARGOS:
+        _unir_largos(manifiestos, destino, formato, indice, archivos)
+    else:
+        for m in manifiestos:
+            for archivo in m["archivos"]:
+                if not archivo.startswith("Red."):
+                    shutil.copyfile(os.path.join(m["carpeta"], archivo), os.path.join(destino, archivo))
+
+    if f"Red.{formato}" in archivos:
+        _unir_red(manifiestos, destino, formato)
+
+    # el resultado también se puede unir con otros
+    unido = {
+        **{k: v for k, v in primero.items() if k not in ("carpeta", "resumen")},
+        "fragmento": None,
+        "edificios": sorted([i, e] for e, i in indice.items()),
+        "archivos": archivos,
+    }
+    if modo == MODO_RESUMEN:
+        unido["resumen"] = resumen
+    with open(os.path.join(destino, MANIFIESTO), "w", encoding="utf-8") as archivo:
+        json.dump(unido, archivo, ensure_ascii=False)
+
+    logger.warning(f"Fragmentos - {len(manifiestos)} unidos en {destino} [{len(indice)} edificios]")
+    return unido
+
+
+def _revisar(manifiestos: List[Dict]):
+    primero = manifiestos[0]
+    for m in manifiestos[1:]:
+        for campo in ["config", "modo", "formato", "tiempos", "total_edificios", "politicas"]:
+            if campo == "politicas" and not m["edificios"]:
+                continue
+            if m[campo] != primero[campo]:
+                distintos = campo
+                if campo == "config":
+                    claves = set(m[campo]) | set(primero[campo])
+                    distintos = sorted(k for k in claves if m[campo].get(k) != primero[campo].get(k))
+                raise ValueError(
+                    f"Los fragmentos de {primero['carpeta']} y {m['carpeta']} "
+                    f"no son de la misma simulación [{distintos}]"
+                )
+
+    vistos: Dict[int, str] = {}
+    for m in manifiestos:
+        for i, e in m["edificios"]:
+            if i in vistos:
+                raise ValueError(f"El edificio {e} está en {vistos[i]} y en {m['carpeta']}")
+            vistos[i] = m["carpeta"]
+    faltan = primero["total_edificios"] - len(vistos)
+    if faltan:
+        logger.warning(f"Fragmentos - faltan {faltan} de {primero['total_edificios']} edificios")
+
+
+def _unir_ciclos(manifiestos: List[Dict]) -> List[Dict[str, List[float]]]:
+    ciclos = []
+    # un fragmento sin edificios no tiene ciclos (y zip no daría ninguno)
+    con_edificios = [m for m in manifiestos if m["edificios"]]
+    for ciclo in zip(*(m["resumen"]["ciclos"] for m in con_edificios)):
+        unido: Dict[str, List[float]] = {}
+        for energia in ciclo:
+            for politica, parciales in energia.items():
+                unido.setdefault(politica, []).extend(parciales)
+        ciclos.append(unido)
+    return ciclos
+
+
+def _unir_resumen(manifiestos: List[Dict], destino: str, formato: str, indice: Dict[str, int]) -> Dict:
+    edificios = [v for m in manifiestos for v in m["resumen"]["edificios"]]
+    # sort es estable: las politicas de un edificio quedan en su orden
+    edificios.sort(key=lambda valores: indice[valores[0]])
+    datos = {"edificios": edificios, "ciclos": _unir_ciclos(manifiestos)}
+
+    resumen = Resumen.desde_datos(datos)
+    db = DB()
+    nombre = os.path.join(destino, f"Resumen.{formato}")
+    db.crear_archivo(nombre, HEADERS_RESUMEN)
+    for fila in resumen.filas():
+        db.agregar_fila_en_memoria(nombre, fila)
+    db.exportar_archivos()
+    return datos
+
+
+def _unir_largos(
+    manifiestos: List[Dict],
+    destino: str,
+    formato: str,
+    indice: Dict[str, int],
+    archivos: List[str],
+):
+    """
+    En cada ciclo, las filas de cada fragmento se ordenan por edificio
+    """
+    primero = manifiestos[0]
+    db = DB()
+    for archivo in archivos:
+        if archivo.startswith("Red."):
+            continue
+        nombre = os.path.join(destino, archivo)
+
+        # los tiempos son los mismos en todos los fragmentos
+        if archivo == f"Ciclos.{formato}":
+            shutil.copyfile(os.path.join(primero["carpeta"], archivo), nombre)
+            continue
+
+        headers = HEADERS_EDIFICIOS_LARGO if archivo.startswith("Edificios") else HEADERS_VEHICULOS_LARGO
+        db.crear_archivo(nombre, headers)
+        lectores = [
+            _Lector(DB().leer(os.path.join(m["carpeta"], archivo)))
+            for m in manifiestos
+            if archivo in m["archivos"]
+        ]
+        for tiempo in primero["tiempos"]:
+            bloques = []
+            for lector in lectores:
+                bloques += lector.bloques_de(tiempo)
+            # sort es estable: las filas de un edificio quedan en su orden
+            bloques.sort(key=lambda b: indice[str(b[0]["Edificio"])])
+            for bloque in bloques:
+                for fila in bloque:
+                    db.agregar_fila_en_memoria(nombre, [fila[h] for h in headers])
+        db.volcar()
+    db.exportar_archivos()
+
+
+class _Lector:
+    """
+    Lee las filas de un archivo largo de a un ciclo, agrupadas por edificio
+    """
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.siguiente = next(filas, None)
+
+    def bloques_de(self, tiempo: str) -> List[List[Dict]]:
+        bloques: List[List[Dict]] = []
+        while self.siguiente is not None and str(self.siguiente["Tiempo"]) == tiempo:
+            fila = self.siguiente
+            if bloques and bloques[-1][0]["Edificio"] == fila["Edificio"]:
+                bloques[-1].append(fila)
+            else:
+                bloques.append([fila])
+            self.siguiente = next(self.filas, None)
+        return bloques
+
+
+def _unir_red(manifiestos: List[Dict], destino: str, formato: str):
+    """
+    Cada alimentador y subestación está completo en un fragmento (con
+    carga) y en los otros aparece sin carga
+    """
+    filas: Dict[tuple, Dict] = {}
+    for m in manifiestos:
+        for fila in DB().leer(os.path.join(m["carpeta"], f"Red.{formato}")):
+            clave = (fila["Politica"], fila["Nivel"], fila["Nombre"])
+            anterior = filas.get(clave)
+            if anterior is None:
+                filas[clave] = dict(fila)
+                continue
+            sobre_tope = int(anterior["Ciclos Sobre Tope"]) + int(fila["Ciclos Sobre Tope"])
+            if float(fila["Carga Maxima (KW)"]) > float(anterior["Carga Maxima (KW)"]):
+                filas[clave] = dict(fila)
+            filas[clave]["Ciclos Sobre Tope"] = sobre_tope
+
+    db = DB()
+    nombre = os.path.join(destino, f"Red.{formato}")
+    db.crear_archivo(nombre, HEADERS_RED)
+    for fila in filas.values():
+        db.agregar_fila_en_memoria(nombre, [fila[h] for h in HEADERS_RED])
+    db.exportar_archivos()
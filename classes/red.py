@@ -0,0 +1,295 @@
+"""
+RED
+
+Topología de la ciudad: cada edificio está en un alimentador y cada
+alimentador en una subestación. Se lee de un archivo (csv, tsv, xlsx o
+sqlite) con las columnas:
+
+    Edificio, Alimentador, Subestacion, Tope Alimentador, Tope Subestacion
+
+Los topes van en KW, y si están vacíos el alimentador/subestación no
+tiene límite (basta con indicarlo en una de sus filas).
+
+En cada ciclo se suma la carga de los autos (potencia_usada_por_autos)
+de cada alimentador y subestación con np.bincount, por separado para cada
+política, y se guarda la carga máxima de cada uno.
+
+Si la demanda (autos cargando + autos en espera) de un alimentador o
+subestación pasa su tope, la potencia disponible se reparte entre sus
+edificios según su demanda, y cada edificio queda con un tope de
+vehículos cargando (tope_de_red) para el ciclo siguiente. Los cargadores
+enteros que caben en cada alimentador se reparten por mayor resto.
+"""
+
+import logging
+import math
+from typing import Dict, List
+
+import numpy as np
+
+import helpers.constants as c
+
+logger = logging.getLogger(__name__)
+
+HEADERS_TOPOLOGIA = ["Edificio", "Alimentador", "Subestacion", "Tope Alimentador", "Tope Subestacion"]
+
+HEADERS_RED = [
+    "Politica",
+    "Nivel",
+    "Nombre",
+    "Tope (KW)",
+    "Carga Maxima (KW)",
+    "Tiempo Carga Maxima",
+    "Ciclos Sobre Tope",
+]
+
+NIVEL_ALIMENTADOR = "Alimentador"
+NIVEL_SUBESTACION = "Subestacion"
+
+
+def a_tope(valor) -> float:
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return math.inf
+    if isinstance(valor, str):
+        valor = valor.strip().replace(",", ".")
+    return float(valor)
+
+
+class Topologia:
+    def __init__(
+        self,
+        alimentador_de_edificio: Dict[str, str],
+        subestacion_de_alimentador: Dict[str, str],
+        tope_alimentador: Dict[str, float],
+        tope_subestacion: Dict[str, float],
+    ):
+        self.alimentador_de_edificio = alimentador_de_edificio
+        self.subestacion_de_alimentador = subestacion_de_alimentador
+        self.tope_alimentador = tope_alimentador
+        self.tope_subestacion = tope_subestacion
+
+    @classmethod
+    def leer(cls, nombre: str) -> "Topologia":
+        from classes.database import DB
+
+        alimentador_de_edificio = {}
+        subestacion_de_alimentador = {}
+        tope_alimentador = {}
+        tope_subestacion = {}
+        for fila in DB().leer(nombre):
+            alimentador = str(fila["Alimentador"])
+            subestacion = str(fila["Subestacion"])
+            alimentador_de_edificio[str(fila["Edificio"])] = alimentador
+            subestacion_de_alimentador.setdefault(alimentador, subestacion)
+
+            tope = a_tope(fila.get("Tope Alimentador"))
+            tope_alimentador[alimentador] = min(tope, tope_alimentador.get(alimentador, math.inf))
+            tope = a_tope(fila.get("Tope Subestacion"))
+            tope_subestacion[subestacion] = min(tope, tope_subestacion.get(subestacion, math.inf))
+
+        logger.warning(
+            f"Red - {len(alimentador_de_edificio)} edificios, "
+            f"{len(subestacion_de_alimentador)} alimentadores, "
+            f"{len(tope_subestacion)} subestaciones"
+        )
+        return cls(alimentador_de_edificio, subestacion_de_alimentador, tope_alimentador, tope_subestacion)
+
+
+class Red:
+    """
+    Agrega la carga de los edificios de una simulación según la topología.
+    Cada grupo es un alimentador (o subestación) de una política
+    """
+
+    def __init__(self, topologia: Topologia, edificios: List):
+        self.topologia = topologia
+        self.politicas: List[str] = sorted({e.tipo_edificio for e in edificios})
+        self.alimentadores: List[str] = list(topologia.subestacion_de_alimentador)
+        self.subestaciones: List[str] = list(topologia.tope_subestacion)
+
+        indice_alimentador = {a: i for i, a in enumerate(self.alimentadores)}
+        indice_subestacion = {s: i for i, s in enumerate(self.subestaciones)}
+        indice_politica = {p: i for i, p in enumerate(self.politicas)}
+        cant_a = len(self.alimentadores)
+        cant_s = len(self.subestaciones)
+
+        # grupo (politica, alimentador) de cada edificio, -1 si no está en la red
+        grupo = []
+        for e in edificios:
+            alimentador = topologia.alimentador_de_edificio.get(e.nombre)
+            if alimentador is None:
+                grupo.append(-1)
+            else:
+                grupo.append(indice_politica[e.tipo_edificio] * cant_a + indice_alimentador[alimentador])
+        grupo = np.array(grupo, dtype=np.int64)
+
+        sin_red = int(np.count_nonzero(grupo < 0))
+        if sin_red:
+            logger.warning(f"Red - {sin_red} edificios sin alimentador, no tienen tope")
+
+        self.en_red = grupo >= 0
+        self.grupo_de_edificio = grupo[self.en_red]
+        self.edificios_en_red = [e for e, en_red in zip(edificios, self.en_red) if en_red]
+
+        # grupo (politica, subestación) de cada grupo de alimentador
+        subestacion = np.array(
+            [indice_subestacion[topologia.subestacion_de_alimentador[a]] for a in self.alimentadores],
+            dtype=np.int64,
+        )
+        politica = np.repeat(np.arange(len(self.politicas)), cant_a)
+        self.subestacion_de_grupo = politica * cant_s + np.tile(subestacion, len(self.politicas))
+
+        self.tope_alimentador = np.tile(
+            [topologia.tope_alimentador[a] for a in self.alimentadores], len(self.politicas)
+        )
+        self.tope_subestacion = np.tile(
+            [topologia.tope_subestacion[s] for s in self.subestaciones], len(self.politicas)
+        )
+
+        # topes actuales de cada edificio (en vehículos cargando)
+        self.topes = np.full(len(self.edificios_en_red), math.inf)
+
+        # cargas máximas
+        self.tiempos: List[str] = []
+        self.carga_alimentador = np.zeros(len(self.tope_alimentador))
+        self.carga_subestacion = np.zeros(len(self.tope_subestacion))
+        self.maximo_alimentador = np.zeros(len(self.tope_alimentador))
+        self.maximo_subestacion = np.zeros(len(self.tope_subestacion))
+        self.ciclo_maximo_alimentador = np.zeros(len(self.tope_alimentador), dtype=np.int64)
+        self.ciclo_maximo_subestacion = np.zeros(len(self.tope_subestacion), dtype=np.int64)
+        self.sobre_tope_alimentador = np.zeros(len(self.tope_alimentador), dtype=np.int64)
+        self.sobre_tope_subestacion = np.zeros(len(self.tope_subestacion), dtype=np.int64)
+
+    ############################################################
+    # Ciclos
+    ############################################################
+    def fin_de_ciclo(self, tiempo: str):
+        """
+        Suma la carga del ciclo y actualiza los topes de cada edificio
+        """
+        edificios = self.edificios_en_red
+        cant = len(edificios)
+        horas = c.MINS_POR_CICLO / 60
+
+        usada = np.fromiter((e.potencia_usada_por_autos for e in edificios), float, count=cant)
+        en_espera = np.fromiter((e.autos_en_espera for e in edificios), float, count=cant)
+        cargadores = np.fromiter((e.potencia_cargadores for e in edificios), float, count=cant)
+
+        # KW de cada edificio, y los que pedirían los autos en espera
+        carga = usada / horas
+        demanda = carga + en_espera * cargadores
+
+        ciclo = len(self.tiempos)
+        self.tiempos.append(tiempo)
+
+        cant_a = len(self.tope_alimentador)
+        cant_s = len(self.tope_subestacion)
+        self.carga_alimentador = np.bincount(self.grupo_de_edificio, carga, minlength=cant_a)
+        self.carga_subestacion = np.bincount(
+            self.subestacion_de_grupo, self.carga_alimentador, minlength=cant_s
+        )
+        self._registrar_maximos(ciclo)
+
+        # repartir la potencia de la red según la demanda
+        demanda_a = np.bincount(self.grupo_de_edificio, demanda, minlength=cant_a)
+        demanda_s = np.bincount(self.subestacion_de_grupo, demanda_a, minlength=cant_s)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor_s = np.where(demanda_s > self.tope_subestacion, self.tope_subestacion / demanda_s, 1)
+            disponible_a = np.minimum(self.tope_alimentador, demanda_a * factor_s[self.subestacion_de_grupo])
+            factor_a = np.where(demanda_a > disponible_a, disponible_a / demanda_a, 1)
+
+        factor = factor_a[self.grupo_de_edificio]
+        topes = np.where(factor < 1, self._repartir_cargadores(demanda * factor / cargadores), math.inf)
+
+        # solo tocar los edificios cuyo tope cambió
+        for i in np.flatnonzero(topes != self.topes).tolist():
+            tope = topes[i]
+            self.edificios_en_red[i].tope_de_red = int(tope) if tope != math.inf else math.inf
+        self.topes = topes
+
+    def _repartir_cargadores(self, cuota: np.ndarray) -> np.ndarray:
+        """
+        Reparte cargadores enteros en cada grupo, por el método del mayor
+        resto: cada grupo entrega floor(suma de sus cuotas) cargadores,
+        en vez de la suma de floor de cada cuota (que puede ser 0)
+        """
+        grupo = self.grupo_de_edificio
+        cant_a = len(self.tope_alimentador)
+        base = np.floor(cuota + 1e-9)
+        resto = cuota - base
+        faltan = np.floor(np.bincount(grupo, cuota, minlength=cant_a) + 1e-9) - np.bincount(
+            grupo, base, minlength=cant_a
+        )
+
+        # posición de cada edificio en su grupo, de mayor a menor resto
+        orden = np.lexsort((-resto, grupo))
+        ordenados = grupo[orden]
+        posicion = np.empty(len(grupo), dtype=np.int64)
+        posicion[orden] = np.arange(len(grupo)) - np.searchsorted(ordenados, ordenados)
+        return base + (posicion < faltan[grupo])
+
+    def _registrar_maximos(self, ciclo: int):
+        for carga, maximo, ciclo_maximo, tope, sobre_tope in [
+            (
+                self.carga_alimentador,
+                self.maximo_alimentador,
+                self.ciclo_maximo_alimentador,
+                self.tope_alimentador,
+                self.sobre_tope_alimentador,
+            ),
+            (
+                self.carga_subestacion,
+                self.maximo_subestacion,
+                self.ciclo_maximo_subestacion,
+                self.tope_subestacion,
+                self.sobre_tope_subestacion,
+            ),
+        ]:
+            nuevos = carga > maximo
+            maximo[nuevos] = carga[nuevos]
+            ciclo_maximo[nuevos] = ciclo
+            sobre_tope += carga > tope + 1e-9
+
+    ############################################################
+    # Resultados
+    ############################################################
+    def filas(self) -> List[List]:
+        filas = []
+        for nivel, nombres, tope, maximo, ciclo_maximo, sobre_tope in [
+            (
+                NIVEL_ALIMENTADOR,
+                self.alimentadores,
+                self.tope_alimentador,
+                self.maximo_alimentador,
+                self.ciclo_maximo_alimentador,
+                self.sobre_tope_alimentador,
+            ),
+            (
+                NIVEL_SUBESTACION,
+                self.subestaciones,
+                self.tope_subestacion,
+                self.maximo_subestacion,
+                self.ciclo_maximo_subestacion,
+                self.sobre_tope_subestacion,
+            ),
+        ]:
+            for i in range(len(tope)):
+                politica = self.politicas[i // len(nombres)]
+                filas.append(
+                    [
+                        politica,
+                        nivel,
+                        nombres[i % len(nombres)],
+                        None if tope[i] == math.inf else float(tope[i]),
+                        float(maximo[i]),
+                        self.tiempos[ciclo_maximo[i]] if self.tiempos else None,
+                        int(sobre_tope[i]),
+                    ]
+                )
+        return filas
+
+    def guardar(self, db):
+        nombre = f"{c.OUTPUT_FOLDER}/Red.{c.OUTPUT_FORMAT}"
+        db.crear_archivo(nombre, HEADERS_RED)
+        for fila in self.filas():
+            db.agregar_fila_en_memoria(nombre, fila)
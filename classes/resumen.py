@@ -0,0 +1,195 @@
+"""
+RESUMEN
+
+Acumula métricas por edificio durante la simulación,
+sin guardar el estado de cada ciclo
+"""
+
+import logging
+import math
+from typing import Dict, List
+
+import helpers.constants as c
+from helpers.utils import sumar_exacto
+
+logger = logging.getLogger(__name__)
+
+HEADERS_RESUMEN = [
+    "Edificio",
+    "Politica",
+    "Ciclos",
+    "Energia Entregada",
+    "Peak Cargadores",
+    "Ciclos en Espera",
+    "Vehiculos Sin Bateria",
+    "Salidas Sin Carga",
+    "Demanda No Cubierta",
+]
+
+# nombre usado en las filas con el total de cada politica
+TOTAL = "Total"
+
+
+class ResumenEdificio:
+    """
+    Métricas acumuladas de un edificio (o del total de una politica)
+    """
+
+    def __init__(self, nombre: str, politica: str):
+        self.nombre = nombre
+        self.politica = politica
+
+        self.ciclos = 0
+        self.energia_entregada = 0.0  # KWh
+        self.peak_cargadores = 0.0  # KW
+        self.ciclos_en_espera = 0  # suma de autos esperando en cada ciclo
+        self.vehículos_agotados = 0
+        self.salidas_sin_carga = 0
+        self.demanda_no_cubierta = 0.0  # KWh
+
+    def acumular(
+        self,
+        energia: float,
+        en_espera: int,
+        agotados: int,
+        salidas_sin_carga: int,
+        demanda_no_cubierta: float,
+    ):
+        self.energia_entregada += energia
+        self.ciclos_en_espera += en_espera
+        self.vehículos_agotados += agotados
+        self.salidas_sin_carga += salidas_sin_carga
+        self.demanda_no_cubierta += demanda_no_cubierta
+
+    def actualizar_peak(self, energia_del_ciclo: float):
+        # la energía de un ciclo se pasa a potencia promedio en el ciclo
+        potencia = energia_del_ciclo * 60 / c.MINS_POR_CICLO
+        self.peak_cargadores = max(self.peak_cargadores, potencia)
+
+    @property
+    def fila(self) -> List:
+        return [
+            self.nombre,
+            self.politica,
+            self.ciclos,
+            round(self.energia_entregada, 3),
+            round(self.peak_cargadores, 3),
+            self.ciclos_en_espera,
+            self.vehículos_agotados,
+            self.salidas_sin_carga,
+            round(self.demanda_no_cubierta, 3),
+        ]
+
+
+class Resumen:
+    """
+    Resumen de una simulación: una entrada por edificio
+    y una por politica, la memoria no crece con los ciclos
+    (salvo con guardar_ciclos, para unir fragmentos)
+
+    Las sumas entre edificios son exactas (ver sumar_exacto), así el total
+    no depende del orden de los edificios ni de cómo se repartieron
+    """
+
+    def __init__(self, guardar_ciclos: bool = False):
+        self.edificios: Dict[str, ResumenEdificio] = {}
+        self.totales: Dict[str, ResumenEdificio] = {}
+
+        # energía de cada politica en el ciclo actual (sumas parciales), para su peak
+        self.tiempo_actual: str | None = None
+        self.energia_del_ciclo: Dict[str, List[float]] = {}
+        # las de todos los ciclos, si se guardan
+        self.ciclos: List[Dict[str, List[float]]] | None = [] if guardar_ciclos else None
+
+    def _cerrar_ciclo(self):
+        for politica, parciales in self.energia_del_ciclo.items():
+            total = self.totales[politica]
+            total.ciclos += 1
+            total.actualizar_peak(math.fsum(parciales))
+        if self.ciclos is not None and self.energia_del_ciclo:
+            self.ciclos.append(self.energia_del_ciclo)
+        self.energia_del_ciclo = {}
+
+    def acumular(self, tiempo: str, e) -> None:
+        if tiempo != self.tiempo_actual:
+            self._cerrar_ciclo()
+            self.tiempo_actual = tiempo
+
+        politica = e.tipo_edificio
+        nombre = f"{e}"
+        if nombre not in self.edificios:
+            self.edificios[nombre] = ResumenEdificio(e.nombre, politica)
+        if politica not in self.totales:
+            self.totales[politica] = ResumenEdificio(TOTAL, politica)
+
+        energia = e.potencia_usada_por_autos
+        valores = (
+            energia,
+            e.autos_en_espera,
+            e.vehículos_agotados,
+            e.salidas_sin_carga,
+            e.demanda_no_cubierta,
+        )
+
+        resumen = self.edificios[nombre]
+        resumen.ciclos += 1
+        resumen.acumular(*valores)
+        resumen.actualizar_peak(energia)
+
+        self.totales[politica].acumular(*valores)
+        sumar_exacto(self.energia_del_ciclo.setdefault(politica, []), energia)
+
+    def _sumar_edificios(self):
+        for politica, total in self.totales.items():
+            edificios = [r for r in self.edificios.values() if r.politica == politica]
+            total.energia_entregada = math.fsum(r.energia_entregada for r in edificios)
+            total.demanda_no_cubierta = math.fsum(r.demanda_no_cubierta for r in edificios)
+
+    def filas(self) -> List[List]:
+        self._cerrar_ciclo()
+        self._sumar_edificios()
+        return [r.fila for r in self.edificios.values()] + [
+            r.fila for r in self.totales.values()
+        ]
+
+    ############################################################
+    # Fragmentos
+    ############################################################
+    def datos(self) -> Dict:
+        """
+        Valores sin redondear de cada edificio y la energía de cada ciclo,
+        para guardarlos en el manifiesto de un fragmento
+        """
+        self._cerrar_ciclo()
+        return {
+            "edificios": [list(vars(r).values()) for r in self.edificios.values()],
+            "ciclos": self.ciclos,
+        }
+
+    @classmethod
+    def desde_datos(cls, datos: Dict) -> "Resumen":
+        """
+        Vuelve a armar el resumen con el resultado de datos(), EJ: el
+        de varios fragmentos juntos, con los edificios en orden
+        """
+        resumen = cls()
+        for valores in datos["edificios"]:
+            r = ResumenEdificio(valores[0], valores[1])
+            vars(r).update(zip(vars(r), valores))
+            resumen.edificios[f"{r.nombre} {r.politica}"] = r
+
+            if r.politica not in resumen.totales:
+                resumen.totales[r.politica] = ResumenEdificio(TOTAL, r.politica)
+            total = resumen.totales[r.politica]
+            total.ciclos_en_espera += r.ciclos_en_espera
+            total.vehículos_agotados += r.vehículos_agotados
+            total.salidas_sin_carga += r.salidas_sin_carga
+
+        for energia in datos["ciclos"]:
+            for politica, parciales in energia.items():
+                total = resumen.totales[politica]
+                total.ciclos += 1
+                total.actualizar_peak(math.fsum(parciales))
+
+        resumen._sumar_edificios()
+        return resumen
@@ -0,0 +1,536 @@
+"""
+SERVICIO
+
+Proceso que queda corriendo y recibe trabajos de simulación (valores que
+reemplazan a los de env.txt y dónde dejar la salida) por un socket unix
+local o una carpeta de trabajos.
+
+Los módulos, los kernels de numba, los archivos de potencias y viajes ya
+leídos y las flotas ya creadas quedan en memoria. Cada trabajo corre en
+un proceso hijo (fork), que parte con todo eso cargado, y se corren a lo
+más SERVICIO_TRABAJADORES trabajos a la vez. Con el motor rápido (y
+MEMORIA_COMPARTIDA) las flotas se guardan como FlotaVectorial en memoria
+compartida, y los hijos usan vistas de ella en vez de copiar los vehículos.
+
+Un trabajo es un JSON:
+```
+{
+    "id": "tope-3",
+    "nombre": "Super City",
+    "set": {"TOPE_DE_CARGADORES": 3, "OUTPUT_MODO": "resumen"},
+    "salida": {"carpeta": "outputs/tope-3", "formato": "csv"}
+}
+```
+Con `"salida": "memoria"` no se escriben archivos y la respuesta trae
+los totales de cada política. Sin carpeta, la salida queda en
+OUTPUT_FOLDER/<id>.
+
+Por el socket, cada línea es un trabajo y se responde una línea JSON por
+trabajo (en el orden en que terminan). En la carpeta, cada
+`<nombre>.trabajo.json` se responde en `<nombre>.resultado.json`.
+
+EJ:
+```
+python main.py serve --socket /tmp/electric-city.sock
+python main.py submit --socket /tmp/electric-city.sock --set TOPE_DE_CARGADORES=3
+```
+"""
+
+import asyncio
+import collections
+import datetime
+import glob
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import helpers.constants as c
+
+logger = logging.getLogger(__name__)
+
+SUFIJO_TRABAJO = ".trabajo.json"
+SUFIJO_EN_CURSO = ".en_curso"
+SUFIJO_RESULTADO = ".resultado.json"
+
+# segundos entre cada revisión de la carpeta de trabajos
+INTERVALO_CARPETA = 0.1
+
+# valores con los que se crean los vehículos: dos trabajos que solo
+# cambian otros valores (topes, políticas, fallas, ...) usan la misma flota
+CLAVES_FLOTA = [
+    "SEED",
+    "SEMILLA_POR_EDIFICIO",
+    "VEHÍCULOS_POR_EDIFICIO",
+    "CANT_SALIDAS",
+    "MIN_SALIDAS",
+    "MAX_SALIDAS",
+    "AVG_BATERIA_MAX",
+    "VAR_BATERIA_MAX",
+    "AVG_BATERIA_INI",
+    "VAR_BATERIA_INI",
+    "AVG_RENDIMIENTO",
+    "VAR_RENDIMIENTO",
+    "VELOCIDAD_PROMEDIO",
+    "MINS_POR_CICLO",
+]
+# sin VEHÍCULOS_POR_EDIFICIO, la cantidad de vehículos depende de la potencia
+CLAVES_FLOTA_AL_AZAR = ["POTENCIA_DECLARADA", "POTENCIA_CARGADORES"]
+
+
+class Trabajo(NamedTuple):
+    id: str
+    nombre: str
+    # valores que reemplazan a los de env.txt
+    config: Dict[str, str]
+    en_memoria: bool
+
+    @classmethod
+    def desde_json(cls, datos: Dict, id_por_defecto: str) -> "Trabajo":
+        if not isinstance(datos, dict):
+            raise ValueError(f"Se esperaba un objeto JSON, no {type(datos).__name__}")
+
+        id_trabajo = str(datos.get("id") or id_por_defecto)
+        config = {k: str(v) for k, v in (datos.get("set") or {}).items()}
+
+        salida = datos.get("salida") or {}
+        en_memoria = salida == "memoria"
+        if not en_memoria:
+            carpeta = salida.get("carpeta") or f"{config.get('OUTPUT_FOLDER', c.OUTPUT_FOLDER)}/{id_trabajo}"
+            config["OUTPUT_FOLDER"] = carpeta
+            for clave, nombre in [("formato", "OUTPUT_FORMAT"), ("modo", "OUTPUT_MODO")]:
+                if salida.get(clave):
+                    config[nombre] = str(salida[clave])
+
+        return cls(id_trabajo, datos.get("nombre", "Super City"), config, en_memoria)
+
+
+############################################################
+# Datos en memoria
+############################################################
+class Cache:
+    """
+    Archivos leídos (mientras no cambien) y flotas creadas, por configuración
+    """
+
+    def __init__(self, max_flotas: int):
+        self.max_flotas = max_flotas
+        self.potencias: Dict[str, Tuple[int, object]] = {}
+        self.viajes: Dict[str, Tuple[int, object]] = {}
+        self.flotas: collections.OrderedDict = collections.OrderedDict()
+        self.aciertos = collections.Counter()
+
+    @staticmethod
+    def _leer(archivos: Dict, nombre: str, leer) -> Tuple[object, bool]:
+        nombre = os.path.abspath(nombre)
+        version = os.stat(nombre).st_mtime_ns
+        guardado = archivos.get(nombre)
+        if guardado and guardado[0] == version:
+            return guardado[1], True
+        datos = leer(nombre)
+        archivos[nombre] = (version, datos)
+        return datos, False
+
+    def potencias_de(self, nombre: str):
+        from classes.en_memoria import PotenciasEnMemoria
+
+        potencias, en_cache = self._leer(self.potencias, nombre, PotenciasEnMemoria.leer_archivo)
+        self.aciertos["potencias"] += en_cache
+        return potencias
+
+    def viajes_de(self, nombre: str):
+        from classes.viajes import RegistroDeViajes
+
+        viajes, en_cache = self._leer(self.viajes, nombre, RegistroDeViajes.leer)
+        self.aciertos["viajes"] += en_cache
+        return viajes
+
+    def _clave_flota(self, potencias, viajes, *otras: str) -> Tuple:
+        claves = CLAVES_FLOTA + ([] if c.VEHÍCULOS_POR_EDIFICIO else CLAVES_FLOTA_AL_AZAR) + list(otras)
+        return (
+            tuple(potencias.edificios),
+            # versión del archivo de viajes
+            viajes and self.viajes[os.path.abspath(c.VIAJES_FILE)][0],
+            # las salidas son en la fecha de hoy
+            datetime.date.today(),
+            tuple(getattr(c, k) for k in claves),
+        )
+
+    def _guardar_flota(self, clave: Tuple, flota):
+        self.flotas[clave] = flota
+        while len(self.flotas) > self.max_flotas:
+            _, sacada = self.flotas.popitem(last=False)
+            if isinstance(sacada, tuple):
+                # soltar las vistas antes de cerrar el segmento
+                # (los hijos que lo usan lo siguen leyendo)
+                compartido, sacada = sacada[0], None
+                compartido.cerrar()
+
+    def flota_de(self, potencias, viajes) -> Tuple[List, bool]:
+        """
+        Los edificios y vehículos de la configuración actual
+        (con la misma semilla, son los mismos de una ejecución normal)
+        """
+        from classes.simulacion import crear_flota
+        from classes.timer import Timer
+
+        clave = self._clave_flota(potencias, viajes)
+        if clave in self.flotas:
+            self.flotas.move_to_end(clave)
+            self.aciertos["flotas"] += 1
+            return self.flotas[clave], True
+
+        c.sembrar()
+        flota = crear_flota(potencias.edificios, Timer(), viajes)
+        self._guardar_flota(clave, flota)
+        return flota, False
+
+    def flota_vectorial_de(self, potencias) -> Tuple[object, bool]:
+        """
+        La flota de la configuración actual como FlotaVectorial en memoria
+        compartida: cada trabajo usa vistas de ella en vez de copiar los vehículos
+        """
+        from classes.compartido import compartir_flota, flota_compartida
+        from classes.edificio_vectorial import FlotaVectorial
+
+        clave = self._clave_flota(potencias, None, *FlotaVectorial.CLAVES)
+        if clave in self.flotas:
+            self.flotas.move_to_end(clave)
+            self.aciertos["flotas"] += 1
+            return self.flotas[clave][1], True
+
+        flota, _ = self.flota_de(potencias, None)
+        compartido = compartir_flota(FlotaVectorial.desde_flota(flota))
+        vectorial = flota_compartida(compartido.descriptor)
+        self._guardar_flota(clave, (compartido, vectorial))
+        return vectorial, False
+
+    def cerrar(self):
+        compartidos = [f[0] for f in self.flotas.values() if isinstance(f, tuple)]
+        self.flotas.clear()
+        for compartido in compartidos:
+            compartido.cerrar()
+
+    def estado(self) -> Dict:
+        return {
+            "potencias": len(self.potencias),
+            "viajes": len(self.viajes),
+            "flotas": len(self.flotas),
+            "aciertos": dict(self.aciertos),
+        }
+
+
+def totales(resultado: Dict) -> Dict[str, Dict[str, float]]:
+    """
+    Suma de cada campo de SalidaEnMemoria, por política
+    """
+    politicas = resultado["politicas"]
+    totales = {}
+    for politica in dict.fromkeys(politicas):
+        columnas = [i for i, p in enumerate(politicas) if p == politica]
+        totales[politica] = {
+            "energia_entregada": float(resultado["potencia_usada_por_autos"][:, columnas].sum()),
+            "autos_en_espera": int(resultado["autos_en_espera"][:, columnas].sum()),
+            "vehículos_agotados": int(resultado["vehículos_agotados"][:, columnas].sum()),
+            "salidas_sin_carga": int(resultado["salidas_sin_carga"][:, columnas].sum()),
+            "demanda_no_cubierta": float(resultado["demanda_no_cubierta"][:, columnas].sum()),
+        }
+    return totales
+
+
+def _correr(trabajo: Trabajo, potencias, flota, viajes, conexion):
+    """
+    Corre un trabajo en el proceso hijo y envía su resultado
+    """
+    try:
+        from classes.en_memoria import SalidaEnMemoria
+        from classes.simulacion import Simulacion
+
+        inicio = time.perf_counter()
+        c.configurar(**trabajo.config)
+        logging.getLogger().setLevel(c.LOG_LEVEL)
+
+        s = Simulacion(trabajo.nombre, potencias=potencias, flota=flota, viajes=viajes)
+        output = s.empezar(salida=SalidaEnMemoria() if trabajo.en_memoria else None)
+
+        resultado = {"estado": "ok", "ciclos": potencias.contar_filas()}
+        if trabajo.en_memoria:
+            resultado["totales"] = totales(output.resultado)
+        else:
+            resultado["carpeta"] = c.OUTPUT_FOLDER
+        resultado["ms_simulacion"] = round((time.perf_counter() - inicio) * 1000, 3)
+    except Exception as error:
+        logger.exception(f"Servicio - trabajo {trabajo.id}")
+        resultado = {"estado": "error", "error": f"{type(error).__name__}: {error}"}
+
+    conexion.send(resultado)
+    conexion.close()
+
+
+async def _esperar(descriptor: int):
+    """
+    Espera a que el descriptor (un pipe o un proceso) se pueda leer
+    """
+    loop = asyncio.get_running_loop()
+    listo = loop.create_future()
+    loop.add_reader(descriptor, lambda: listo.done() or listo.set_result(None))
+    try:
+        await listo
+    finally:
+        loop.remove_reader(descriptor)
+
+
+############################################################
+# Servicio
+############################################################
+class Servicio:
+    def __init__(
+        self,
+        socket: str | None = None,
+        carpeta: str | None = None,
+        trabajadores: int | None = None,
+        max_flotas: int | None = None,
+    ):
+        self.socket = c.SERVICIO_SOCKET if socket is None else socket
+        self.carpeta = c.SERVICIO_CARPETA if carpeta is None else carpeta
+        trabajadores = c.SERVICIO_TRABAJADORES if trabajadores is None else trabajadores
+        self.trabajadores = trabajadores or os.cpu_count() or 1
+        self.cache = Cache(c.SERVICIO_MAX_FLOTAS if max_flotas is None else max_flotas)
+
+        if not self.socket and not self.carpeta:
+            raise ValueError("El servicio necesita un socket o una carpeta de trabajos")
+
+        # fork: los hijos parten con los módulos y datos ya cargados
+        self.contexto = multiprocessing.get_context("fork")
+        self.contador = itertools.count(1)
+        self.en_curso = 0
+        self.terminados = 0
+        self.detener: asyncio.Event | None = None
+
+    def calentar(self):
+        """
+        Importa los módulos, compila los kernels del motor y lee el input,
+        para que el primer trabajo no pague ese costo
+        """
+        import numpy as np
+
+        from classes.en_memoria import simular
+
+        inicio = time.perf_counter()
+        logging.disable(logging.WARNING)
+        try:
+            simular(
+                np.full((2, 1), 50.0),
+                ["Calentar"],
+                config={
+                    "VEHÍCULOS_POR_EDIFICIO": 2,
+                    "VIAJES_FILE": "",
+                    "RED_FILE": "",
+                    "SIMULAR_FIFO": 1,
+                    "SIMULAR_ROUNDROBIN": 1,
+                    "SIMULAR_INTELIGENTE": 1,
+                    "SIMULAR_REPARTO": 1,
+                    "SIMULAR_ANTICIPACION": 1,
+                },
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if c.INPUT_FILE:
+            self.cache.potencias_de(c.INPUT_FILE)
+        if c.VIAJES_FILE:
+            self.cache.viajes_de(c.VIAJES_FILE)
+        logger.warning(f"Servicio - listo en {time.perf_counter() - inicio:.2f}s [motor={c.MOTOR}]")
+
+    def preparar(self, trabajo: Trabajo) -> Tuple:
+        """
+        Input, viajes y flota del trabajo, desde la cache si ya existen
+        """
+        with c.configuracion(**trabajo.config):
+            if not c.INPUT_FILE:
+                raise ValueError("El trabajo no tiene INPUT_FILE")
+            potencias = self.cache.potencias_de(c.INPUT_FILE)
+            viajes = self.cache.viajes_de(c.VIAJES_FILE) if c.VIAJES_FILE else None
+            if c.MEMORIA_COMPARTIDA and c.MOTOR != "objetos" and not viajes:
+                flota, en_cache = self.cache.flota_vectorial_de(potencias)
+            else:
+                flota, en_cache = self.cache.flota_de(potencias, viajes)
+        return potencias, flota, viajes, en_cache
+
+    async def ejecutar(self, trabajo: Trabajo) -> Dict:
+        """
+        Corre el trabajo en un proceso hijo, cuando haya un trabajador libre
+        """
+        llegada = time.perf_counter()
+        async with self.semaforo:
+            inicio = time.perf_counter()
+            respuesta = {"id": trabajo.id, "ms_espera": round((inicio - llegada) * 1000, 3)}
+            try:
+                potencias, flota, viajes, en_cache = self.preparar(trabajo)
+            except Exception as error:
+                respuesta.update(estado="error", error=f"{type(error).__name__}: {error}")
+                return respuesta
+            respuesta["flota_en_cache"] = en_cache
+            respuesta["ms_preparacion"] = round((time.perf_counter() - inicio) * 1000, 3)
+
+            receptor, emisor = self.contexto.Pipe(duplex=False)
+            proceso = self.contexto.Process(
+                target=_correr,
+                args=(trabajo, potencias, flota, viajes, emisor),
+                daemon=True,
+            )
+            self.en_curso += 1
+            try:
+                proceso.start()
+                emisor.close()
+
+                await _esperar(receptor.fileno())
+                try:
+                    respuesta.update(receptor.recv())
+                except EOFError:
+                    respuesta["estado"] = "error"
+
+                await _esperar(proceso.sentinel)
+                proceso.join()
+                if respuesta["estado"] == "error" and "error" not in respuesta:
+                    respuesta["error"] = f"el proceso terminó con código {proceso.exitcode}"
+            finally:
+                receptor.close()
+                self.en_curso -= 1
+                self.terminados += 1
+
+        respuesta["ms_total"] = round((time.perf_counter() - llegada) * 1000, 3)
+        logger.warning(
+            f"Servicio - trabajo {trabajo.id}: {respuesta['estado']} en {respuesta['ms_total']:.1f}ms "
+            f"[preparacion={respuesta['ms_preparacion']:.1f}ms, flota_en_cache={en_cache}]"
+        )
+        return respuesta
+
+    def estado(self) -> Dict:
+        return {
+            "trabajadores": self.trabajadores,
+            "en_curso": self.en_curso,
+            "terminados": self.terminados,
+            "cache": self.cache.estado(),
+        }
+
+    async def correr(self):
+        """
+        Atiende trabajos hasta recibir {"comando": "terminar"}
+        """
+        self.semaforo = asyncio.Semaphore(self.trabajadores)
+        self.detener = asyncio.Event()
+        self.calentar()
+
+        tareas = []
+        servidor = None
+        if self.socket:
+            if os.path.exists(self.socket):
+                os.remove(self.socket)
+            servidor = await asyncio.start_unix_server(self._atender, self.socket)
+            logger.warning(f"Servicio - escuchando en {self.socket} [trabajadores={self.trabajadores}]")
+        if self.carpeta:
+            os.makedirs(self.carpeta, exist_ok=True)
+            tareas.append(asyncio.create_task(self._revisar_carpeta()))
+            logger.warning(f"Servicio - revisando {self.carpeta} [trabajadores={self.trabajadores}]")
+
+        try:
+            await self.detener.wait()
+        finally:
+            self.cache.cerrar()
+            for tarea in tareas:
+                tarea.cancel()
+            if servidor:
+                servidor.close()
+                await servidor.wait_closed()
+                os.remove(self.socket)
+
+    ############################################################
+    # Socket
+    ############################################################
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pendientes = set()
+        try:
+            async for linea in reader:
+                if not linea.strip():
+                    continue
+                tarea = asyncio.create_task(self._responder(linea, writer))
+                pendientes.add(tarea)
+                tarea.add_done_callback(pendientes.discard)
+            await asyncio.gather(*pendientes)
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # el servicio terminó con el cliente conectado
+            for tarea in pendientes:
+                tarea.cancel()
+        finally:
+            writer.close()
+
+    async def _responder(self, linea: bytes, writer: asyncio.StreamWriter):
+        respuesta = await self.atender_pedido(linea, f"trabajo-{next(self.contador)}")
+        writer.write((json.dumps(respuesta, ensure_ascii=False) + "\n").encode())
+        await writer.drain()
+
+    async def atender_pedido(self, texto: bytes | str, id_por_defecto: str) -> Dict:
+        """
+        Un trabajo, o un comando ("estado" o "terminar")
+        """
+        try:
+            datos = json.loads(texto)
+            comando = datos.get("comando") if isinstance(datos, dict) else None
+            if comando == "estado":
+                return self.estado()
+            if comando == "terminar":
+                self.detener.set()
+                return {"estado": "terminando"}
+            trabajo = Trabajo.desde_json(datos, id_por_defecto)
+        except (ValueError, AttributeError) as error:
+            return {"id": id_por_defecto, "estado": "error", "error": f"Trabajo invalido: {error}"}
+        return await self.ejecutar(trabajo)
+
+    ############################################################
+    # Carpeta de trabajos
+    ############################################################
+    async def _revisar_carpeta(self):
+        while True:
+            for nombre in sorted(glob.glob(os.path.join(self.carpeta, f"*{SUFIJO_TRABAJO}"))):
+                base = nombre[: -len(SUFIJO_TRABAJO)]
+                # marcarlo para no tomarlo dos veces
+                os.replace(nombre, base + SUFIJO_EN_CURSO)
+                asyncio.create_task(self._trabajo_de_carpeta(base))
+            await asyncio.sleep(INTERVALO_CARPETA)
+
+    async def _trabajo_de_carpeta(self, base: str):
+        with open(base + SUFIJO_EN_CURSO, encoding="utf-8") as archivo:
+            texto = archivo.read()
+        respuesta = await self.atender_pedido(texto, os.path.basename(base))
+
+        # escribir y luego renombrar, para que no se lea a medio escribir
+        temporal = base + SUFIJO_RESULTADO + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(respuesta, archivo, ensure_ascii=False, indent=2)
+        os.replace(temporal, base + SUFIJO_RESULTADO)
+        os.remove(base + SUFIJO_EN_CURSO)
+
+
+############################################################
+# Cliente
+############################################################
+def enviar(trabajos: List[Dict], ruta_socket: str) -> Iterator[Dict]:
+    """
+    Envía los trabajos al servicio y entrega cada respuesta cuando llega
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conexion:
+        conexion.connect(ruta_socket)
+        for trabajo in trabajos:
+            conexion.sendall((json.dumps(trabajo, ensure_ascii=False) + "\n").encode())
+        conexion.shutdown(socket.SHUT_WR)
+
+        with conexion.makefile("r", encoding="utf-8") as entrada:
+            for linea in entrada:
+                yield json.loads(linea)
@@ -1,26 +1,128 @@
+import collections
 import logging
-from typing import List, Optional
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import helpers.constants as c
 from classes.database import DB
 from classes.edificio import Edificio
+from classes.edificio_vectorial import EdificioVectorial, EdificioViajes, FlotaVectorial
+from classes.escenarios import escenario_actual
+from classes.estacionario import RegimenEstacionario
+from classes.eventos import (
+    FinCiclo,
+    FinCicloEdificio,
+    InicioCiclo,
+    Observador,
+    Observadores,
+)
+from classes.fragmentos import Fragmento, grupos_de_red, guardar_manifiesto
+from classes.red import Red, Topologia
 from classes.timer import Timer
+from classes.viajes import RegistroDeViajes
 
 logger = logging.getLogger(__name__)
 
 
+def con_siguientes(filas: Iterable, cant: int) -> Iterator[Tuple[Dict, List[Dict]]]:
+    """
+    Entrega cada fila junto a las `cant` filas que le siguen
+    (menos al llegar al final del input)
+    """
+    ventana = collections.deque()
+    for fila in filas:
+        ventana.append(fila)
+        if len(ventana) > cant:
+            actual = ventana.popleft()
+            yield actual, list(ventana)
+    while ventana:
+        actual = ventana.popleft()
+        yield actual, list(ventana)
+
+
+def semilla_de_edificio(nombre: str) -> int:
+    return (c.SEED * 1_000_003 + zlib.crc32(nombre.encode("utf-8"))) % 2**32
+
+
+def crear_flota(
+    csv_edificios: List[str],
+    timer: Timer,
+    viajes=None,
+    seleccion: List[str] | None = None,
+) -> List[Edificio]:
+    """
+    Crea los edificios del input con sus vehículos al azar (o los de
+    `viajes`), antes de copiarlos a cada política.
+    Con `seleccion` solo se retornan esos edificios, pero (sin
+    SEMILLA_POR_EDIFICIO) se crean todos para repetir los números al azar
+    """
+    seleccion = None if seleccion is None else set(seleccion)
+    flota = []
+    for e in csv_edificios:
+        if seleccion is not None and e not in seleccion and c.SEMILLA_POR_EDIFICIO:
+            continue
+        if c.SEMILLA_POR_EDIFICIO:
+            c.sembrar(semilla_de_edificio(e))
+
+        edificio = Edificio(
+            nombre=e,
+            timer=timer,
+            cant_vehículos=viajes and len(viajes.nombres(e)),
+        )
+        if viajes:
+            for v, nombre in zip(edificio.vehículos, viajes.nombres(e)):
+                v.nombre = nombre
+        if seleccion is None or e in seleccion:
+            flota.append(edificio)
+    return flota
+
+
+def politicas_simuladas() -> List[str]:
+    """
+    Tipos de edificio que se simulan, en el orden de la salida
+    """
+    return [
+        tipo
+        for simular, tipo in [
+            (c.SIMULAR_FIFO, Edificio.TIPO_FIFO),
+            (c.SIMULAR_ROUNDROBIN, Edificio.TIPO_RR),
+            (c.SIMULAR_INTELIGENTE, Edificio.TIPO_INT),
+            (c.SIMULAR_REPARTO, Edificio.TIPO_REP),
+            (c.SIMULAR_ANTICIPACION, Edificio.TIPO_ANT),
+        ]
+        if simular
+    ]
+
+
 class Simulacion:
     def __init__(
         self,
         nombre: str,
-        archivo_potencias: str,
+        archivo_potencias: str | None = None,
+        potencias=None,
+        flota: List[Edificio] | FlotaVectorial | None = None,
+        viajes=None,
     ):
+        """
+        Las potencias se leen de archivo_potencias, o de `potencias`
+        si se entregan en memoria (ver PotenciasEnMemoria).
+        `flota` y `viajes` permiten reusar los edificios y viajes ya
+        creados con la misma configuración (ver Servicio). Una
+        FlotaVectorial se usa sin copiarla, con el motor rápido
+        """
         self.nombre = nombre
+        self.archivo_potencias = archivo_potencias
+
+        # esto es para repetir la misma ejecución random
+        c.sembrar()
 
         # base de datos para importar/exportar datos
-        self.input = DB()
+        self.input = DB() if potencias is None else potencias
         # timer para manejar tiempos
-        self.timer = Timer()
+        self.timer = Timer() if flota is None or isinstance(flota, FlotaVectorial) else flota[0].timer
+        # observadores de los eventos de cada ciclo
+        self.observadores = Observadores()
+        self.eventos: List | None = None
 
         # sacar del header los nombres de cada edificio
         csv_edificios = self.input.leer_headers(nombre=archivo_potencias)[1:]
@@ -30,59 +132,279 @@ class Simulacion:
         if not csv_edificios:
             raise ValueError(f"Cantidad invalida de edificios [{csv_edificios=}]")
 
-        # crear los efificios con sus respectivos vehículos
-        self.edificios: List[Edificio] = []
-        for e in csv_edificios:
-            edificio = Edificio(
-                nombre=e,
-                timer=self.timer,
+        # simular solo una parte de los edificios
+        self.fragmento = Fragmento(c.FRAGMENTO) if c.FRAGMENTO else None
+        self.tiempos: List[str] = []
+        seleccion = None
+        if self.fragmento:
+            seleccion = self.fragmento.seleccionar(csv_edificios, grupos_de_red())
+            logger.warning(
+                f"Simulacion - fragmento {self.fragmento}: {len(seleccion)} de {len(csv_edificios)} edificios"
             )
+            if not c.SEMILLA_POR_EDIFICIO:
+                logger.warning(
+                    "Simulacion - sin SEMILLA_POR_EDIFICIO se crean los vehículos de todos los edificios"
+                )
+
+        # viajes reales de la flota, si se entregan
+        self.viajes = viajes
+        if self.viajes is None and c.VIAJES_FILE:
+            self.viajes = RegistroDeViajes.leer(c.VIAJES_FILE)
+
+        # la flota ya está en arreglos: cada política usa vistas de los suyos
+        if isinstance(flota, FlotaVectorial):
+            if self.viajes or c.MOTOR == "objetos":
+                raise ValueError("Una FlotaVectorial solo se usa con el motor rápido y sin viajes")
+            logger.warning(f"Simulacion - usando motor {c.MOTOR} con una flota en arreglos")
+            elegidos = set(flota.edificios if seleccion is None else seleccion)
+            self.edificios = [
+                flota.edificio(nombre, tipo, self.timer, motor=c.MOTOR)
+                for nombre in flota.edificios
+                if nombre in elegidos
+                for tipo in politicas_simuladas()
+            ]
+        else:
+            self.edificios = self.crear_edificios(csv_edificios, flota, seleccion)
+
+        # fallas y alta demanda de cada edificio, compartidas por todas las políticas
+        self.escenario = escenario_actual(csv_edificios, self.timer.fecha_actual)
+        for e in self.edificios:
+            e.escenario = self.escenario
+
+    def crear_edificios(
+        self,
+        csv_edificios: List[str],
+        flota: List[Edificio] | None,
+        seleccion: List[str] | None,
+    ) -> List:
+        """
+        Una copia de cada edificio de la flota por política, en el motor pedido
+        """
+        # crear los efificios con sus respectivos vehículos
+        if flota is None:
+            flota = crear_flota(csv_edificios, self.timer, self.viajes, seleccion)
+        else:
+            if seleccion is not None:
+                seleccion = set(seleccion)
+                flota = [e for e in flota if e.nombre in seleccion]
+            for edificio in flota:
+                edificio.reconfigurar()
+
+        edificios: List[Edificio] = []
+        for edificio in flota:
             if c.SIMULAR_FIFO:
-                self.edificios.append(
+                edificios.append(
                     edificio.copia_FIFO(),
                 )
 
             if c.SIMULAR_ROUNDROBIN:
-                self.edificios.append(
+                edificios.append(
                     edificio.copia_RoundRobin(),
                 )
 
             if c.SIMULAR_INTELIGENTE:
                 e = edificio.copia_Inteligente()
-                self.edificios.append(e)
+                edificios.append(e)
+
+            if c.SIMULAR_REPARTO:
+                edificios.append(
+                    edificio.copia_Reparto(),
+                )
+
+            if c.SIMULAR_ANTICIPACION:
+                edificios.append(
+                    edificio.copia_Anticipado(),
+                )
+
+        # los viajes solo existen en el motor rápido
+        if self.viajes:
+            motor = c.MOTOR if c.MOTOR != "objetos" else "numpy"
+            logger.warning(f"Simulacion - usando viajes de {c.VIAJES_FILE} con motor {motor}")
+            return [EdificioViajes.desde_registro(e, self.viajes, motor=motor) for e in edificios]
+
+        # pasar los edificios al motor rápido si se pidió
+        if c.MOTOR != "objetos":
+            logger.warning(f"Simulacion - usando motor {c.MOTOR}")
+            return [EdificioVectorial.desde_edificio(e, motor=c.MOTOR) for e in edificios]
+        return edificios
+
+    def registrar_observador(self, observador: Observador, tipos: tuple | None = None):
+        """
+        El observador recibe una lista con los eventos de cada ciclo,
+        filtrados por los tipos indicados (todos si no se indican)
+        """
+        self.observadores.registrar(observador, tipos)
 
-    def empezar(self):
+    def empezar(self, salida=None):
+        """
+        Simula todas las filas del input. Los resultados se guardan
+        en archivos, o en `salida` si se entrega (ver SalidaEnMemoria)
+        """
+        self.iniciar(salida)
+        filas = self.input.leer(self.archivo_potencias)
+
+        # la política Anticipado necesita las filas siguientes
+        if c.SIMULAR_ANTICIPACION:
+            for rows, siguientes in con_siguientes(filas, c.ANTICIPACION_CICLOS - 1):
+                self.simular_fila(rows, siguientes)
+                self.cerrar_ciclo()
+        else:
+            for rows in filas:
+                self.simular_fila(rows)
+                self.cerrar_ciclo()
+        return self.terminar()
+
+    def iniciar(self, salida=None):
+        """
+        Prepara la salida y el estado de la simulación, antes de la primera fila
+        """
         # definir formato de salida
-        self.output = DB(f".{c.OUTPUT_FORMAT}")
+        if salida is not None:
+            self.output = salida
+        else:
+            self.output = DB(
+                f".{c.OUTPUT_FORMAT}",
+                en_segundo_plano=c.OUTPUT_EN_SEGUNDO_PLANO,
+            )
 
         # crear los archivos para cada edificio
         self.output.crear_archivo_de_edificios(self.edificios)
 
-        # mostrar datos de cada vehículo en los edificios
-        for e in self.edificios:
-            for v in e.vehículos:
-                logger.info(f"{e} - {v}: {v.max_bateria=}, {v.bateria=}")
-                logger.info(f"{e} - {v}: salidas={v.salidas_str}")
+        # mostrar datos de cada vehículo en los edificios (los de
+        # una FlotaVectorial son solo nombres, sus datos están en arreglos)
+        if logger.isEnabledFor(logging.INFO):
+            for e in self.edificios:
+                for i, v in enumerate(e.vehículos):
+                    if isinstance(v, str):
+                        logger.info(f"{e} - {v}: max_bateria={e.max_bateria[i]}, bateria={e.bateria[i]}")
+                        continue
+                    logger.info(f"{e} - {v}: {v.max_bateria=}, {v.bateria=}")
+                    logger.info(f"{e} - {v}: salidas={v.salidas_str}")
 
-        # Inicia la simulación
-        for rows in self.input.leer(c.INPUT_FILE):
-            # saltar los headers
+        # publicar el avance de la simulación
+        self.telemetria = None
+        if c.TELEMETRIA_ARCHIVO or c.TELEMETRIA_PUERTO:
+            from classes.telemetria import Telemetria
 
-            t = self.timer.set_hh_mm(rows["Tiempo"])
+            self.telemetria = Telemetria(
+                total_ciclos=self.input.contar_filas(self.archivo_potencias),
+                cola_de_escritura=lambda: self.output.lotes_pendientes,
+                archivo=c.TELEMETRIA_ARCHIVO,
+                puerto=c.TELEMETRIA_PUERTO,
+                cada_segundos=c.TELEMETRIA_CADA_SEGUNDOS,
+            )
+            self.registrar_observador(self.telemetria, tipos=(FinCicloEdificio, FinCiclo))
+
+        # los eventos solo se registran si alguien los observa
+        if self.observadores.activos:
+            self.eventos = []
+            for e in self.edificios:
+                e.eventos = self.eventos
 
-            for i, e in enumerate(self.edificios):
+        # repetir los días de los edificios que llegaron a un estado periódico
+        self.regimen = None
+        if c.ESTACIONARIO and (
+            self.viajes or c.RED_FILE or c.SIMULAR_ANTICIPACION or self.escenario.fechado
+        ):
+            # los viajes, los topes de la red, el pronóstico y los eventos fechados no se repiten como el input
+            logger.warning(
+                "Simulacion - ESTACIONARIO no se usa con VIAJES_FILE, RED_FILE, "
+                "SIMULAR_ANTICIPACION o escenarios con eventos fechados"
+            )
+        elif c.ESTACIONARIO:
+            self.regimen = RegimenEstacionario(c.ESTACIONARIO_TOLERANCIA)
+
+        if self.viajes:
+            self.viajes.reiniciar()
+
+        # sumar la carga de cada alimentador y subestación
+        self.red = None
+        if c.RED_FILE:
+            self.red = Red(Topologia.leer(c.RED_FILE), self.edificios)
+
+    def simular_fila(self, rows, siguientes: List | None = None):
+        """
+        Avanza todos los edificios con una fila del input, y retorna
+        el estado de cada uno (lo que se guarda en la salida).
+        `siguientes` son las filas que vienen, para la política Anticipado
+        """
+        t = self.timer.set_hh_mm(rows["Tiempo"])
+        if self.fragmento:
+            self.tiempos.append(self.timer.actual_str)
+        if self.eventos is not None:
+            self.eventos.append(InicioCiclo(t))
+        if self.regimen:
+            self.regimen.inicio_ciclo(t)
+        if self.viajes:
+            self.viajes.avanzar(t)
+
+        estados = []
+        for i, e in enumerate(self.edificios):
+            if siguientes is not None and e.tipo_edificio == Edificio.TIPO_ANT:
+                e.pronostico = [fila[e.nombre] for fila in siguientes]
+
+            if self.regimen:
+                e = self.regimen.simular_ciclo(e, t, rows["Tiempo"], rows[e.nombre])
+            else:
                 e.simular_ciclo(
                     t,
                     porcentaje_consumo=rows[e.nombre],
                 )
 
-                # exportar el minuto actual a un .csv
-                self.output.guardar_estado_de_edificio(
-                    tiempo=self.timer.actual_str,
-                    e=e,
-                )
+            # exportar el minuto actual a un .csv
+            self.output.guardar_estado_de_edificio(
+                tiempo=self.timer.actual_str,
+                e=e,
+            )
+            estados.append(e)
+
+        if self.red:
+            self.red.fin_de_ciclo(self.timer.actual_str)
+
+        return estados
+
+    def cerrar_ciclo(self):
+        """
+        Vuelca la salida y entrega los eventos del ciclo
+        """
+        # volcar a disco si corresponde
+        self.output.fin_de_ciclo()
+
+        # entregar los eventos del ciclo a los observadores
+        if self.eventos is not None:
+            self.eventos.append(FinCiclo(self.timer.tiempo_actual))
+            self.observadores.despachar(list(self.eventos))
+            self.eventos.clear()
+
+        # # uncomment this for a step by step execution
+        # input("PRESS ENTER TO CONTINUE, CTRL+D TO EXIT")
+
+    def terminar(self):
+        """
+        Exporta los resultados después de la última fila
+        """
+        if self.regimen:
+            self.regimen.terminar()
 
-            # # uncomment this for a step by step execution
-            # input("PRESS ENTER TO CONTINUE, CTRL+D TO EXIT")
+        if self.red and isinstance(self.output, DB):
+            self.red.guardar(self.output)
+
+        for e in self.edificios:
+            if e.tipo_edificio == Edificio.TIPO_ANT and e.ciclos_planificados:
+                logger.warning(
+                    f"Anticipacion - {e}: {e.ciclos_planificados} ciclos, "
+                    f"promedio={e.ms_planificando / e.ciclos_planificados:.3f}ms, "
+                    f"max={e.max_ms_planificando:.3f}ms, "
+                    f"horizonte={e.ciclos_de_anticipacion} ciclos"
+                )
 
         self.output.exportar_archivos()
+
+        # describir la salida para unirla con la de los otros fragmentos
+        if self.fragmento and isinstance(self.output, DB):
+            guardar_manifiesto(self, self.tiempos)
+
+        if self.telemetria:
+            self.telemetria.terminar()
+
+        return self.output
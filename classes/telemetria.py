@@ -0,0 +1,213 @@
+"""
+TELEMETRIA
+
+Métricas de avance de la simulación en formato de texto de Prometheus.
+Se registra como observador de la simulación y las publica en un archivo
+que se reescribe periódicamente y/o en un endpoint HTTP local (/metrics)
+"""
+
+import logging
+import os
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+from classes.eventos import Evento, FinCiclo, FinCicloEdificio
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = "electric_city"
+
+
+def memoria_residente() -> int:
+    """
+    Memoria residente actual en bytes (o el máximo si no hay /proc)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # en linux ru_maxrss viene en KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Telemetria:
+    def __init__(
+        self,
+        total_ciclos: int | None = None,
+        cola_de_escritura: Callable[[], int] | None = None,
+        archivo: str | None = None,
+        puerto: int = 0,
+        cada_segundos: float = 5,
+    ):
+        # total de ciclos del input, para estimar el tiempo restante
+        self.total_ciclos = total_ciclos
+        # funcion que retorna los lotes esperando al escritor
+        self.cola_de_escritura = cola_de_escritura
+
+        self.archivo = archivo
+        self.cada_segundos = cada_segundos
+        self.servidor: ThreadingHTTPServer | None = None
+        self.lock = threading.Lock()
+
+        self.inicio = time.monotonic()
+        self.ultima_escritura = self.inicio
+        self.tiempo_simulado = None
+        self.ciclos = 0
+        self.edificios_simulados = 0
+        self.energia_por_politica: Dict[str, float] = {}
+        self.en_espera_por_politica: Dict[str, int] = {}
+
+        if puerto:
+            self.iniciar_servidor(puerto)
+
+    ############################################################
+    # Observador
+    ############################################################
+    def __call__(self, eventos: List[Evento]):
+        with self.lock:
+            for evento in eventos:
+                if isinstance(evento, FinCicloEdificio):
+                    self.edificios_simulados += 1
+                    politica = evento.politica
+                    self.energia_por_politica[politica] = (
+                        self.energia_por_politica.get(politica, 0)
+                        + evento.potencia_usada_por_autos
+                    )
+                    self.en_espera_por_politica[politica] = (
+                        self.en_espera_por_politica.get(politica, 0)
+                        + evento.autos_en_espera
+                    )
+                elif isinstance(evento, FinCiclo):
+                    self.ciclos += 1
+                    self.tiempo_simulado = evento.tiempo
+
+        if self.archivo and time.monotonic() - self.ultima_escritura >= self.cada_segundos:
+            self.escribir_archivo()
+
+    ############################################################
+    # Exposición
+    ############################################################
+    def metricas(self) -> str:
+        with self.lock:
+            segundos = max(time.monotonic() - self.inicio, 1e-9)
+            ciclos_por_segundo = self.ciclos / segundos
+
+            metricas = [
+                ("ciclos_total", "counter", "Ciclos simulados", self.ciclos),
+                (
+                    "edificios_simulados_total",
+                    "counter",
+                    "Ciclos de edificio simulados",
+                    self.edificios_simulados,
+                ),
+                ("ciclos_por_segundo", "gauge", "Ciclos por segundo", ciclos_por_segundo),
+                (
+                    "edificios_por_segundo",
+                    "gauge",
+                    "Ciclos de edificio por segundo",
+                    self.edificios_simulados / segundos,
+                ),
+                ("segundos_transcurridos", "gauge", "Tiempo real de ejecución", segundos),
+                (
+                    "memoria_residente_bytes",
+                    "gauge",
+                    "Memoria residente del proceso",
+                    memoria_residente(),
+                ),
+            ]
+
+            if self.tiempo_simulado:
+                metricas.append(
+                    (
+                        "tiempo_simulado_segundos",
+                        "gauge",
+                        "Tiempo simulado actual (unix)",
+                        self.tiempo_simulado.timestamp(),
+                    )
+                )
+            if self.total_ciclos and ciclos_por_segundo:
+                restantes = max(self.total_ciclos - self.ciclos, 0)
+                metricas.append(
+                    (
+                        "eta_segundos",
+                        "gauge",
+                        "Tiempo estimado para terminar",
+                        restantes / ciclos_por_segundo,
+                    )
+                )
+            if self.cola_de_escritura:
+                metricas.append(
+                    (
+                        "cola_de_escritura_lotes",
+                        "gauge",
+                        "Lotes esperando al escritor",
+                        self.cola_de_escritura(),
+                    )
+                )
+
+            lineas = []
+            for nombre, tipo, ayuda, valor in metricas:
+                lineas += [
+                    f"# HELP {PREFIJO}_{nombre} {ayuda}",
+                    f"# TYPE {PREFIJO}_{nombre} {tipo}",
+                    f"{PREFIJO}_{nombre} {float(valor)!r}",
+                ]
+
+            for nombre, ayuda, valores in [
+                ("energia_entregada_kwh_total", "Energía entregada por politica", self.energia_por_politica),
+                ("autos_en_espera_total", "Ciclos de autos en espera por politica", self.en_espera_por_politica),
+            ]:
+                lineas += [
+                    f"# HELP {PREFIJO}_{nombre} {ayuda}",
+                    f"# TYPE {PREFIJO}_{nombre} counter",
+                ]
+                lineas += [
+                    f'{PREFIJO}_{nombre}{{politica="{politica}"}} {float(valor)!r}'
+                    for politica, valor in valores.items()
+                ]
+
+        return "\n".join(lineas) + "\n"
+
+    def escribir_archivo(self):
+        """
+        Reescribe el archivo de forma atómica, para no leerlo a medias
+        """
+        temporal = f"{self.archivo}.tmp"
+        with open(temporal, "w") as archivo:
+            archivo.write(self.metricas())
+        os.replace(temporal, self.archivo)
+        self.ultima_escritura = time.monotonic()
+
+    def iniciar_servidor(self, puerto: int):
+        telemetria = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                contenido = telemetria.metricas().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def log_message(self, format, *args):
+                logger.debug("Telemetria - " + format, *args)
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Handler)
+        threading.Thread(
+            target=self.servidor.serve_forever, name="Telemetria", daemon=True
+        ).start()
+        logger.warning(f"Telemetria - escuchando en http://127.0.0.1:{puerto}/metrics")
+
+    def terminar(self):
+        if self.archivo:
+            self.escribir_archivo()
+        if self.servidor:
+            self.servidor.shutdown()
+            self.servidor.server_close()
@@ -6,6 +6,7 @@ from random import randrange
 from typing import List, Tuple
 
 import helpers.constants as c
+from classes.eventos import BateriaAgotada, LlegadaVehiculo, SalidaVehiculo
 from classes.timer import Timer
 from helpers.utils import (
     distancia_en_minutos,
@@ -82,6 +83,21 @@ class Vehiculo:
         gasto = self.consumo_de_viaje(self.velocidad_promedio, c.MINS_POR_CICLO)
         logger.info(f"{self} perdio bateria [{gasto=:.2f}]")
 
+        # registrar en el edificio si se quedó sin batería en este viaje
+        if 0 < self.bateria <= gasto:
+            logger.info(f"{self} se quedo sin bateria")
+            self.edificio.vehículos_agotados += 1
+
+            if self.edificio.eventos is not None:
+                self.edificio.eventos.append(
+                    BateriaAgotada(
+                        self.edificio.timer.tiempo_actual,
+                        self.edificio.nombre,
+                        self.edificio.tipo_edificio,
+                        self.nombre,
+                    )
+                )
+
         self.bateria -= gasto
 
         # que no baje de 0
@@ -218,6 +234,13 @@ class Vehiculo:
         if s <= t_t <= l:
             logger.info(f"{self}: esta fuera de {self.edificio}")
 
+            # si recien sale en su primer viaje, revisar si le alcanza para el día
+            if self.en_el_edificio and self.siguiente_salida == 0:
+                self.registrar_salida_del_dia()
+
+            if self.en_el_edificio and self.edificio.eventos is not None:
+                self.edificio.eventos.append(self._evento(SalidaVehiculo, t))
+
             if t_t == l:
                 self.siguiente_salida = (self.siguiente_salida + 1) % len(self.salidas)
                 logger.info(f"{self}: {self.siguiente_salida=}")
@@ -226,11 +249,29 @@ class Vehiculo:
             return
 
         logger.debug(f"{self}: esta dentro de {self.edificio}")
+
+        if not self.en_el_edificio and self.edificio.eventos is not None:
+            self.edificio.eventos.append(self._evento(LlegadaVehiculo, t))
+
         self.en_el_edificio = True
 
+    def registrar_salida_del_dia(self) -> None:
+        """
+        Al salir por primera vez en el día, guarda en el edificio
+        la energía que le faltó para cubrir el gasto total del día
+        """
+        faltante = self.gasto_total_del_dia - self.bateria / self.max_bateria
+        if faltante > 0:
+            logger.info(f"{self}: salio sin carga suficiente [{faltante=:.2f}]")
+            self.edificio.salidas_sin_carga += 1
+            self.edificio.demanda_no_cubierta += faltante * self.max_bateria
+
     ############################################################
     # Helper tools
     ############################################################
+    def _evento(self, tipo, t: datetime.datetime):
+        return tipo(t, self.edificio.nombre, self.edificio.tipo_edificio, self.nombre, self.bateria)
+
     def __repr__(self) -> str:
         return self.nombre
 
@@ -0,0 +1,232 @@
+"""
+VERIFICACION
+
+Compara el motor de referencia (Edificio/Vehiculo) con un motor rápido
+(o cualquier otra configuración) corriendo ambos con la misma semilla y
+el mismo input, ciclo a ciclo: potencia disponible, gasto de cargadores,
+contadores, baterías y prioridades.
+
+Reporta la primera diferencia que pasa la tolerancia de su campo, con el
+contexto del edificio en ese ciclo y el anterior.
+
+EJ: 20 escenarios al azar contra el motor numba
+```
+for escenario, divergencia in verificar_escenarios({"MOTOR": "numba"}, cantidad=20):
+    if divergencia:
+        print(divergencia.reporte())
+```
+"""
+
+import logging
+import random
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+import helpers.constants as c
+from classes.en_memoria import PotenciasEnMemoria, SalidaEnMemoria
+
+logger = logging.getLogger(__name__)
+
+REFERENCIA = {"MOTOR": "objetos", "ESTACIONARIO": 0}
+# valores que deben ser iguales en ambas simulaciones: con presupuesto, el
+# horizonte de Anticipado depende de la velocidad de cada motor
+FIJOS = {"ANTICIPACION_PRESUPUESTO_MS": 0}
+
+# diferencia absoluta máxima de cada campo
+TOLERANCIAS = {
+    "potencia_disponible": 1e-9,
+    "potencia_usada_por_autos": 1e-9,
+    "autos_en_espera": 0,
+    "vehículos_agotados": 0,
+    "salidas_sin_carga": 0,
+    "demanda_no_cubierta": 1e-9,
+    "bateria": 1e-9,
+    "prioridad": 1e-9,
+}
+
+
+class Divergencia(NamedTuple):
+    ciclo: int
+    tiempo: str
+    edificio: str
+    politica: str
+    campo: str
+    vehiculo: int | None
+    referencia: float
+    rapido: float
+    contexto: Dict
+
+    def reporte(self) -> str:
+        vehiculo = f", vehículo {self.vehiculo}" if self.vehiculo is not None else ""
+        lineas = [
+            f"Divergencia en el ciclo {self.ciclo} ({self.tiempo}), "
+            f"{self.edificio} {self.politica}{vehiculo}",
+            f"  {self.campo}: referencia={self.referencia!r} rapido={self.rapido!r} "
+            f"(diferencia={abs(self.referencia - self.rapido):.3g})",
+        ]
+        for nombre, valor in self.contexto.items():
+            lineas.append(f"  {nombre}: {valor}")
+        return "\n".join(lineas)
+
+
+def correr(potencias: PotenciasEnMemoria, config: Dict, nombre: str = "Verificacion") -> Dict:
+    # importar aquí para no crear un import circular con Simulacion
+    from classes.simulacion import Simulacion
+
+    with c.configuracion(**config):
+        s = Simulacion(nombre, potencias=potencias)
+        return s.empezar(salida=SalidaEnMemoria()).resultado
+
+
+def comparar(
+    referencia: Dict,
+    rapido: Dict,
+    potencias: PotenciasEnMemoria | None = None,
+    tolerancias: Dict | None = None,
+) -> Divergencia | None:
+    """
+    Retorna la primera diferencia (por ciclo, luego campo y edificio)
+    """
+    tolerancias = {**TOLERANCIAS, **(tolerancias or {})}
+
+    for campo in ["edificios", "politicas", "tiempos"]:
+        if list(referencia[campo]) != list(rapido[campo]):
+            raise ValueError(f"Los resultados no tienen los mismos {campo}")
+
+    # ciclos con alguna diferencia en cada campo
+    distintos = {}
+    for campo, tolerancia in tolerancias.items():
+        a = np.asarray(referencia[campo], dtype=np.float64)
+        b = np.asarray(rapido[campo], dtype=np.float64)
+        diferente = ~np.isclose(a, b, rtol=0, atol=tolerancia, equal_nan=True)
+        if diferente.any():
+            distintos[campo] = np.argwhere(diferente)
+
+    if not distintos:
+        return None
+
+    # la primera en el tiempo, y en el orden de los campos
+    campo, indice = min(
+        ((campo, tuple(indices[0])) for campo, indices in distintos.items()),
+        key=lambda x: x[1][0],
+    )
+    ciclo, columna = int(indice[0]), int(indice[1])
+    vehiculo = int(indice[2]) if len(indice) > 2 else None
+
+    return Divergencia(
+        ciclo=ciclo,
+        tiempo=referencia["tiempos"][ciclo],
+        edificio=referencia["edificios"][columna],
+        politica=referencia["politicas"][columna],
+        campo=campo,
+        vehiculo=vehiculo,
+        referencia=float(referencia[campo][indice]),
+        rapido=float(rapido[campo][indice]),
+        contexto=_contexto(referencia, rapido, potencias, ciclo, columna, distintos),
+    )
+
+
+def _contexto(referencia, rapido, potencias, ciclo, columna, distintos) -> Dict:
+    contexto = {
+        "campos con diferencias": {
+            campo: f"{len(indices)} valores desde el ciclo {int(indices[0][0])}"
+            for campo, indices in distintos.items()
+        },
+    }
+    if potencias is not None:
+        i = potencias.edificios.index(referencia["edificios"][columna])
+        contexto["consumo (%)"] = float(potencias.consumos[ciclo, i])
+
+    for desfase, nombre in [(1, "ciclo anterior"), (0, "ciclo")]:
+        n = ciclo - desfase
+        if n < 0:
+            continue
+        for campo in TOLERANCIAS:
+            a = np.asarray(referencia[campo][n][columna])
+            b = np.asarray(rapido[campo][n][columna])
+            if a.ndim:
+                # solo los vehículos que existen en el edificio
+                a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+            contexto[f"{nombre} {campo}"] = f"referencia={a.tolist()} rapido={b.tolist()}"
+    return contexto
+
+
+def verificar(
+    potencias: PotenciasEnMemoria,
+    rapido: Dict,
+    config: Dict | None = None,
+    tolerancias: Dict | None = None,
+) -> Divergencia | None:
+    """
+    Corre la referencia y la configuración `rapido` (EJ: {"MOTOR": "numba"})
+    sobre las mismas potencias, ambas con los valores de `config`
+    """
+    config = {**(config or {}), **FIJOS}
+    resultado_referencia = correr(potencias, {**config, **REFERENCIA}, "Referencia")
+    resultado_rapido = correr(potencias, {**config, **rapido}, "Rapido")
+    return comparar(resultado_referencia, resultado_rapido, potencias, tolerancias)
+
+
+def potencias_de_archivo(nombre: str) -> PotenciasEnMemoria:
+    """
+    Lee el archivo de potencias una vez, para darle el mismo input a ambos motores
+    """
+    return PotenciasEnMemoria.leer_archivo(nombre)
+
+
+############################################################
+# Escenarios al azar
+############################################################
+def escenario_aleatorio(rng: random.Random) -> Tuple[Dict, np.ndarray, List[str]]:
+    """
+    Configuración e input al azar: (config, consumos, edificios)
+    """
+    min_salidas = rng.randint(1, 3)
+    config = {
+        "SEED": rng.randrange(2**31),
+        "VEHÍCULOS_POR_EDIFICIO": rng.randint(1, 12),
+        "POTENCIA_DECLARADA": rng.choice([500, 2000, 10000, 25000]),
+        "FACTOR_DE_ESCALA": rng.choice([50, 100]),
+        "LIMITAR_CARGADORES": rng.randint(0, 1),
+        "TOPE_DE_CARGADORES": rng.randint(0, 5),
+        "HAY_FALLA": rng.randint(0, 1),
+        "HAY_ALTA_DEMANDA": rng.randint(0, 1),
+        "AVG_RENDIMIENTO": round(rng.uniform(2, 8), 2),
+        "AVG_BATERIA_INI": round(rng.uniform(5, 80), 2),
+        "MIN_SALIDAS": min_salidas,
+        "MAX_SALIDAS": rng.randint(min_salidas, 4),
+        "TOPE_TIEMPO_DE_MANEJO": rng.choice([60, 180]),
+    }
+
+    cant_edificios = rng.randint(1, 4)
+    ciclos = rng.randint(1, 3) * 24 * 60 // c.MINS_POR_CICLO
+    # un perfil diario con ruido, por edificio
+    np_rng = np.random.default_rng(rng.randrange(2**31))
+    base = np_rng.uniform(10, 90, size=(1, cant_edificios))
+    consumos = np.clip(base + np_rng.normal(0, 15, size=(ciclos, cant_edificios)), 0, 100)
+    consumos = np.round(consumos, 2)
+
+    edificios = [f"Edificio {i + 1}" for i in range(cant_edificios)]
+    return config, consumos, edificios
+
+
+def verificar_escenarios(
+    rapido: Dict,
+    cantidad: int,
+    semilla: int = 0,
+    tolerancias: Dict | None = None,
+) -> Iterator[Tuple[Dict, Divergencia | None]]:
+    """
+    Test diferencial: compara ambos motores en `cantidad` escenarios al azar
+    """
+    rng = random.Random(semilla)
+    for i in range(cantidad):
+        config, consumos, edificios = escenario_aleatorio(rng)
+        potencias = PotenciasEnMemoria(consumos, edificios)
+        divergencia = verificar(potencias, rapido, config, tolerancias)
+        logger.warning(
+            f"Verificacion - escenario {i + 1}/{cantidad}: "
+            f"{'DIVERGE' if divergencia else 'ok'} {config}"
+        )
+        yield config, divergencia
@@ -0,0 +1,310 @@
+"""
+REGISTRO DE VIAJES
+
+Viajes reales de la flota, en vez de las salidas al azar de Vehiculo.
+Se leen de un archivo (csv, tsv, xlsx, sqlite o .npz) con las columnas:
+
+    Vehiculo, Edificio, Salida, Llegada, Distancia
+
+- Salida/Llegada: minutos desde las 00:00 del primer día de la simulación,
+  o "HH:MM" / "D HH:MM" (D = número de día, partiendo en 0)
+- Distancia: KM recorridos en el viaje
+
+Los viajes se guardan en arreglos ordenados por salida (y un índice
+ordenado por llegada), y en cada ciclo se avanzan dos punteros, así el
+costo de cada ciclo depende de los viajes que empiezan o terminan en él
+y no del total de viajes.
+
+Los vehículos se numeran agrupados por edificio, así cada edificio usa
+un rango contiguo de los arreglos globales.
+
+EJ: convertir el archivo una vez para que cargue rápido
+```
+RegistroDeViajes.leer("viajes.csv").guardar("viajes.npz")
+```
+"""
+
+import datetime
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+import helpers.constants as c
+
+logger = logging.getLogger(__name__)
+
+HEADERS_VIAJES = ["Vehiculo", "Edificio", "Salida", "Llegada", "Distancia"]
+
+MINUTOS_POR_DIA = 24 * 60
+
+
+def a_numero(valor) -> float:
+    if isinstance(valor, str):
+        valor = valor.strip().replace(",", ".")
+    return float(valor)
+
+
+def a_minutos(valor) -> float:
+    """
+    Minutos desde el inicio a partir de un número, "HH:MM" o "D HH:MM"
+    """
+    if not isinstance(valor, str) or ":" not in valor:
+        return a_numero(valor)
+
+    valor = valor.strip()
+
+    dia = 0
+    if " " in valor:
+        dia, valor = valor.split()
+    horas, minutos = valor.split(":")
+    return int(dia) * MINUTOS_POR_DIA + int(horas) * 60 + float(minutos)
+
+
+class RegistroDeViajes:
+    def __init__(
+        self,
+        vehiculos: np.ndarray,
+        edificios: np.ndarray,
+        inicio_edificio: np.ndarray,
+        vehiculo: np.ndarray,
+        salida: np.ndarray,
+        llegada: np.ndarray,
+        distancia: np.ndarray,
+    ):
+        """
+        - vehiculos, edificios: nombres, ordenados por indice
+        - inicio_edificio: primer vehículo de cada edificio (+ el total al final)
+        - vehiculo, salida, llegada, distancia: un valor por viaje,
+          ordenados por salida
+        """
+        self.vehiculos = vehiculos
+        self.edificios = edificios
+        self.inicio_edificio = inicio_edificio
+        self.indice_edificio: Dict[str, int] = {e: i for i, e in enumerate(edificios.tolist())}
+
+        self.vehiculo = vehiculo
+        self.salida = salida
+        self.llegada = llegada
+        self.distancia = distancia
+        # KM por minuto de cada viaje (los de duración 0 duran un segundo)
+        self.tasa = distancia / np.maximum(llegada - salida, 1 / 60)
+
+        # indice de los viajes ordenados por llegada
+        self.orden_llegada = np.argsort(llegada, kind="stable")
+        self.llegada_ordenada = llegada[self.orden_llegada]
+
+        self.reiniciar()
+
+    ############################################################
+    # Estado
+    ############################################################
+    def reiniciar(self):
+        cant = len(self.vehiculos)
+        self.origen: datetime.datetime | None = None
+        self.minuto: float | None = None
+        self.dia: int | None = None
+
+        # punteros a los siguientes viajes que salen y llegan
+        self.i_salida = 0
+        self.i_llegada = 0
+
+        # estado de cada vehículo
+        self.viajes_en_curso = np.zeros(cant, dtype=np.int32)
+        self.km_por_minuto = np.zeros(cant)
+        self.ultimo_dia_de_salida = np.full(cant, -1, dtype=np.int64)
+
+        # resultados del ciclo actual
+        self.km_del_ciclo = np.zeros(cant)
+        self.km_del_dia = np.zeros(cant)
+        self.salen = np.zeros(0, dtype=np.int64)
+        self.llegan = np.zeros(0, dtype=np.int64)
+        self.primeras_salidas = np.zeros(0, dtype=np.int64)
+
+    @property
+    def fuera(self) -> np.ndarray:
+        return self.viajes_en_curso > 0
+
+    ############################################################
+    # Avanzar
+    ############################################################
+    def avanzar(self, t: datetime.datetime):
+        """
+        Procesa los viajes que salen o llegan desde el ciclo anterior
+        hasta t (incluido), y deja:
+        - km_del_ciclo: KM manejados por cada vehículo en el ciclo
+        - salen/llegan: vehículos que salieron/llegaron en el ciclo
+        - primeras_salidas: vehículos que salen por primera vez en el día
+        - km_del_dia: KM de los viajes que salen en el día de t
+        """
+        if self.origen is None:
+            self.origen = datetime.datetime.combine(t.date(), datetime.time())
+        fin = (t - self.origen).total_seconds() / 60
+        inicio = self.minuto if self.minuto is not None else fin - c.MINS_POR_CICLO
+        self.minuto = fin
+
+        dia = int(fin // MINUTOS_POR_DIA)
+        if dia != self.dia:
+            self.dia = dia
+            self._calcular_km_del_dia(dia)
+
+        # lo que manejan los que ya estaban fuera
+        np.multiply(self.km_por_minuto, fin - inicio, out=self.km_del_ciclo)
+
+        # viajes que salen: manejan desde su salida hasta el final del ciclo
+        hasta = int(np.searchsorted(self.salida, fin, side="right"))
+        viajes = np.arange(self.i_salida, hasta)
+        self.i_salida = hasta
+
+        salen = self.vehiculo[viajes]
+        tasa = self.tasa[viajes]
+        desde = np.maximum(self.salida[viajes], inicio)
+        np.add.at(self.km_del_ciclo, salen, tasa * (fin - desde))
+        np.add.at(self.km_por_minuto, salen, tasa)
+        np.add.at(self.viajes_en_curso, salen, 1)
+
+        primeras = salen[self.ultimo_dia_de_salida[salen] != dia]
+        self.ultimo_dia_de_salida[salen] = dia
+
+        # viajes que llegan: dejan de manejar desde su llegada
+        hasta = int(np.searchsorted(self.llegada_ordenada, fin, side="right"))
+        viajes = self.orden_llegada[self.i_llegada : hasta]
+        self.i_llegada = hasta
+
+        llegan = self.vehiculo[viajes]
+        tasa = self.tasa[viajes]
+        desde = np.maximum(self.llegada[viajes], inicio)
+        np.add.at(self.km_del_ciclo, llegan, -tasa * (fin - desde))
+        np.add.at(self.km_por_minuto, llegan, -tasa)
+        np.add.at(self.viajes_en_curso, llegan, -1)
+
+        # evitar que se acumule error de redondeo en los que ya no manejan
+        detenidos = llegan[self.viajes_en_curso[llegan] == 0]
+        self.km_por_minuto[detenidos] = 0
+        np.maximum(self.km_del_ciclo, 0, out=self.km_del_ciclo)
+
+        self.salen = np.unique(salen)
+        self.llegan = np.unique(llegan)
+        self.primeras_salidas = np.unique(primeras)
+
+    def _calcular_km_del_dia(self, dia: int):
+        desde, hasta = np.searchsorted(
+            self.salida, [dia * MINUTOS_POR_DIA, (dia + 1) * MINUTOS_POR_DIA]
+        )
+        self.km_del_dia = np.bincount(
+            self.vehiculo[desde:hasta],
+            weights=self.distancia[desde:hasta],
+            minlength=len(self.vehiculos),
+        )
+
+    ############################################################
+    # Consultas por edificio
+    ############################################################
+    def rango(self, edificio: str) -> slice:
+        """
+        Vehículos del edificio en los arreglos globales
+        """
+        i = self.indice_edificio.get(edificio)
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.inicio_edificio[i]), int(self.inicio_edificio[i + 1]))
+
+    def nombres(self, edificio: str) -> List[str]:
+        return self.vehiculos[self.rango(edificio)].tolist()
+
+    @staticmethod
+    def en_rango(vehiculos: np.ndarray, rango: slice) -> np.ndarray:
+        """
+        Indices locales de los vehículos (ordenados) que están en el rango
+        """
+        desde, hasta = np.searchsorted(vehiculos, [rango.start, rango.stop])
+        return vehiculos[desde:hasta] - rango.start
+
+    ############################################################
+    # Archivos
+    ############################################################
+    @classmethod
+    def leer(cls, nombre: str) -> "RegistroDeViajes":
+        if nombre.endswith(".npz"):
+            with np.load(nombre) as datos:
+                return cls(**{k: datos[k] for k in datos.files})
+
+        from classes.database import DB
+
+        columnas = {h: [] for h in HEADERS_VIAJES}
+        for fila in DB().leer(nombre):
+            for h in HEADERS_VIAJES:
+                columnas[h].append(fila[h])
+
+        return cls.desde_columnas(
+            vehiculo=np.array(columnas["Vehiculo"], dtype=str),
+            edificio=np.array(columnas["Edificio"], dtype=str),
+            salida=np.array([a_minutos(v) for v in columnas["Salida"]]),
+            llegada=np.array([a_minutos(v) for v in columnas["Llegada"]]),
+            distancia=np.array([a_numero(v) for v in columnas["Distancia"]]),
+        )
+
+    @classmethod
+    def desde_columnas(
+        cls,
+        vehiculo: np.ndarray,
+        edificio: np.ndarray,
+        salida: np.ndarray,
+        llegada: np.ndarray,
+        distancia: np.ndarray,
+    ) -> "RegistroDeViajes":
+        """
+        Crea el registro a partir de un valor por viaje, en cualquier orden
+        """
+        edificios, edificio_de_viaje = np.unique(edificio, return_inverse=True)
+        vehiculos, vehiculo_de_viaje = np.unique(vehiculo, return_inverse=True)
+
+        # cada vehículo pertenece al edificio de su primer viaje
+        edificio_de_vehiculo = np.empty(len(vehiculos), dtype=np.int64)
+        edificio_de_vehiculo[vehiculo_de_viaje[::-1]] = edificio_de_viaje[::-1]
+        otros = edificio_de_vehiculo[vehiculo_de_viaje] != edificio_de_viaje
+        if otros.any():
+            logger.warning(
+                f"Viajes - {int(otros.sum())} viajes de vehículos de otro edificio, "
+                f"se asignan al edificio de su primer viaje"
+            )
+
+        # numerar los vehículos agrupados por edificio
+        orden = np.lexsort((np.arange(len(vehiculos)), edificio_de_vehiculo))
+        nuevo_indice = np.empty_like(orden)
+        nuevo_indice[orden] = np.arange(len(orden))
+        inicio_edificio = np.searchsorted(
+            edificio_de_vehiculo[orden], np.arange(len(edificios) + 1)
+        )
+
+        # viajes ordenados por salida
+        orden_viajes = np.argsort(salida, kind="stable")
+        registro = cls(
+            vehiculos=vehiculos[orden],
+            edificios=edificios,
+            inicio_edificio=inicio_edificio,
+            vehiculo=nuevo_indice[vehiculo_de_viaje][orden_viajes],
+            salida=np.asarray(salida, dtype=np.float64)[orden_viajes],
+            llegada=np.asarray(llegada, dtype=np.float64)[orden_viajes],
+            distancia=np.asarray(distancia, dtype=np.float64)[orden_viajes],
+        )
+        logger.warning(
+            f"Viajes - {len(salida)} viajes de {len(vehiculos)} vehículos "
+            f"en {len(edificios)} edificios"
+        )
+        return registro
+
+    def guardar(self, nombre: str):
+        """
+        Guarda los arreglos ya ordenados en un .npz
+        """
+        np.savez(
+            nombre,
+            vehiculos=self.vehiculos,
+            edificios=self.edificios,
+            inicio_edificio=self.inicio_edificio,
+            vehiculo=self.vehiculo,
+            salida=self.salida,
+            llegada=self.llegada,
+            distancia=self.distancia,
+        )
@@ -2,7 +2,8 @@ import math
 import os
 import random
 import sys
-from typing import Literal
+from contextlib import contextmanager
+from typing import Dict, Literal
 
 import numpy as np
 from dotenv import dotenv_values
@@ -12,12 +13,63 @@ from dotenv import dotenv_values
 script_path = os.path.abspath(sys.argv[0])
 script_dir = os.path.dirname(script_path)
 
-# Cargar variables desde el archivo env.txt
-config = dotenv_values(f"{script_dir}/env.txt")
+# Valores que reemplazan a los de env.txt (ver configurar),
+# se mantienen al recargar este modulo
+OVERRIDES: Dict[str, str] = globals().get("OVERRIDES", {})
+
+# env.txt ya leídos y el código de este modulo, para recalcular las
+# constantes sin volver a leer archivos (ver configurar)
+ENV_LEIDOS: Dict[str, Dict] = globals().get("ENV_LEIDOS", {})
+CODIGO = globals().get("CODIGO") or compile(open(__file__, encoding="utf-8").read(), __file__, "exec")
+
+# Cargar variables desde el archivo env.txt (o el indicado en ELECTRIC_CITY_ENV)
+ENV_FILE = os.environ.get("ELECTRIC_CITY_ENV", f"{script_dir}/env.txt")
+if ENV_FILE not in ENV_LEIDOS:
+    ENV_LEIDOS[ENV_FILE] = dotenv_values(ENV_FILE)
+config = {**ENV_LEIDOS[ENV_FILE], **OVERRIDES}
 
 # usar la carpeta para encontrar el input
 INPUT_FILE = config.get("INPUT_FILE")
-OUTPUT_FORMAT: Literal["xlsx", "tsv", "csv"] = config.get("OUTPUT_FORMAT")
+# Viajes reales de la flota (ver RegistroDeViajes), en vez de salidas al azar
+VIAJES_FILE = config.get("VIAJES_FILE")
+# Alimentadores y subestaciones de cada edificio, con sus topes (ver Red)
+RED_FILE = config.get("RED_FILE")
+OUTPUT_FOLDER = config.get("OUTPUT_FOLDER", f"{script_dir}/outputs")
+OUTPUT_FORMAT: Literal["xlsx", "tsv", "csv", "sqlite"] = config.get("OUTPUT_FORMAT")
+# ancho: un archivo por edificio, largo: un archivo por politica con una fila por vehículo
+# delta: como largo, pero solo escribe los valores que cambiaron
+# resumen: solo escribe métricas acumuladas por edificio y politica al terminar
+OUTPUT_MODO: Literal["ancho", "largo", "delta", "resumen"] = config.get("OUTPUT_MODO", "ancho")
+# Cambio mínimo (bateria/prioridad/potencia) para escribir un valor en modo delta
+OUTPUT_TOLERANCIA_DELTA = float(config.get("OUTPUT_TOLERANCIA_DELTA", 0))
+# Cada cuántos ciclos se vuelcan las filas en memoria a los archivos (0 = solo al final)
+OUTPUT_CICLOS_POR_VOLCADO = int(config.get("OUTPUT_CICLOS_POR_VOLCADO", 0))
+# Escribir los archivos desde un hilo aparte, con una cola de a lo más N lotes
+OUTPUT_EN_SEGUNDO_PLANO = bool(int(config.get("OUTPUT_EN_SEGUNDO_PLANO", 0)))
+OUTPUT_TAMANO_COLA = int(config.get("OUTPUT_TAMANO_COLA", 8))
+
+# Telemetria: archivo de métricas reescrito cada N segundos y/o puerto HTTP local (0 = apagado)
+TELEMETRIA_ARCHIVO = config.get("TELEMETRIA_ARCHIVO")
+TELEMETRIA_PUERTO = int(config.get("TELEMETRIA_PUERTO", 0))
+TELEMETRIA_CADA_SEGUNDOS = float(config.get("TELEMETRIA_CADA_SEGUNDOS", 5))
+
+# Modo en linea (ver SimulacionEnLinea): milisegundos máximos desde que llega una
+# fila hasta publicar sus decisiones, y segundos sin filas para terminar (0 = nunca)
+EN_LINEA_PRESUPUESTO_MS = float(config.get("EN_LINEA_PRESUPUESTO_MS", 500))
+EN_LINEA_INACTIVIDAD = float(config.get("EN_LINEA_INACTIVIDAD", 0))
+# Archivo .jsonl donde se publican las decisiones de cada ciclo ("-" = stdout)
+EN_LINEA_DECISIONES = config.get("EN_LINEA_DECISIONES")
+
+# Servicio (ver Servicio): socket unix y/o carpeta donde recibe trabajos,
+# simulaciones a la vez (0 = una por CPU) y flotas guardadas en memoria
+SERVICIO_SOCKET = config.get("SERVICIO_SOCKET")
+SERVICIO_CARPETA = config.get("SERVICIO_CARPETA")
+SERVICIO_TRABAJADORES = int(config.get("SERVICIO_TRABAJADORES", 0))
+SERVICIO_MAX_FLOTAS = int(config.get("SERVICIO_MAX_FLOTAS", 32))
+
+# Con el motor rápido, los trabajadores (sweep --trabajadores, Servicio) leen el
+# input y los datos fijos de la flota desde memoria compartida (ver Compartido)
+MEMORIA_COMPARTIDA = bool(int(config.get("MEMORIA_COMPARTIDA", 1)))
 
 # Tiempo en minutos que avanza entre cada ciclo de tiempo
 MINS_POR_CICLO = int(config.get("MINS_POR_CICLO", 15))
@@ -26,11 +78,38 @@ LOG_LEVEL = config.get("LOG_LEVEL", "INFO")
 SIMULAR_FIFO = bool(int(config.get("SIMULAR_FIFO", 1)))
 SIMULAR_ROUNDROBIN = bool(int(config.get("SIMULAR_ROUNDROBIN", 1)))
 SIMULAR_INTELIGENTE = bool(int(config.get("SIMULAR_INTELIGENTE", 1)))
+# Reparto: divide la potencia disponible entre todos los autos (ver EdificioReparto)
+SIMULAR_REPARTO = bool(int(config.get("SIMULAR_REPARTO", 0)))
+# Anticipación: planifica con el consumo de los próximos ciclos (ver EdificioAnticipado)
+SIMULAR_ANTICIPACION = bool(int(config.get("SIMULAR_ANTICIPACION", 0)))
+# Ciclos que mira hacia adelante, y milisegundos máximos para planificar un
+# ciclo de un edificio: si se pasan el horizonte se reduce a la mitad (0 = sin límite)
+ANTICIPACION_CICLOS = int(config.get("ANTICIPACION_CICLOS", 16))
+ANTICIPACION_PRESUPUESTO_MS = float(config.get("ANTICIPACION_PRESUPUESTO_MS", 0))
+
+# objetos: Edificio/Vehiculo (referencia), numpy/numba: EdificioVectorial con
+# el estado en arreglos (numba solo si está instalado)
+MOTOR: Literal["objetos", "numpy", "numba"] = config.get("MOTOR", "objetos")
+
+# Dejar de simular los edificios cuyo estado al final del día se repite,
+# repitiendo su último día mientras el input sea el mismo (ver RegimenEstacionario)
+ESTACIONARIO = bool(int(config.get("ESTACIONARIO", 0)))
+# Diferencia máxima de batería (KWh) para considerar dos días iguales
+ESTACIONARIO_TOLERANCIA = float(config.get("ESTACIONARIO_TOLERANCIA", 0))
+
+# Modo aproximado (ver Aproximacion): fracción de los edificios que se simulan,
+# y cuántos de cada grupo de edificios parecidos (al menos 2, para estimar el error)
+APROXIMACION_FRACCION = float(config.get("APROXIMACION_FRACCION", 0.1))
+APROXIMACION_POR_GRUPO = int(config.get("APROXIMACION_POR_GRUPO", 2))
 
 # Cambiar seed para obtener otra simulación aleatoria
 SEED = int(config.get("SEED", 0))
-np.random.seed(SEED)
-random.seed(SEED)
+# Sembrar los vehículos de cada edificio con SEED y su nombre, en vez de
+# crearlos todos en orden con SEED (así un fragmento crea solo los suyos)
+SEMILLA_POR_EDIFICIO = bool(int(config.get("SEMILLA_POR_EDIFICIO", 0)))
+
+# Simular solo una parte de los edificios: rango:INICIO:FIN o hash:K/N (ver Fragmento)
+FRAGMENTO = config.get("FRAGMENTO")
 
 # ------------------- Constantes Edificios --------------------
 VEHÍCULOS_POR_EDIFICIO = int(config.get("VEHÍCULOS_POR_EDIFICIO", 5))
@@ -41,6 +120,9 @@ LIMITAR_CARGADORES = bool(int(config.get("LIMITAR_CARGADORES", 1)))
 TOPE_DE_CARGADORES = int(config.get("TOPE_DE_CARGADORES", 2))
 POTENCIA_MIN_CARGADORES = float(config.get("POTENCIA_MIN_CARGADORES", 2.2))
 POTENCIA_CARGADORES = float(config.get("POTENCIA_CARGADORES", 7.4))
+# Peso de los autos que ya tienen su gasto del día al repartir la potencia
+# (el resto pesa esto más su prioridad)
+REPARTO_PESO_MINIMO = float(config.get("REPARTO_PESO_MINIMO", 0.05))
 TOPE_TIEMPO_DE_MANEJO = int(config.get("TOPE_TIEMPO_DE_MANEJO", 3 * 60))
 
 # Periodos de falla reducen la potencia disponible a un 10%
@@ -56,6 +138,11 @@ HOLGURA_ALTA_DEMANDA = (
     int(config.get("HOLGURA_ALTA_DEMANDA", 25)) if HAY_ALTA_DEMANDA else 0
 )
 
+# Fallas y alta demanda por edificio, en vez de las ventanas de arriba (ver Escenario)
+ESCENARIOS_FILE = config.get("ESCENARIOS_FILE")
+# escenario del archivo que se simula (vacío si tiene uno solo)
+ESCENARIO = config.get("ESCENARIO", "")
+
 # ------------------- Constantes vehículos --------------------
 VELOCIDAD_PROMEDIO = int(config.get("VELOCIDAD_PROMEDIO", 50))  # KM/h
 CANT_SALIDAS = int(config.get("CANT_SALIDAS", 3))
@@ -76,3 +163,66 @@ VAR_BATERIA_INI = float(config.get("VAR_BATERIA_INI", 25))
 # Rendimiento
 AVG_RENDIMIENTO = float(config.get("AVG_RENDIMIENTO", 5.97))
 VAR_RENDIMIENTO = float(config.get("VAR_RENDIMIENTO", 1.16))
+
+
+def sembrar(seed: int | None = None):
+    """
+    Reinicia los generadores aleatorios, para repetir la misma ejecución
+    """
+    seed = SEED if seed is None else seed
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+def recalcular():
+    """
+    Vuelve a calcular todas las constantes con los OVERRIDES actuales,
+    sin leer env.txt ni este archivo de nuevo
+    """
+    exec(CODIGO, globals())
+
+
+def configurar(**valores):
+    """
+    Reemplaza valores de env.txt y recalcula todas las constantes
+
+    EJ: `c.configurar(POTENCIA_DECLARADA=30000, SIMULAR_FIFO=False)`
+    """
+    anteriores = dict(OVERRIDES)
+    for nombre, valor in valores.items():
+        # los booleanos se leen como enteros
+        if isinstance(valor, bool):
+            valor = int(valor)
+        OVERRIDES[nombre] = str(valor)
+    if OVERRIDES != anteriores:
+        recalcular()
+
+
+def restaurar():
+    """
+    Vuelve a los valores de env.txt
+    """
+    OVERRIDES.clear()
+    recalcular()
+
+
+@contextmanager
+def configuracion(**valores):
+    """
+    Aplica los valores solo dentro del bloque `with`
+
+    EJ:
+    ```
+    with c.configuracion(TOPE_DE_CARGADORES=4):
+        ...
+    ```
+    """
+    anteriores = dict(OVERRIDES)
+    try:
+        configurar(**valores)
+        yield
+    finally:
+        if OVERRIDES != anteriores:
+            OVERRIDES.clear()
+            OVERRIDES.update(anteriores)
+            recalcular()
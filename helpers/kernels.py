@@ -0,0 +1,324 @@
+"""
+Kernels
+
+Cálculos numéricos de cada ciclo (descarga, carga, capacidad, prioridad,
+turno de RoundRobin, reparto de potencia y plan de carga)
+sobre arreglos con el estado de todos los vehículos de un edificio.
+
+Hay dos versiones con los mismos resultados:
+- numpy: siempre disponible
+- numba: las mismas funciones compiladas, si numba está instalado
+
+Las operaciones se hacen en el mismo orden que en Vehiculo/Edificio
+para que ambos motores entreguen exactamente los mismos números.
+"""
+
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+############################################################
+# Versión numpy
+############################################################
+def drenar(bateria, rendimiento, manejando, distancia):
+    """
+    Descuenta la energía de un ciclo de viaje a los vehículos que manejan.
+    Retorna cuántos se quedaron sin batería en este ciclo
+    """
+    gasto = distancia / rendimiento[manejando]
+    antes = bateria[manejando]
+    agotados = int(np.count_nonzero((antes > 0) & (antes <= gasto)))
+    bateria[manejando] = np.maximum(antes - gasto, 0)
+    return agotados
+
+
+def drenar_distancias(bateria, rendimiento, distancias):
+    """
+    Igual que drenar, pero con los KM de cada vehículo en el ciclo
+    (0 si no manejó)
+    """
+    gasto = distancias / rendimiento
+    agotados = int(np.count_nonzero((gasto > 0) & (bateria > 0) & (bateria <= gasto)))
+    np.maximum(bateria - gasto, 0, out=bateria)
+    return agotados
+
+
+def cargar(bateria, max_bateria, en_carga, energia):
+    """
+    Suma la energía a cada vehículo en carga sin pasar su máximo.
+    Retorna la energía total usada por los cargadores
+    """
+    bateria[en_carga] = np.minimum(bateria[en_carga] + energia, max_bateria[en_carga])
+
+    # sumar uno a uno, igual que Vehiculo.cargar
+    total = 0
+    for _ in range(len(en_carga)):
+        total += energia
+    return total
+
+
+def capacidad(potencia_disponible, potencia_cargadores, limitar, tope):
+    """
+    Cantidad de vehículos que se pueden cargar a la vez
+    """
+    max_capacidad = int(potencia_disponible / potencia_cargadores)
+    if limitar and tope < max_capacidad:
+        max_capacidad = tope
+    return max_capacidad
+
+
+def prioridad(gasto_dia, bateria, max_bateria):
+    return gasto_dia - bateria / max_bateria
+
+
+def turno_rotativo(en_el_edificio, bateria, max_bateria, en_cola, ultimo, cantidad):
+    """
+    RoundRobin: los primeros `cantidad` vehículos que pueden cargar (en el
+    edificio, sin la batería llena y fuera de `en_cola`) después de `ultimo`,
+    dando la vuelta hasta llegar a él. Retorna los elegidos y el nuevo
+    `ultimo`: el último elegido si se completó la cantidad, o el mismo si no
+    alcanzan (se recorrieron todos)
+    """
+    if cantidad <= 0:
+        return np.zeros(0, dtype=np.int64), ultimo
+
+    puede_cargar = en_el_edificio & (bateria != max_bateria)
+    if len(en_cola):
+        puede_cargar[en_cola] = False
+    return siguientes_en_turno(puede_cargar, ultimo, cantidad)
+
+
+def siguientes_en_turno(puede_cargar, ultimo, cantidad):
+    """
+    turno_rotativo con los vehículos que pueden cargar ya marcados
+    (lo usa también EdificioRoundRobin)
+    """
+    elegibles = np.flatnonzero(puede_cargar)
+
+    # los que siguen a `ultimo`, y después los del inicio
+    corte = np.searchsorted(elegibles, ultimo, side="right")
+    despues = elegibles[corte : corte + cantidad]
+    elegidos = np.concatenate((despues, elegibles[: min(corte, cantidad - len(despues))]))
+    if len(elegidos) == cantidad:
+        return elegidos, int(elegidos[-1])
+    return elegidos, ultimo
+
+
+def repartir(potencia, peso, minimo, maximo, max_autos):
+    """
+    Reparte la potencia entre los vehículos (water-filling): cada uno
+    recibe λ * peso, acotado entre su mínimo y su máximo, con el λ que
+    suma la potencia. Si no alcanza para el mínimo de todos, cargan los
+    de más peso (a lo más max_autos).
+
+    Retorna la potencia de cada vehículo (0 si no carga)
+    """
+    resultado = np.zeros(len(peso))
+    if not len(peso) or potencia <= 0 or max_autos <= 0:
+        return resultado
+
+    orden = np.argsort(-peso, kind="stable")
+    cant = min(
+        len(peso),
+        max_autos,
+        int(np.searchsorted(np.cumsum(minimo[orden]), potencia, side="right")),
+    )
+    if cant == 0:
+        return resultado
+
+    elegidos = orden[:cant]
+    peso, minimo, maximo = peso[elegidos], minimo[elegidos], maximo[elegidos]
+    if maximo.sum() <= potencia:
+        resultado[elegidos] = maximo
+        return resultado
+
+    # λ en que cada vehículo deja su mínimo (a) y llega a su máximo (b),
+    # la suma es lineal por tramos entre estos quiebres:
+    # suma(λ) = Σ minimo[a > λ] + Σ λ * peso[a <= λ < b] + Σ maximo[b <= λ]
+    a = minimo / peso
+    b = maximo / peso
+    orden_a = np.argsort(a, kind="stable")
+    orden_b = np.argsort(b, kind="stable")
+    minimo_acumulado = np.concatenate([[0], np.cumsum(minimo[orden_a])])
+    peso_a_acumulado = np.concatenate([[0], np.cumsum(peso[orden_a])])
+    maximo_acumulado = np.concatenate([[0], np.cumsum(maximo[orden_b])])
+    peso_b_acumulado = np.concatenate([[0], np.cumsum(peso[orden_b])])
+
+    quiebres = np.sort(np.concatenate([a, b]))
+    # vehículos que ya dejaron su mínimo / llegaron a su máximo en cada quiebre
+    en_a = np.searchsorted(a[orden_a], quiebres, side="right")
+    en_b = np.searchsorted(b[orden_b], quiebres, side="right")
+    base = minimo_acumulado[-1] - minimo_acumulado[en_a] + maximo_acumulado[en_b]
+    pendiente = peso_a_acumulado[en_a] - peso_b_acumulado[en_b]
+    suma = base + quiebres * pendiente
+
+    # primer quiebre que alcanza la potencia, λ queda en el tramo anterior
+    k = int(np.searchsorted(suma, potencia))
+    if k == 0:
+        nivel = quiebres[0]
+    else:
+        nivel = (potencia - base[k - 1]) / pendiente[k - 1]
+
+    resultado[elegidos] = np.clip(nivel * peso, minimo, maximo)
+    return resultado
+
+
+def planificar(necesidad, plazo, energia, capacidad, preferencia):
+    """
+    Plan de carga greedy para los ciclos del horizonte:
+    - necesidad: KWh que le faltan a cada vehículo antes de salir
+    - plazo: ciclos que le quedan en el edificio antes de salir
+    - energia, capacidad: KWh de un cargador y cargadores libres en cada ciclo
+    - preferencia: ciclos del horizonte, del más al menos conveniente
+
+    Del plazo más corto al más largo, cada vehículo reserva los ciclos
+    más convenientes de su plazo hasta cubrir su necesidad.
+    Retorna qué vehículos reservaron el ciclo actual (el 0)
+    """
+    libres = capacidad.copy()
+    ahora = np.zeros(len(necesidad), dtype=bool)
+
+    for i in np.argsort(plazo, kind="stable").tolist():
+        if necesidad[i] <= 0:
+            continue
+
+        ciclos = preferencia[preferencia < plazo[i]]
+        ciclos = ciclos[libres[ciclos] > 0]
+        if not len(ciclos):
+            continue
+
+        # los ciclos justos para cubrir la necesidad (o todos si no alcanza)
+        cant = int(np.searchsorted(np.cumsum(energia[ciclos]), necesidad[i])) + 1
+        reservados = ciclos[:cant]
+        libres[reservados] -= 1
+        ahora[i] = bool((reservados == 0).any())
+
+    return ahora
+
+
+############################################################
+# Versión numba
+############################################################
+def _compilar(numba):
+    njit = numba.njit(cache=True, nogil=True)
+
+    @njit
+    def drenar_nb(bateria, rendimiento, manejando, distancia):
+        agotados = 0
+        for i in range(bateria.shape[0]):
+            if manejando[i]:
+                gasto = distancia / rendimiento[i]
+                if 0 < bateria[i] <= gasto:
+                    agotados += 1
+                bateria[i] = max(bateria[i] - gasto, 0.0)
+        return agotados
+
+    @njit
+    def drenar_distancias_nb(bateria, rendimiento, distancias):
+        agotados = 0
+        for i in range(bateria.shape[0]):
+            if distancias[i] > 0:
+                gasto = distancias[i] / rendimiento[i]
+                if 0 < bateria[i] <= gasto:
+                    agotados += 1
+                bateria[i] = max(bateria[i] - gasto, 0.0)
+        return agotados
+
+    @njit
+    def cargar_nb(bateria, max_bateria, en_carga, energia):
+        total = 0.0
+        for i in en_carga:
+            bateria[i] = min(bateria[i] + energia, max_bateria[i])
+            total += energia
+        return total
+
+    @njit
+    def prioridad_nb(gasto_dia, bateria, max_bateria):
+        resultado = np.empty_like(bateria)
+        for i in range(bateria.shape[0]):
+            resultado[i] = gasto_dia[i] - bateria[i] / max_bateria[i]
+        return resultado
+
+    @njit
+    def turno_rotativo_nb(en_el_edificio, bateria, max_bateria, en_cola, ultimo, cantidad):
+        # recorre desde `ultimo` solo hasta encontrar los que faltan
+        total = bateria.shape[0]
+        elegidos = np.empty(max(min(cantidad, total), 0), dtype=np.int64)
+        k = 0
+        for i in range(1, total + 1 if cantidad > 0 else 0):
+            v = (i + ultimo) % total
+            if en_el_edificio[v] and bateria[v] != max_bateria[v]:
+                libre = True
+                for w in en_cola:
+                    if w == v:
+                        libre = False
+                        break
+                if libre:
+                    elegidos[k] = v
+                    k += 1
+                    if k == cantidad:
+                        return elegidos, v
+        return elegidos[:k], ultimo
+
+    def turno_con_tipo(en_el_edificio, bateria, max_bateria, en_cola, ultimo, cantidad):
+        elegidos, ultimo = turno_rotativo_nb(
+            en_el_edificio, bateria, max_bateria, np.asarray(en_cola, dtype=np.int64), ultimo, cantidad
+        )
+        return elegidos, int(ultimo)
+
+    def cargar_con_tipo(bateria, max_bateria, en_carga, energia):
+        # sin vehículos el total queda en 0 (int), igual que en la versión numpy
+        if not len(en_carga):
+            return 0
+        return cargar_nb(bateria, max_bateria, np.asarray(en_carga, dtype=np.int64), energia)
+
+    return SimpleNamespace(
+        drenar=drenar_nb,
+        drenar_distancias=drenar_distancias_nb,
+        cargar=cargar_con_tipo,
+        capacidad=capacidad,
+        prioridad=prioridad_nb,
+        turno_rotativo=turno_con_tipo,
+        # ordenan y acumulan arreglos, numpy ya lo hace en una pasada
+        repartir=repartir,
+        planificar=planificar,
+    )
+
+
+MOTOR_NUMPY = "numpy"
+MOTOR_NUMBA = "numba"
+
+_kernels = {
+    MOTOR_NUMPY: SimpleNamespace(
+        drenar=drenar,
+        drenar_distancias=drenar_distancias,
+        cargar=cargar,
+        capacidad=capacidad,
+        prioridad=prioridad,
+        turno_rotativo=turno_rotativo,
+        repartir=repartir,
+        planificar=planificar,
+    ),
+}
+
+
+def kernels_para(motor: str) -> SimpleNamespace:
+    """
+    Retorna los kernels del motor indicado,
+    usando numpy si numba no está instalado
+    """
+    if motor == MOTOR_NUMBA and MOTOR_NUMBA not in _kernels:
+        # numba es opcional y lento de importar, solo se carga si se pide
+        try:
+            import numba
+        except ImportError:
+            logger.warning("Kernels - numba no esta instalado, usando numpy")
+            _kernels[MOTOR_NUMBA] = _kernels[MOTOR_NUMPY]
+        else:
+            _kernels[MOTOR_NUMBA] = _compilar(numba)
+
+    return _kernels[motor]
@@ -10,10 +10,11 @@ En este caso saqué la funcion normal, porque la estabas usando en todos los par
 
 import datetime
 from random import sample
+from typing import List
 
 import numpy as np
 
-from helpers.constants import MINS_POR_CICLO
+import helpers.constants as c
 
 
 def get_rand_normal(mean: int, d_est: int) -> float:
@@ -38,7 +39,30 @@ def get_rand_time(t: datetime.datetime) -> datetime.datetime:
             decimals=0,
         )
     )
-    return t + datetime.timedelta(minutes=delta * MINS_POR_CICLO)
+    return t + datetime.timedelta(minutes=delta * c.MINS_POR_CICLO)
+
+
+def minutos_del_dia(t: datetime.datetime) -> float:
+    """
+    Equivalente a comparar t.time(), pero como número
+    """
+    return t.hour * 60 + t.minute + t.second / 60 + t.microsecond / 60e6
+
+
+def en_horario(minutos: np.ndarray, t_0: str, t_f: str) -> np.ndarray:
+    """
+    Igual que Timer.time_in_range, para un arreglo de minutos del día
+    """
+    horas, mins = t_0.split(":")
+    inicio = int(horas) * 60 + int(mins)
+    horas, mins = t_f.split(":")
+    final = int(horas) * 60 + int(mins)
+
+    # Caso 1: Horas en el mismo dia
+    if inicio <= final:
+        return (inicio <= minutos) & (minutos <= final)
+    # Caso 2: Horas de un dia al siguiente
+    return (minutos >= inicio) | (minutos <= final)
 
 
 def distancia_en_minutos(
@@ -67,7 +91,7 @@ def salidas_random(
 
     # obtener slots de tiempo en el periodo
     minutes = distancia_en_minutos(desde, hasta)
-    slots = int(minutes / MINS_POR_CICLO)
+    slots = int(minutes / c.MINS_POR_CICLO)
 
     # determinar salidas random
     eventos = sample(
@@ -77,7 +101,7 @@ def salidas_random(
 
     # obtener una lista de tiempos equivalente a cada salida/llegada del día
     times = sorted(
-        [desde + datetime.timedelta(minutes=m * MINS_POR_CICLO) for m in eventos],
+        [desde + datetime.timedelta(minutes=m * c.MINS_POR_CICLO) for m in eventos],
     )
 
     # tuplas de (salida, llegada)
@@ -88,3 +112,67 @@ def salidas_random(
         )
 
     return salidas
+
+
+def sumar_exacto(parciales: List[float], x: float) -> None:
+    """
+    Agrega x a las sumas parciales sin errores de redondeo (como math.fsum),
+    así math.fsum(parciales) es la suma exacta sin importar el orden
+    en que se sumaron los valores, o si se juntan parciales de varias partes
+    """
+    i = 0
+    for y in parciales:
+        if abs(x) < abs(y):
+            x, y = y, x
+        alto = x + y
+        bajo = y - (alto - x)
+        if bajo:
+            parciales[i] = bajo
+            i += 1
+        x = alto
+    parciales[i:] = [x]
+
+
+def kmedias(
+    x: np.ndarray,
+    k: int,
+    rng: np.random.Generator,
+    iteraciones: int = 50,
+) -> np.ndarray:
+    """
+    Grupo de cada fila de x según k-medias (inicio k-means++).
+    Un grupo que queda vacío se reinicia en la fila más lejana a su centro
+    """
+    k = min(k, len(x))
+    normas = (x**2).sum(axis=1)
+
+    def distancias(centros: np.ndarray) -> np.ndarray:
+        # |x - c|² sin armar el arreglo de (filas, centros, columnas)
+        d = normas[:, None] - 2 * x @ centros.T + (centros**2).sum(axis=1)[None]
+        return np.maximum(d, 0)
+
+    centros = np.empty((k, x.shape[1]))
+    centros[0] = x[rng.integers(len(x))]
+    distancia = distancias(centros[:1])[:, 0]
+    for g in range(1, k):
+        total = distancia.sum()
+        i = rng.choice(len(x), p=distancia / total) if total > 0 else rng.integers(len(x))
+        centros[g] = x[i]
+        distancia = np.minimum(distancia, distancias(centros[g : g + 1])[:, 0])
+
+    grupos = np.full(len(x), -1)
+    for _ in range(iteraciones):
+        distancia = distancias(centros)
+        nuevos = distancia.argmin(axis=1)
+        if np.array_equal(nuevos, grupos):
+            break
+        grupos = nuevos
+        for g in range(k):
+            miembros = grupos == g
+            if miembros.any():
+                centros[g] = x[miembros].mean(axis=0)
+            else:
+                lejana = distancia[np.arange(len(x)), grupos].argmax()
+                centros[g] = x[lejana]
+                grupos[lejana] = g
+    return grupos
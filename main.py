@@ -1,17 +1,562 @@
+"""
+Simulación de la carga de vehículos eléctricos en una ciudad
+
+Uso:
+    python main.py                                  (igual que `run`)
+    python main.py run --set SEED=3 --motor numba
+    python main.py sweep POTENCIA_DECLARADA 10000 20000 30000
+    python main.py sweep TOPE_DE_CARGADORES 1 2 3 4 --trabajadores 4 --motor numba
+    python main.py scenarios escenarios.csv --trabajadores 4 --motor numba
+    python main.py bench --repeticiones 3
+    python main.py size TOPE_DE_CARGADORES --minimo 0 --maximo 10
+    python main.py approx --fraccion 0.05 --motor numba
+    python main.py convert-input potencias.xlsx potencias.csv
+    python main.py convert-trips viajes.csv viajes.npz
+    python main.py verify --motor numba --escenarios 20
+    python main.py online --puerto 8765
+    python main.py feed potencias.csv --puerto 8765 --cada 0.5
+    python main.py serve --socket /tmp/electric-city.sock
+    python main.py submit --socket /tmp/electric-city.sock --set TOPE_DE_CARGADORES=3
+    python main.py run --fragmento hash:0/4 --output-folder out/0
+    python main.py merge out/0 out/1 out/2 out/3 --output-folder out/ciudad
+
+Las opciones --set KEY=VALUE reemplazan los valores de env.txt.
+Los modulos de la simulación se importan solo cuando se necesitan,
+para que los trabajos cortos partan rápido.
+"""
+
+import argparse
 import logging
+import os
+import time
 
-from classes.simulacion import Simulacion
-from helpers.constants import INPUT_FILE, LOG_LEVEL
+INICIO = time.perf_counter()
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    encoding="utf-8", level=LOG_LEVEL, format="[%(levelname)s]\t%(message)s"
-)
 
-# Esto es para repetir la misma ejecución random
-s = Simulacion(
-    "Super City",
-    archivo_potencias=INPUT_FILE,
-)
 
-s.empezar()
+def leer_pares(valores: list, opcion: str) -> dict:
+    pares = {}
+    for valor in valores:
+        if "=" not in valor:
+            raise SystemExit(f"{opcion} espera KEY=VALUE, no '{valor}'")
+        nombre, valor = valor.split("=", 1)
+        pares[nombre.strip()] = valor.strip()
+    return pares
+
+
+def leer_overrides(args: argparse.Namespace) -> dict:
+    overrides = leer_pares(args.set + getattr(args, "set_comando", []), "--set")
+
+    # atajos para los valores mas usados
+    for nombre, valor in [
+        ("INPUT_FILE", args.input),
+        ("VIAJES_FILE", args.viajes),
+        ("OUTPUT_FOLDER", args.output_folder),
+        ("OUTPUT_FORMAT", args.output_format),
+        ("OUTPUT_MODO", args.modo),
+        ("MOTOR", args.motor),
+        ("SEED", args.seed),
+        ("FRAGMENTO", args.fragmento),
+    ]:
+        if valor is not None:
+            overrides[nombre] = valor
+    return overrides
+
+
+def configurar(args: argparse.Namespace):
+    """
+    Carga las constantes con el env.txt y las opciones indicadas
+    """
+    if args.env:
+        os.environ["ELECTRIC_CITY_ENV"] = os.path.abspath(args.env)
+
+    import helpers.constants as c
+
+    overrides = leer_overrides(args)
+    if overrides:
+        c.configurar(**overrides)
+
+    logging.basicConfig(
+        encoding="utf-8", level=c.LOG_LEVEL, format="[%(levelname)s]\t%(message)s"
+    )
+    return c
+
+
+############################################################
+# Comandos
+############################################################
+def run(args: argparse.Namespace):
+    c = configurar(args)
+    from classes.simulacion import Simulacion
+
+    s = Simulacion(
+        args.nombre,
+        archivo_potencias=c.INPUT_FILE,
+    )
+    s.empezar()
+
+
+def sweep(args: argparse.Namespace):
+    """
+    Repite la simulación para cada valor del parametro,
+    por defecto en modo resumen y en una carpeta por valor
+    """
+    c = configurar(args)
+    from classes.simulacion import Simulacion
+
+    carpeta_base = c.OUTPUT_FOLDER
+    overrides = leer_overrides(args)
+    modo = overrides.get("OUTPUT_MODO", "resumen")
+    configs = [
+        {
+            args.parametro: valor,
+            "OUTPUT_MODO": modo,
+            "OUTPUT_FOLDER": f"{carpeta_base}/{args.parametro}={valor}",
+        }
+        for valor in args.valores
+    ]
+
+    # varios procesos, con el input y la flota en memoria compartida
+    if args.trabajadores > 1:
+        from classes.compartido import barrido_en_paralelo, compartir_entrada
+
+        with compartir_entrada([args.parametro]) as (potencias, flota):
+            barrido_en_paralelo(args.nombre, configs, args.trabajadores, potencias, flota)
+        return
+
+    for config in configs:
+        c.configurar(**config)
+        logger.warning(f"Sweep - {args.parametro}={config[args.parametro]}")
+        s = Simulacion(args.nombre, archivo_potencias=c.INPUT_FILE)
+        s.empezar()
+
+
+def scenarios(args: argparse.Namespace):
+    """
+    Simula cada escenario del archivo (o los indicados) con el mismo
+    input y la misma flota, en modo resumen y en una carpeta por escenario
+    """
+    c = configurar(args)
+    from classes.escenarios import leer_escenarios, simular_escenarios
+
+    carpeta_base = c.OUTPUT_FOLDER
+    modo = leer_overrides(args).get("OUTPUT_MODO", "resumen")
+    nombres = args.escenario or list(leer_escenarios(args.archivo))
+    configs = [
+        {
+            "ESCENARIOS_FILE": os.path.abspath(args.archivo),
+            "ESCENARIO": nombre,
+            "OUTPUT_MODO": modo,
+            "OUTPUT_FOLDER": f"{carpeta_base}/ESCENARIO={nombre}",
+        }
+        for nombre in nombres
+    ]
+
+    if args.trabajadores > 1:
+        from classes.compartido import barrido_en_paralelo, compartir_entrada
+
+        with compartir_entrada(["ESCENARIOS_FILE", "ESCENARIO"]) as (potencias, flota):
+            barrido_en_paralelo(args.nombre, configs, args.trabajadores, potencias, flota)
+        return
+    simular_escenarios(args.nombre, configs)
+
+
+def bench(args: argparse.Namespace):
+    """
+    Mide el tiempo de arranque y la velocidad de la simulación
+    """
+    c = configurar(args)
+    from classes.simulacion import Simulacion
+
+    arranque = time.perf_counter() - INICIO
+    print(f"arranque: {arranque:.3f}s")
+
+    for i in range(args.repeticiones):
+        t_0 = time.perf_counter()
+        s = Simulacion(args.nombre, archivo_potencias=c.INPUT_FILE)
+        t_1 = time.perf_counter()
+        s.empezar()
+        t_2 = time.perf_counter()
+
+        ciclos = s.input.contar_filas(c.INPUT_FILE)
+        edificios = len(s.edificios)
+        print(
+            f"repeticion {i + 1}: "
+            f"creacion={t_1 - t_0:.3f}s, "
+            f"simulacion={t_2 - t_1:.3f}s, "
+            f"ciclos/s={ciclos / (t_2 - t_1):.1f}, "
+            f"edificios/s={ciclos * edificios / (t_2 - t_1):.1f}"
+        )
+
+
+def size(args: argparse.Namespace):
+    """
+    Busca el menor valor del parametro que cubre la demanda
+    de cada edificio y politica
+    """
+    c = configurar(args)
+    from classes.database import DB
+    from classes.dimensionamiento import Dimensionamiento
+    from classes.simulacion import Simulacion
+
+    s = Simulacion(args.nombre, archivo_potencias=c.INPUT_FILE)
+    dimensionamiento = Dimensionamiento(s, args.dias_de_calentamiento)
+    resultados = dimensionamiento.buscar_todos(
+        args.parametro, args.minimo, args.maximo, args.paso
+    )
+    dimensionamiento.guardar(resultados, DB())
+
+    for r in resultados:
+        print(
+            f"{r['Edificio']} {r['Politica']}: {r['Parametro']}={r['Valor Minimo']} "
+            f"[evaluaciones={r['Evaluaciones']}, ciclos={r['Ciclos Simulados']}]"
+        )
+
+
+def approx(args: argparse.Namespace):
+    """
+    Estima los totales de la ciudad simulando solo algunos
+    edificios de cada grupo de edificios parecidos
+    """
+    c = configurar(args)
+    from classes.aproximacion import Aproximacion
+    from classes.database import DB
+    from classes.en_memoria import PotenciasEnMemoria
+    from classes.viajes import RegistroDeViajes
+
+    potencias = PotenciasEnMemoria.leer_archivo(c.INPUT_FILE)
+    viajes = RegistroDeViajes.leer(c.VIAJES_FILE) if c.VIAJES_FILE else None
+    aproximacion = Aproximacion(potencias, args.fraccion, args.por_grupo, viajes)
+    filas, carga = aproximacion.estimar(aproximacion.simular(args.nombre))
+    aproximacion.guardar(filas, carga, DB())
+
+    for f in filas:
+        print(f"{f['Politica']} {f['Metrica']}: {f['Estimado']:.2f} ± {f['Error Estandar']:.2f}")
+    print(
+        f"[{int(aproximacion.elegidos.sum())} de {len(aproximacion.grupos)} edificios, "
+        f"{time.perf_counter() - INICIO:.1f}s]"
+    )
+
+
+def convert_input(args: argparse.Namespace):
+    """
+    Pasa un archivo de potencias a otro formato (csv, tsv, xlsx, sqlite)
+    """
+    configurar(args)
+    from classes.database import DB
+
+    entrada = DB()
+    salida = DB()
+
+    headers = entrada.leer_headers(args.origen)
+    salida.crear_archivo(args.destino, headers)
+    for fila in entrada.leer(args.origen):
+        salida.agregar_fila_en_memoria(args.destino, [fila[h] for h in headers])
+    salida.exportar_archivos()
+
+
+def convert_trips(args: argparse.Namespace):
+    """
+    Pasa un archivo de viajes al formato .npz, que carga mucho más rápido
+    """
+    configurar(args)
+    from classes.viajes import RegistroDeViajes
+
+    RegistroDeViajes.leer(args.origen).guardar(args.destino)
+
+
+def verify(args: argparse.Namespace):
+    """
+    Compara el motor de referencia (objetos) con el motor indicado,
+    sobre el input o sobre escenarios al azar
+    """
+    c = configurar(args)
+    from classes import verificacion
+
+    rapido = {"MOTOR": c.MOTOR if c.MOTOR != "objetos" else "numpy"}
+    rapido.update(leer_pares(args.rapido, "--rapido"))
+    tolerancias = {k: float(v) for k, v in leer_pares(args.tolerancia, "--tolerancia").items()}
+    for campo in tolerancias:
+        if campo not in verificacion.TOLERANCIAS:
+            raise SystemExit(f"--tolerancia: campo desconocido '{campo}'")
+
+    if args.escenarios:
+        resultados = verificacion.verificar_escenarios(
+            rapido, args.escenarios, args.semilla_escenarios, tolerancias
+        )
+    else:
+        potencias = verificacion.potencias_de_archivo(c.INPUT_FILE)
+        resultados = [(None, verificacion.verificar(potencias, rapido, tolerancias=tolerancias))]
+
+    divergencias = 0
+    for escenario, divergencia in resultados:
+        if divergencia is None:
+            continue
+        divergencias += 1
+        if escenario is not None:
+            print(f"escenario: {escenario}")
+        print(divergencia.reporte())
+        if not args.todas:
+            break
+
+    if divergencias:
+        raise SystemExit(1)
+    print(f"sin diferencias entre objetos y {rapido}")
+
+
+def online(args: argparse.Namespace):
+    """
+    Simula en vivo las filas que llegan a un archivo o a un socket local
+    """
+    configurar(args)
+    import asyncio
+
+    from classes.en_linea import ArchivoEnVivo, SimulacionEnLinea, SocketEnVivo
+
+    if args.archivo_en_vivo:
+        fuente = ArchivoEnVivo(args.archivo_en_vivo)
+    else:
+        fuente = SocketEnVivo(args.puerto)
+
+    simulacion = SimulacionEnLinea(
+        fuente,
+        args.nombre,
+        presupuesto_ms=args.presupuesto_ms,
+        decisiones=args.decisiones,
+        inactividad=args.inactividad,
+    )
+    reporte = asyncio.run(simulacion.correr())
+    print(", ".join(f"{k}={v}" for k, v in reporte.items()))
+
+
+def feed(args: argparse.Namespace):
+    """
+    Alimentador de prueba para `online`: envía las filas de un archivo
+    de potencias de a una
+    """
+    c = configurar(args)
+    from classes.en_linea import alimentar
+
+    alimentar(
+        args.origen or c.INPUT_FILE,
+        archivo=args.archivo_en_vivo,
+        puerto=args.puerto,
+        cada=args.cada,
+        mostrar=args.mostrar,
+    )
+
+
+def serve(args: argparse.Namespace):
+    """
+    Deja la simulación cargada en memoria, atendiendo trabajos
+    por un socket unix o una carpeta
+    """
+    configurar(args)
+    import asyncio
+
+    from classes.servicio import Servicio
+
+    servicio = Servicio(
+        socket=args.socket,
+        carpeta=args.carpeta_trabajos,
+        trabajadores=args.trabajadores,
+    )
+    asyncio.run(servicio.correr())
+
+
+def submit(args: argparse.Namespace):
+    """
+    Envía trabajos a `serve` y muestra sus respuestas
+    """
+    c = configurar(args)
+    import json
+
+    from classes.servicio import enviar
+
+    ruta_socket = args.socket or c.SERVICIO_SOCKET
+    if not ruta_socket:
+        raise SystemExit("submit necesita --socket (o SERVICIO_SOCKET)")
+
+    if args.comando_servicio:
+        trabajos = [{"comando": args.comando_servicio}]
+    elif args.trabajo:
+        trabajos = []
+        for nombre in args.trabajo:
+            with open(nombre, encoding="utf-8") as archivo:
+                trabajos.append(json.load(archivo))
+    else:
+        trabajo = {"nombre": args.nombre, "set": leer_overrides(args)}
+        if args.en_memoria:
+            trabajo["salida"] = "memoria"
+        trabajos = [trabajo]
+
+    errores = 0
+    for respuesta in enviar(trabajos, ruta_socket):
+        errores += respuesta.get("estado") == "error"
+        print(json.dumps(respuesta, ensure_ascii=False))
+    if errores:
+        raise SystemExit(1)
+
+
+def merge(args: argparse.Namespace):
+    """
+    Une las salidas de los fragmentos de una simulación
+    """
+    c = configurar(args)
+    from classes.fragmentos import unir
+
+    unido = unir(args.carpetas, c.OUTPUT_FOLDER)
+    print(f"{len(unido['edificios'])} de {unido['total_edificios']} edificios en {c.OUTPUT_FOLDER}")
+
+
+############################################################
+# Argumentos
+############################################################
+def opciones_comunes(suprimir: bool = False) -> argparse.ArgumentParser:
+    """
+    Opciones que van antes o después del comando. Las del comando no
+    tienen valor por defecto, para no borrar las que se dieron antes
+    """
+    comun = argparse.ArgumentParser(add_help=False)
+    sin_valor = {"default": argparse.SUPPRESS} if suprimir else {}
+    comun.add_argument("--env", help="archivo de configuracion (por defecto env.txt)", **sin_valor)
+    comun.add_argument(
+        "--set",
+        action="append",
+        # las del comando se juntan con las anteriores (ver leer_overrides)
+        dest="set_comando" if suprimir else "set",
+        default=argparse.SUPPRESS if suprimir else [],
+        metavar="KEY=VALUE",
+        help="reemplaza un valor de env.txt (se puede repetir)",
+    )
+    comun.add_argument("--input", help="archivo de potencias (INPUT_FILE)", **sin_valor)
+    comun.add_argument("--viajes", help="archivo de viajes de la flota (VIAJES_FILE)", **sin_valor)
+    comun.add_argument("--output-folder", help="carpeta de salida (OUTPUT_FOLDER)", **sin_valor)
+    comun.add_argument("--output-format", help="csv, tsv, xlsx o sqlite (OUTPUT_FORMAT)", **sin_valor)
+    comun.add_argument("--modo", help="ancho, largo, delta o resumen (OUTPUT_MODO)", **sin_valor)
+    comun.add_argument("--motor", help="objetos, numpy o numba (MOTOR)", **sin_valor)
+    comun.add_argument("--seed", help="semilla aleatoria (SEED)", **sin_valor)
+    comun.add_argument(
+        "--fragmento", help="rango:INICIO:FIN o hash:K/N, simula solo esos edificios (FRAGMENTO)", **sin_valor
+    )
+    comun.add_argument(
+        "--nombre", help="nombre de la simulacion", **(sin_valor or {"default": "Super City"})
+    )
+    return comun
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], parents=[opciones_comunes()])
+    comun = opciones_comunes(suprimir=True)
+    comandos = parser.add_subparsers(dest="comando")
+
+    p = comandos.add_parser("run", parents=[comun], help="corre una simulacion")
+    p.set_defaults(funcion=run)
+
+    p = comandos.add_parser("sweep", parents=[comun], help="repite la simulacion variando un parametro")
+    p.add_argument("parametro", help="nombre del valor en env.txt, EJ: POTENCIA_DECLARADA")
+    p.add_argument("valores", nargs="+")
+    p.add_argument("--trabajadores", type=int, default=1, help="simulaciones a la vez, en procesos aparte")
+    p.set_defaults(funcion=sweep)
+
+    p = comandos.add_parser("scenarios", parents=[comun], help="simula los escenarios de falla con la misma flota")
+    p.add_argument("archivo", help="archivo de escenarios (ESCENARIOS_FILE)")
+    p.add_argument("--escenario", action="append", default=[], help="simular solo este escenario (se puede repetir)")
+    p.add_argument("--trabajadores", type=int, default=1, help="simulaciones a la vez, en procesos aparte")
+    p.set_defaults(funcion=scenarios)
+
+    p = comandos.add_parser("bench", parents=[comun], help="mide la velocidad de la simulacion")
+    p.add_argument("--repeticiones", type=int, default=1)
+    p.set_defaults(funcion=bench)
+
+    p = comandos.add_parser("size", parents=[comun], help="busca el menor parametro que cubre la demanda")
+    p.add_argument("parametro", choices=["POTENCIA_DECLARADA", "TOPE_DE_CARGADORES"])
+    p.add_argument("--minimo", type=float, default=0)
+    p.add_argument("--maximo", type=float, required=True)
+    p.add_argument("--paso", type=float, default=1)
+    p.add_argument("--dias-de-calentamiento", type=int, default=1, help="dias iniciales en que no se cuentan fallas")
+    p.set_defaults(funcion=size)
+
+    p = comandos.add_parser("approx", parents=[comun], help="estima los totales simulando algunos edificios")
+    p.add_argument("--fraccion", type=float, help="fraccion de los edificios que se simulan (APROXIMACION_FRACCION)")
+    p.add_argument("--por-grupo", type=int, help="edificios simulados por grupo (APROXIMACION_POR_GRUPO)")
+    p.set_defaults(funcion=approx)
+
+    p = comandos.add_parser("convert-input", parents=[comun], help="convierte un archivo de potencias")
+    p.add_argument("origen")
+    p.add_argument("destino")
+    p.set_defaults(funcion=convert_input)
+
+    p = comandos.add_parser("convert-trips", parents=[comun], help="convierte un archivo de viajes a .npz")
+    p.add_argument("origen")
+    p.add_argument("destino")
+    p.set_defaults(funcion=convert_trips)
+
+    p = comandos.add_parser("verify", parents=[comun], help="compara el motor rapido con el de referencia")
+    p.add_argument("--escenarios", type=int, default=0, help="escenarios al azar (0 = usar el input)")
+    p.add_argument("--semilla-escenarios", type=int, default=0)
+    p.add_argument(
+        "--tolerancia",
+        action="append",
+        default=[],
+        metavar="CAMPO=VALOR",
+        help="diferencia maxima de un campo, EJ: bateria=1e-6",
+    )
+    p.add_argument(
+        "--rapido",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="valor de env.txt solo para el motor rapido, EJ: ESTACIONARIO=1",
+    )
+    p.add_argument("--todas", action="store_true", help="no parar en el primer escenario con diferencias")
+    p.set_defaults(funcion=verify)
+
+    p = comandos.add_parser("online", parents=[comun], help="simula en vivo las filas que van llegando")
+    fuente = p.add_mutually_exclusive_group(required=True)
+    fuente.add_argument("--archivo-en-vivo", help="archivo .csv/.tsv al que se agregan filas")
+    fuente.add_argument("--puerto", type=int, help="puerto TCP local para recibir filas")
+    p.add_argument("--presupuesto-ms", type=float, help="latencia maxima por ciclo (EN_LINEA_PRESUPUESTO_MS)")
+    p.add_argument("--decisiones", help="archivo .jsonl de decisiones, - = stdout (EN_LINEA_DECISIONES)")
+    p.add_argument("--inactividad", type=float, help="segundos sin filas para terminar (EN_LINEA_INACTIVIDAD)")
+    p.set_defaults(funcion=online)
+
+    p = comandos.add_parser("feed", parents=[comun], help="envia un archivo de potencias a `online`")
+    p.add_argument("origen", nargs="?", help="archivo de potencias (por defecto INPUT_FILE)")
+    destino = p.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--archivo-en-vivo", help="archivo al que se agregan las filas")
+    destino.add_argument("--puerto", type=int, help="puerto TCP local de `online`")
+    p.add_argument("--cada", type=float, default=1.0, help="segundos entre cada fila")
+    p.add_argument("--mostrar", action="store_true", help="mostrar las decisiones recibidas")
+    p.set_defaults(funcion=feed)
+
+    p = comandos.add_parser("serve", parents=[comun], help="atiende trabajos con los datos cargados en memoria")
+    p.add_argument("--socket", help="socket unix para recibir trabajos (SERVICIO_SOCKET)")
+    p.add_argument("--carpeta-trabajos", help="carpeta con archivos .trabajo.json (SERVICIO_CARPETA)")
+    p.add_argument("--trabajadores", type=int, help="simulaciones a la vez, 0 = una por CPU (SERVICIO_TRABAJADORES)")
+    p.set_defaults(funcion=serve)
+
+    p = comandos.add_parser("submit", parents=[comun], help="envia un trabajo a `serve`")
+    p.add_argument("--socket", help="socket unix de `serve` (SERVICIO_SOCKET)")
+    p.add_argument("--trabajo", action="append", default=[], help="archivo JSON con un trabajo (se puede repetir)")
+    p.add_argument("--en-memoria", action="store_true", help="no escribir archivos, responder con los totales")
+    p.add_argument("--comando-servicio", choices=["estado", "terminar"], help="consultar o detener el servicio")
+    p.set_defaults(funcion=submit)
+
+    p = comandos.add_parser("merge", parents=[comun], help="une las salidas de los fragmentos")
+    p.add_argument("carpetas", nargs="+", help="carpetas de salida de cada fragmento")
+    p.set_defaults(funcion=merge)
+
+    return parser
+
+
+def main(argv: list | None = None):
+    args = crear_parser().parse_args(argv)
+    # sin comando se corre la simulacion
+    funcion = getattr(args, "funcion", run)
+    funcion(args)
+
+
+if __name__ == "__main__":
+    main()